@@ -0,0 +1,154 @@
+'''
+The engines as a library: best move and score for a batch of positions.
+
+Positions are move strings (1-based columns, as arena.py logs them) and
+the side to move comes from the number of moves, so there is no Board
+state to set up. Engines are given as in arena.py, plus `solve` for the
+exact solver:
+
+    minimax:6 / negamax:6   fixed depth, score from the side to move's view
+    id:500                  iterative deepening with a 500 ms budget per position
+    mcts:2000               2000 iterations, score is the chosen move's mean result (-1 to 1)
+    solve                   solver.Solver, exact score (see solver.py), slow for early positions
+
+Batches are spread over a process pool. Every worker keeps its engine,
+transposition table included, for all the positions it gets, and the
+positions go out in contiguous chunks, so the moves of one game mostly
+land on the same worker and share its cache.
+
+    python analysis.py 4453 44444 --engine negamax:6
+    python analysis.py --game 44536271 --engine id:200
+'''
+import argparse
+import json
+import math
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from bitboard import Position
+from board import Board
+from mcts import MCTS
+from solver import Solver
+from transposition import TranspositionTable
+
+
+def parse_engine(engine):
+    '''
+    (kind, setting) of an engine spec, setting None for solve;
+    raises ValueError for an unknown engine or a missing or bad setting
+    '''
+    kind, _, setting = engine.partition(':')
+    if kind == 'solve':
+        return kind, None
+    if kind not in ('minimax', 'negamax', 'id', 'mcts'):
+        raise ValueError(f"unknown engine {engine!r}, expected minimax:D, negamax:D, id:MS, mcts:N or solve")
+    if not setting.isdigit() or int(setting) < 1:
+        raise ValueError(f"{engine!r} needs a positive whole number setting, expected minimax:D, negamax:D, id:MS or mcts:N")
+    return kind, int(setting)
+
+
+class Analyzer:
+    '''
+    one engine and its caches, reused for every position it analyzes
+    '''
+    def __init__(self, engine='negamax:6', geometry=(6, 7, 4)):
+        self.kind, self.setting = parse_engine(engine)
+        self.geometry = tuple(geometry)
+        self.board = None
+        self.solver = None
+        self.mcts = None
+        if self.kind == 'solve':
+            self.solver = Solver()
+        elif self.kind == 'mcts':
+            self.mcts = MCTS(capacity=max(1024, 8 * self.setting))
+        else:
+            self.board = Board(False, *self.geometry)
+            self.board.tt = TranspositionTable()
+
+    def analyze(self, moves):
+        '''
+        {'moves', 'to_move', 'column', 'score'} for the position after moves, column 0-based;
+        column and score are None once the game is over
+        '''
+        position = Position.from_moves(moves, *self.geometry)
+        to_move = 1 if position.moves % 2 == 0 else 2
+        result = {'moves': moves, 'to_move': to_move, 'column': None, 'score': None}
+        if position.is_terminal():
+            return result
+        if self.kind == 'solve':
+            column, score = self.solver.best_move(position)
+        elif self.kind == 'mcts':
+            column = self.mcts.search(position, to_move, self.setting)
+            visits, wins = self.mcts.root_children()[column]
+            score = wins / visits
+        else:
+            board = self.board
+            board.comp, board.human = to_move, 3 - to_move  # the searches play for comp
+            board.tt.new_search()
+            if self.kind == 'minimax':
+                column, score = board.minimax(position, self.setting, -math.inf, math.inf, True)
+            elif self.kind == 'negamax':
+                column, score = board.negamax(position, self.setting, -math.inf, math.inf, 1)
+            else:
+                column, score, _ = board.iterative_deepening(position, self.setting)
+        result['column'], result['score'] = column, score
+        return result
+
+
+_analyzer = None  # the Analyzer of a pool worker process
+
+
+def _start_worker(engine, geometry):
+    global _analyzer
+    _analyzer = Analyzer(engine, geometry)
+
+
+def _analyze_job(moves):
+    return _analyzer.analyze(moves)
+
+
+def analyze(positions, engine='negamax:6', workers=None, geometry=(6, 7, 4)):
+    '''
+    Analyzer.analyze for every move string in positions, in the same order;
+    workers=1 runs in this process, otherwise over that many processes (all CPUs by default)
+    '''
+    positions = list(positions)
+    parse_engine(engine)  # a bad spec is turned down here rather than in every worker
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(positions) <= 1:
+        analyzer = Analyzer(engine, geometry)
+        return [analyzer.analyze(moves) for moves in positions]
+    chunksize = max(1, len(positions) // (4 * workers))
+    with ProcessPoolExecutor(workers, initializer=_start_worker, initargs=(engine, geometry)) as pool:
+        return list(pool.map(_analyze_job, positions, chunksize=chunksize))
+
+
+def annotate(moves, engine='negamax:6', workers=None, geometry=(6, 7, 4)):
+    '''
+    analyze the position before every move of a game; each result also gets
+    'played', the 0-based column that was actually played there
+    '''
+    results = analyze([moves[:ply] for ply in range(len(moves))], engine, workers, geometry)
+    for result, char in zip(results, moves):
+        result['played'] = ord(char) - ord('1')
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="best move and score for a batch of positions")
+    parser.add_argument("positions", nargs="*", help="move strings; read one per line from stdin when there are none")
+    parser.add_argument("--engine", default="negamax:6", help="minimax:D, negamax:D, id:MS, mcts:N or solve")
+    parser.add_argument("--game", default=None, help="annotate every move of this game instead")
+    parser.add_argument("--workers", type=int, default=None, help="processes, defaults to the number of CPUs")
+    args = parser.parse_args()
+    try:
+        parse_engine(args.engine)
+    except ValueError as error:
+        parser.error(str(error))
+    if args.game is not None:
+        results = annotate(args.game, args.engine, args.workers)
+    else:
+        positions = args.positions or [line.strip() for line in sys.stdin]
+        results = analyze(positions, args.engine, args.workers)
+    for result in results:
+        print(json.dumps(result))
@@ -0,0 +1,238 @@
+'''
+Headless engine-vs-engine matches, no pygame needed.
+
+Agents are given as short specs:
+    minimax:4     Board.minimax at depth 4
+    negamax:4     Board.negamax at depth 4
+    mcts:2000     mcts.MCTS with 2000 iterations
+    id:500        Board.iterative_deepening with a 500 ms budget
+
+Games are spread over a process pool. Every finished game is written as one
+JSON line (moves, winner, time and nodes per move) as soon as it comes in,
+and the summary gives win rates with a confidence interval.
+
+    python arena.py minimax:4 mcts:2000 --games 1000 --log match.jsonl
+    python arena.py minimax:4 negamax:4 --rows 7 --columns 9 --connect 5
+'''
+import argparse
+import json
+import math
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from bitboard import Position
+from board import Board
+from mcts import MCTS
+from records import RecordWriter
+from transposition import TranspositionTable
+
+
+class SearchAgent:
+    '''
+    minimax / negamax / iterative deepening through Board, with one transposition table per game
+    '''
+    def __init__(self, kind, setting, geometry=(6, 7, 4)):
+        self.kind = kind
+        self.setting = setting
+        self.board = Board(False, *geometry)
+
+    def new_game(self, player):
+        self.board.comp = player
+        self.board.human = 2 if player == 1 else 1
+        self.board.tt = TranspositionTable()
+
+    def move(self, position):
+        '''
+        (column, nodes searched) for the side to move in position
+        '''
+        board = self.board
+        board.nodes = 0
+        board.tt.new_search()
+        if self.kind == 'minimax':
+            column, _ = board.minimax(position, self.setting, -math.inf, math.inf, True)
+        elif self.kind == 'negamax':
+            column, _ = board.negamax(position, self.setting, -math.inf, math.inf, 1)
+        else:
+            column, _, _ = board.iterative_deepening(position, self.setting)
+        return column, board.nodes
+
+
+class MCTSPlayer:
+
+    def __init__(self, iterations):
+        self.iterations = iterations
+        self.mcts = MCTS(capacity=max(1024, 8 * iterations))
+        self.player = None
+
+    def new_game(self, player):
+        self.player = player
+
+    def move(self, position):
+        column = self.mcts.search(position, self.player, self.iterations)
+        return column, self.mcts.size
+
+
+def parse_spec(spec):
+    '''
+    (kind, setting) of an agent spec; raises ValueError for an unknown agent or a missing or bad setting
+    '''
+    kind, _, setting = spec.partition(':')
+    if kind not in ('minimax', 'negamax', 'mcts', 'id'):
+        raise ValueError(f"unknown agent {spec!r}, expected minimax:D, negamax:D, mcts:N or id:MS")
+    if not setting.isdigit() or int(setting) < 1:
+        raise ValueError(f"{spec!r} needs a positive whole number setting, expected minimax:D, negamax:D, mcts:N or id:MS")
+    return kind, int(setting)
+
+
+def make_agent(spec, geometry=(6, 7, 4)):
+    '''
+    agent for spec on a board of geometry (row_count, column_count, connect)
+    '''
+    kind, setting = parse_spec(spec)
+    if kind == 'mcts':
+        return MCTSPlayer(setting)
+    return SearchAgent(kind, setting, geometry)
+
+
+def play_game(job):
+    '''
+    one game between two agent specs, first_spec moves first; returns the game record as a dict
+    '''
+    index, first_spec, second_spec, opening_plies, seed, geometry = job
+    rng = random.Random(seed)
+    agents = {1: make_agent(first_spec, geometry), 2: make_agent(second_spec, geometry)}
+    agents[1].new_game(1)
+    agents[2].new_game(2)
+    position = Position(*geometry)
+    times, nodes = [], []
+    # a few random opening moves, otherwise the deterministic engines replay the same game every time
+    while position.moves < opening_plies and not position.is_terminal():
+        column = rng.choice(position.get_valid_locations())
+        position.drop(column, 1 if position.moves % 2 == 0 else 2)
+    random.seed(seed)  # rollouts and randomized searches are reproducible per game too
+    while not position.is_terminal():
+        player = 1 if position.moves % 2 == 0 else 2
+        start = time.perf_counter()
+        column, searched = agents[player].move(position)
+        times.append(round((time.perf_counter() - start) * 1000, 3))
+        nodes.append(searched)
+        position.drop(column, player)
+    return {
+        'game': index,
+        'first': first_spec,
+        'second': second_spec,
+        'moves': position.to_moves(),
+        'winner': position.winner or 0,  # 1 first player, 2 second player, 0 draw
+        'opening_plies': opening_plies,
+        'geometry': list(geometry),  # rows, columns, connect
+        'ms': times,
+        'nodes': nodes,
+    }
+
+
+def wilson_interval(score, games, z=1.96):
+    '''
+    Wilson score interval for a win rate, draws counted as half a win
+    '''
+    if games == 0:
+        return (0.0, 1.0)
+    p = score / games
+    centre = p + z * z / (2 * games)
+    margin = z * math.sqrt(p * (1 - p) / games + z * z / (4 * games * games))
+    scale = 1 + z * z / games
+    return (max(0.0, (centre - margin) / scale), min(1.0, (centre + margin) / scale))
+
+
+def run_match(spec_a, spec_b, games=100, workers=None, log_path=None, opening_plies=2, seed=0, geometry=(6, 7, 4),
+              records_path=None):
+    '''
+    play games between spec_a and spec_b, alternating who moves first, and return the summary;
+    geometry is (row_count, column_count, connect) of the board they play on, records_path
+    a binary game record file (see records.py) to append the games to; raises ValueError
+    for a bad spec before any game starts
+    '''
+    parse_spec(spec_a)
+    parse_spec(spec_b)
+    jobs = []
+    for index in range(games):
+        first, second = (spec_a, spec_b) if index % 2 == 0 else (spec_b, spec_a)
+        jobs.append((index, first, second, opening_plies, seed * 1000003 + index, tuple(geometry)))
+    # keyed by 'a'/'b' rather than by spec, so an engine can also play itself
+    summary = {'a': {'wins': 0, 'ms': [], 'nodes': []}, 'b': {'wins': 0, 'ms': [], 'nodes': []}}
+    draws = 0
+    log = open(log_path, 'a') if log_path else None
+    records = RecordWriter(records_path, *geometry) if records_path else None
+    try:
+        with ProcessPoolExecutor(workers or os.cpu_count()) as pool:
+            for record in pool.map(play_game, jobs, chunksize=4):
+                if log:
+                    log.write(json.dumps(record, separators=(',', ':')) + '\n')
+                    log.flush()
+                if records:
+                    records.write(record['moves'], record['winner'])
+                roles = {1: 'a', 2: 'b'} if record['game'] % 2 == 0 else {1: 'b', 2: 'a'}
+                if record['winner'] == 0:
+                    draws += 1
+                else:
+                    summary[roles[record['winner']]]['wins'] += 1
+                # per-move times and nodes, split by who played them (the opening moves are not timed)
+                for i, (ms, searched) in enumerate(zip(record['ms'], record['nodes'])):
+                    role = roles[1 if (record['opening_plies'] + i) % 2 == 0 else 2]
+                    summary[role]['ms'].append(ms)
+                    summary[role]['nodes'].append(searched)
+    finally:
+        if log:
+            log.close()
+        if records:
+            records.close()
+    report = {'games': games, 'draws': draws}
+    for role, spec in (('a', spec_a), ('b', spec_b)):
+        stats = summary[role]
+        score = stats['wins'] + draws / 2
+        moves = len(stats['ms'])
+        report[role] = {
+            'spec': spec,
+            'wins': stats['wins'],
+            'score': score / games if games else 0.0,
+            'ci95': wilson_interval(score, games),
+            'mean_ms': sum(stats['ms']) / moves if moves else 0.0,
+            'max_ms': max(stats['ms'], default=0.0),
+            'mean_nodes': sum(stats['nodes']) / moves if moves else 0.0,
+        }
+    return report
+
+
+def print_report(report):
+    print(f"{report['games']} games, {report['draws']} draws")
+    for role in ('a', 'b'):
+        r = report[role]
+        low, high = r['ci95']
+        print(f"{r['spec']:>14}: {r['wins']} wins, score {r['score']:.3f} (95% CI {low:.3f}-{high:.3f}), "
+              f"{r['mean_ms']:.1f} ms/move (max {r['max_ms']:.1f}), {r['mean_nodes']:.0f} nodes/move")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="play two engines against each other")
+    parser.add_argument("a", help="agent spec, e.g. minimax:4, negamax:4, mcts:2000, id:500")
+    parser.add_argument("b", help="agent spec")
+    parser.add_argument("--games", type=int, default=100)
+    parser.add_argument("--workers", type=int, default=None, help="processes, defaults to the number of CPUs")
+    parser.add_argument("--log", default=None, help="append one JSON line per game to this file")
+    parser.add_argument("--records", default=None, help="append the games to this binary record file")
+    parser.add_argument("--opening-plies", type=int, default=2, help="random moves at the start of every game")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--rows", type=int, default=6)
+    parser.add_argument("--columns", type=int, default=7, help="at most 9, the games are logged as move strings")
+    parser.add_argument("--connect", type=int, default=4, help="discs in a row needed to win")
+    args = parser.parse_args()
+    if args.columns > 9:
+        parser.error("move strings stop at 9 columns")
+    try:
+        parse_spec(args.a)
+        parse_spec(args.b)
+    except ValueError as error:
+        parser.error(str(error))
+    result = run_match(args.a, args.b, args.games, args.workers, args.log, args.opening_plies, args.seed,
+                       (args.rows, args.columns, args.connect), args.records)
+    print_report(result)
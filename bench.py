@@ -0,0 +1,258 @@
+'''
+Benchmarks for the engine, so a change can be judged on numbers.
+
+Every engine runs on the same fixed corpus of positions (openings,
+middlegames and nearly full boards, written as move strings of 1-based
+columns like arena.py logs them). The results are:
+
+    check_for_win / score_position calls per second (leaf evals/sec)
+    nodes/sec and leaf evals/sec for minimax, negamax and iterative deepening
+    rollouts/sec for MCTS
+    per-move latency percentiles for every engine setting
+
+Every engine gets a warm-up pass over the corpus first, then goes through it
+again at least --repeat times and for at least --min-time seconds.
+
+They are printed and can be written as JSON. Given an earlier results file
+with --baseline, anything that got slower by more than --tolerance is listed
+as a regression and the exit status is 1.
+
+    python bench.py --out before.json
+    python bench.py --baseline before.json
+'''
+import argparse
+import gc
+import json
+import platform
+import random
+import sys
+import time
+from arena import MCTSPlayer, make_agent
+from bitboard import Position
+from board import Board, mcts_search
+from stats import SearchStats
+
+# (name, moves) - none of them is over yet and nobody can win on the next move
+CORPUS = [
+    ('opening-1', ''),
+    ('opening-2', '4'),
+    ('opening-3', '6116'),
+    ('opening-4', '3222'),
+    ('opening-5', '6166'),
+    ('midgame-1', '3233263666156256'),
+    ('midgame-2', '1445453571661657'),
+    ('midgame-3', '5176376552237257'),
+    ('midgame-4', '6634541221315525'),
+    ('endgame-1', '23577617257743722253663516635523'),
+    ('endgame-2', '72636123267347333645151766715271'),
+    ('endgame-3', '44374674746721266172146565275312'),
+]
+
+ENGINES = ['minimax:2', 'minimax:4', 'negamax:4', 'id:200', 'mcts:1000', 'mcts_search:200']
+
+# higher is better for these, lower is better for everything else that is compared
+THROUGHPUT = ('per_sec', 'nodes_per_sec', 'leaf_evals_per_sec', 'rollouts_per_sec')
+
+
+def percentile(values, p):
+    '''
+    nearest rank percentile of a list of numbers
+    '''
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    rank = max(0, min(len(ordered) - 1, round(p / 100 * len(ordered) + 0.5) - 1))
+    return ordered[rank]
+
+
+def latency(times_ms):
+    return {
+        'p50': percentile(times_ms, 50),
+        'p90': percentile(times_ms, 90),
+        'p99': percentile(times_ms, 99),
+        'max': max(times_ms, default=0.0),
+    }
+
+
+def bench_calls(function, positions, min_time=0.5, rounds=5):
+    '''
+    call function on every position over and over for at least min_time seconds, after one
+    warm-up pass; returns the median calls/sec of rounds equal slices of that time
+    '''
+    for position in positions:
+        function(position)
+    rates = []
+    for _ in range(rounds):
+        calls = 0
+        start = time.perf_counter()
+        while True:
+            for position in positions:
+                function(position)
+            calls += len(positions)
+            elapsed = time.perf_counter() - start
+            if elapsed >= min_time / rounds:
+                break
+        rates.append(calls / elapsed)
+    return {'per_sec': percentile(rates, 50)}
+
+
+def bench_primitives(corpus, min_time=0.5):
+    board = Board()
+    positions = [Position.from_moves(moves) for _, moves in corpus]
+    arrays = [position.to_array() for position in positions]
+    return {
+        'check_for_win/array': bench_calls(lambda grid: board.check_for_win(grid, 1), arrays, min_time),
+        'check_for_win/bitboard': bench_calls(lambda position: position.check_for_win(1), positions, min_time),
+        'score_position/array': bench_calls(lambda grid: board.score_position(grid, 1), arrays, min_time),
+        'score_position/bitboard': bench_calls(lambda position: board.score_position(position, 1), positions, min_time),
+    }
+
+
+def run_engine(spec, position):
+    '''
+    one move of the engine spec from position, returns (ms, SearchStats of the search)
+    '''
+    kind, _, setting = spec.partition(':')
+    player = 1 if position.moves % 2 == 0 else 2
+    stats = SearchStats()
+    if kind == 'mcts_search':
+        # the original object tree MCTS in board.py
+        board = Board(use_bitboard=True)
+        board.board = position.copy()
+        board.current_player = player
+        start = time.perf_counter()
+        mcts_search(board, int(setting), stats)
+        return (time.perf_counter() - start) * 1000, stats
+    agent = make_agent(spec)
+    agent.new_game(player)  # a fresh transposition table for every position
+    if isinstance(agent, MCTSPlayer):
+        agent.mcts.stats = stats
+    else:
+        agent.board.stats = stats
+    start = time.perf_counter()
+    agent.move(position)
+    return (time.perf_counter() - start) * 1000, stats
+
+
+def timed_run(spec, position):
+    '''
+    run_engine with the garbage collector held off, as timeit does: the object tree MCTS
+    otherwise gets collections at different points from one run to the next
+    '''
+    gc.collect()
+    gc.disable()
+    try:
+        return run_engine(spec, position)
+    finally:
+        gc.enable()
+
+
+def bench_engine(spec, corpus, repeat=5, min_time=0.5):
+    '''
+    one warm-up pass over the corpus that isn't counted, then at least repeat passes and
+    min_time seconds of them. Throughput is over all the counted passes, the latency
+    percentiles are over each position's median time, so one slow outlier doesn't move them.
+    '''
+    positions = [Position.from_moves(moves) for _, moves in corpus]
+    for position in positions:
+        run_engine(spec, position)
+    times = [[] for _ in positions]
+    nodes, leaf_evals, rollouts, seconds, passes = 0, 0, 0, 0.0, 0
+    while passes < repeat or seconds < min_time:
+        for i, position in enumerate(positions):
+            ms, stats = timed_run(spec, position)
+            times[i].append(ms)
+            seconds += ms / 1000
+            nodes += stats.nodes
+            leaf_evals += stats.leaf_evals
+            rollouts += stats.rollouts
+        passes += 1
+    medians = [percentile(position_times, 50) for position_times in times]
+    result = {'moves': passes * len(positions), 'ms': latency(medians)}
+    if nodes:
+        result['nodes_per_sec'] = nodes / seconds
+        result['leaf_evals_per_sec'] = leaf_evals / seconds
+    if rollouts:
+        result['rollouts_per_sec'] = rollouts / seconds
+    return result
+
+
+def run(engines=ENGINES, corpus=CORPUS, repeat=5, min_time=0.5, seed=0):
+    random.seed(seed)
+    results = {
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'corpus': [name for name, _ in corpus],
+        'primitives': bench_primitives(corpus, min_time),
+        'engines': {},
+    }
+    for spec in engines:
+        random.seed(seed)  # the same rollouts and openings for an engine whatever ran before it
+        results['engines'][spec] = bench_engine(spec, corpus, repeat, min_time)
+    return results
+
+
+def compare(results, baseline, tolerance=0.1):
+    '''
+    list of regressions of results against baseline: throughput that dropped or
+    latency that grew by more than tolerance (a fraction)
+    '''
+    regressions = []
+
+    def check(name, new, old):
+        for metric, value in new.items():
+            if isinstance(value, dict):
+                check(f"{name} {metric}", value, old.get(metric, {}))
+                continue
+            before = old.get(metric)
+            if not before or metric == 'moves':
+                continue
+            change = (value - before) / before
+            if metric in THROUGHPUT:
+                change = -change
+            if change > tolerance:
+                regressions.append(f"{name} {metric}: {before:.4g} -> {value:.4g} ({change:+.0%} worse)")
+
+    for section in ('primitives', 'engines'):
+        for name, new in results.get(section, {}).items():
+            old = baseline.get(section, {}).get(name)
+            if old is not None:
+                check(name, new, old)
+    return regressions
+
+
+def print_results(results):
+    for name, result in results['primitives'].items():
+        print(f"{name:>26}: {result['per_sec']:>12,.0f} calls/sec")
+    for spec, result in results['engines'].items():
+        ms = result['ms']
+        rate = ''
+        if 'nodes_per_sec' in result:
+            rate = f"{result['nodes_per_sec']:>10,.0f} nodes/sec {result['leaf_evals_per_sec']:>8,.0f} evals/sec"
+        elif 'rollouts_per_sec' in result:
+            rate = f"{result['rollouts_per_sec']:>7,.0f} rollouts/sec"
+        print(f"{spec:>26}: {rate}  ms p50 {ms['p50']:.1f} p90 {ms['p90']:.1f} p99 {ms['p99']:.1f} max {ms['max']:.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="benchmark the engines on a fixed set of positions")
+    parser.add_argument("--engines", nargs="+", default=ENGINES,
+                        help="agent specs as in arena.py, plus mcts_search:N for the tree in board.py")
+    parser.add_argument("--repeat", type=int, default=5, help="least times every engine goes through the corpus, after a warm-up pass")
+    parser.add_argument("--min-time", type=float, default=0.5, help="least seconds spent on each primitive and each engine")
+    parser.add_argument("--out", default=None, help="write the results to this JSON file")
+    parser.add_argument("--baseline", default=None, help="earlier results to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="slowdown allowed before it counts as a regression")
+    args = parser.parse_args()
+    results = run(args.engines, repeat=args.repeat, min_time=args.min_time)
+    print_results(results)
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for line in regressions:
+            print("regression:", line)
+        if regressions:
+            sys.exit(1)
@@ -0,0 +1,290 @@
+'''
+Bitboard representation of a connect 4 position.
+
+Each player's discs are kept in one integer. The bit of (row, column) is
+column * (row_count + 1) + row, so every column gets one spare bit on top.
+That spare bit keeps the shifted lines in check_for_win from wrapping into
+the next column.
+
+Any board size and line length (connect) works, the integers are Python
+ints. Only the numpy shortcuts need the board to fit in 64 bits, see
+fits_uint64; bigger boards take a plain Python path instead.
+'''
+import numpy as np
+import random
+from functools import lru_cache
+
+
+def fits_uint64(row_count, column_count):
+    '''
+    whether a bitboard of this size, spare bits included, fits in a numpy uint64
+    '''
+    return (row_count + 1) * column_count <= 64
+
+
+@lru_cache(maxsize=None)
+def cell_shifts(row_count, column_count):
+    '''
+    (row_count, column_count) array with the bit index of every cell, used to
+    unpack the bitboards into the numpy layout in one go
+    '''
+    rows = np.arange(row_count, dtype=np.uint64)[:, None]
+    cols = np.arange(column_count, dtype=np.uint64)[None, :]
+    return cols * np.uint64(row_count + 1) + rows
+
+
+@lru_cache(maxsize=None)
+def win_lines(row_count, column_count, connect=4):
+    '''
+    for every bit index, the masks of all the winning lines (connect discs long) that go
+    through that cell, so a drop only has to test the lines it can actually complete
+    '''
+    h1 = row_count + 1
+    lines = [[] for _ in range(h1 * column_count)]
+    for dr, dc in ((0, 1), (1, 0), (1, 1), (-1, 1)):
+        for row in range(row_count):
+            for col in range(column_count):
+                cells = [(row + i * dr, col + i * dc) for i in range(connect)]
+                if not all(0 <= r < row_count and 0 <= c < column_count for r, c in cells):
+                    continue
+                mask = 0
+                for r, c in cells:
+                    mask |= 1 << (c * h1 + r)
+                for r, c in cells:
+                    lines[c * h1 + r].append(mask)
+    return lines
+
+
+@lru_cache(maxsize=None)
+def zobrist_keys(row_count, column_count):
+    '''
+    one random 64-bit key per (piece, bit index); the hash of a position is the xor
+    of the keys of its discs, so a drop or an undo updates it with a single xor
+    '''
+    rng = random.Random(0x5EED + 131 * row_count + column_count)  # fixed seed, hashes are stable between runs
+    size = (row_count + 1) * column_count
+    return ([rng.getrandbits(64) for _ in range(size)], [rng.getrandbits(64) for _ in range(size)])
+
+
+@lru_cache(maxsize=None)
+def mirror_zobrist_keys(row_count, column_count):
+    '''
+    zobrist_keys with every column swapped for its mirror image, so the same xor that
+    updates a position's hash also updates the hash of its mirror image
+    '''
+    h1 = row_count + 1
+    keys = zobrist_keys(row_count, column_count)
+    mirrored = [(column_count - 1 - index // h1) * h1 + index % h1 for index in range(h1 * column_count)]
+    return ([keys[0][index] for index in mirrored], [keys[1][index] for index in mirrored])
+
+
+def mirror_key(key, row_count, column_count):
+    '''
+    Position.key() of the left-right mirror image of the position with this key
+    '''
+    h1 = row_count + 1
+    column_mask = (1 << h1) - 1
+    mirrored = 0
+    for col in range(column_count):
+        mirrored |= ((key >> (col * h1)) & column_mask) << ((column_count - 1 - col) * h1)
+    return mirrored
+
+
+class Position:
+
+    def __init__(self, row_count=6, column_count=7, connect=4):
+        self.row_count = row_count
+        self.column_count = column_count
+        self.connect = connect  # discs in a row needed to win
+        self.bitboards = [0, 0]  # discs of player 1 and player 2
+        self.heights = [0] * column_count  # number of discs in each column
+        self.moves = 0
+        self.history = []  # (column, piece, winner before the drop), so undo knows what to take back
+        self.winner = None  # set by the drop that completes a four, cleared again by its undo
+        self.lines = win_lines(row_count, column_count, connect)
+        self.keys = zobrist_keys(row_count, column_count)
+        self.mirror_keys = mirror_zobrist_keys(row_count, column_count)
+        self.hash = 0  # zobrist hash, kept up to date by drop and undo
+        self.mirror_hash = 0  # hash of the mirror image, equal to hash when the position is symmetric
+
+    def copy(self):
+        position = Position.__new__(Position)
+        position.row_count = self.row_count
+        position.column_count = self.column_count
+        position.connect = self.connect
+        position.bitboards = self.bitboards[:]
+        position.heights = self.heights[:]
+        position.moves = self.moves
+        position.history = self.history[:]
+        position.winner = self.winner
+        position.lines = self.lines
+        position.keys = self.keys
+        position.mirror_keys = self.mirror_keys
+        position.hash = self.hash
+        position.mirror_hash = self.mirror_hash
+        return position
+
+    @classmethod
+    def from_array(cls, board, connect=4):
+        '''
+        build a position from the numpy board used by Board (row 0 is the bottom)
+        '''
+        row_count, column_count = board.shape
+        position = cls(row_count, column_count, connect)
+        for col in range(column_count):
+            for row in range(row_count):
+                piece = int(board[row][col])
+                if piece == 0:
+                    break
+                position.drop(col, piece)
+        position.history = []  # the array doesn't know the order the discs were played in
+        # the column by column replay above may have seen the wins in any order, so settle it with a full check
+        position.winner = 1 if position.check_for_win(1) else 2 if position.check_for_win(2) else None
+        return position
+
+    @classmethod
+    def from_moves(cls, moves, row_count=6, column_count=7, connect=4):
+        '''
+        build a position from a move string of 1-based columns ("4453" is columns 3, 3, 4, 2),
+        player 1 moving first; raises ValueError for a move that can't be played
+        '''
+        position = cls(row_count, column_count, connect)
+        for i, char in enumerate(moves):
+            column = ord(char) - ord('1')
+            if not 0 <= column < min(column_count, 9):
+                raise ValueError(f"bad column {char!r} at move {i + 1} of {moves!r}")
+            if position.is_terminal() or not position.check_valid_location(column):
+                raise ValueError(f"move {i + 1} of {moves!r} can't be played")
+            position.drop(column, 1 if position.moves % 2 == 0 else 2)
+        return position
+
+    def to_moves(self):
+        '''
+        the move string this position was played with, the inverse of from_moves
+        '''
+        if len(self.history) != self.moves:
+            raise ValueError("the move order of this position is unknown")
+        if self.column_count > 9:
+            raise ValueError(f"move strings stop at 9 columns, this board has {self.column_count}")
+        return ''.join(str(column + 1) for column, _, _ in self.history)
+
+    def key(self):
+        '''
+        the position as one integer: the discs of the side to move plus one marker bit
+        on top of every column's discs. It fits in (row_count + 1) * column_count bits,
+        so a uint64 for the standard board, and from_key turns it back into the position.
+        '''
+        h1 = self.row_count + 1
+        bottom = sum(1 << (col * h1) for col in range(self.column_count))
+        mask = self.bitboards[0] | self.bitboards[1]
+        return self.bitboards[self.moves % 2] | (mask + bottom)
+
+    @classmethod
+    def from_key(cls, key, row_count=6, column_count=7, connect=4):
+        '''
+        the position of a key(), player 1 having moved first; the move order is lost
+        '''
+        key = int(key)
+        h1 = row_count + 1
+        if key < 0 or key.bit_length() > h1 * column_count:
+            raise ValueError(f"{key:#x} is not a position key of a {row_count}x{column_count} board")
+        position = cls(row_count, column_count, connect)
+        columns = []
+        for col in range(column_count):
+            bits = (key >> (col * h1)) & ((1 << h1) - 1)
+            height = bits.bit_length() - 1  # the marker bit sits right above the discs
+            if height < 0 or height > row_count:
+                raise ValueError(f"{key:#x} is not a position key")
+            columns.append((bits, height))
+        moves = sum(height for _, height in columns)
+        to_move = 1 if moves % 2 == 0 else 2
+        for col, (bits, height) in enumerate(columns):
+            for row in range(height):
+                position.drop(col, to_move if bits >> row & 1 else 3 - to_move)
+        position.history = []
+        position.winner = 1 if position.check_for_win(1) else 2 if position.check_for_win(2) else None
+        return position
+
+    def to_array(self):
+        if not fits_uint64(self.row_count, self.column_count):
+            board = np.zeros((self.row_count, self.column_count), dtype=int)
+            h1 = self.row_count + 1
+            for piece, bitboard in ((1, self.bitboards[0]), (2, self.bitboards[1])):
+                while bitboard:
+                    index = (bitboard & -bitboard).bit_length() - 1
+                    board[index % h1][index // h1] = piece
+                    bitboard &= bitboard - 1
+            return board
+        shifts = cell_shifts(self.row_count, self.column_count)
+        player_1 = (np.uint64(self.bitboards[0]) >> shifts) & np.uint64(1)
+        player_2 = (np.uint64(self.bitboards[1]) >> shifts) & np.uint64(1)
+        return (player_1 + 2 * player_2).astype(int)
+
+    def __array__(self, dtype=None, copy=None):
+        # lets np.asarray / np.flip / print_board treat a position like the numpy board
+        board = self.to_array()
+        return board if dtype is None else board.astype(dtype)
+
+    def check_valid_location(self, column):
+        return self.heights[column] < self.row_count
+
+    def next_open_row(self, column):
+        row = self.heights[column]
+        return row if row < self.row_count else None
+
+    def get_valid_locations(self):
+        return [col for col in range(self.column_count) if self.heights[col] < self.row_count]
+
+    def drop(self, column, piece):
+        index = column * (self.row_count + 1) + self.heights[column]
+        bitboard = self.bitboards[piece - 1] | (1 << index)
+        self.bitboards[piece - 1] = bitboard
+        self.heights[column] += 1
+        self.moves += 1
+        self.hash ^= self.keys[piece - 1][index]
+        self.mirror_hash ^= self.mirror_keys[piece - 1][index]
+        self.history.append((column, piece, self.winner))
+        if self.winner is None:
+            # only the lines through the new disc can have been completed by it
+            for mask in self.lines[index]:
+                if bitboard & mask == mask:
+                    self.winner = piece
+                    break
+
+    def undo(self):
+        column, piece, self.winner = self.history.pop()
+        self.moves -= 1
+        self.heights[column] -= 1
+        index = column * (self.row_count + 1) + self.heights[column]
+        self.bitboards[piece - 1] ^= 1 << index
+        self.hash ^= self.keys[piece - 1][index]
+        self.mirror_hash ^= self.mirror_keys[piece - 1][index]
+        return column
+
+    def is_symmetric(self):
+        '''
+        whether the position is its own mirror image, so mirrored moves lead to the same positions
+        '''
+        return self.hash == self.mirror_hash
+
+    def check_for_win(self, piece):
+        bitboard = self.bitboards[piece - 1]
+        h1 = self.row_count + 1
+        connect = self.connect
+        # vertical, horizontal, and the two diagonals
+        for shift in (1, h1, h1 - 1, h1 + 1):
+            # runs keeps the first disc of every run of `run` discs, doubling run until it reaches connect
+            runs, run = bitboard, 1
+            while run < connect and runs:
+                step = min(run, connect - run)
+                runs &= runs >> (step * shift)
+                run += step
+            if runs:
+                return True
+        return False
+
+    def is_tie(self):
+        return self.moves == self.row_count * self.column_count
+
+    def is_terminal(self):
+        return self.winner is not None or self.moves == self.row_count * self.column_count
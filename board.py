@@ -1,11 +1,24 @@
 import numpy as np
 import random
 import math
+import time
+from bitboard import Position
+from evaluation import score_board, score_boards, score_bitboards
+from rollouts import geometry_of, rollout
+from transposition import TranspositionTable, EXACT, LOWER, UPPER, MINIMIZING_KEY, NEGAMAX_KEY
+
+
+class SearchTimeout(Exception):
+    '''
+    raised inside minimax/negamax when the deadline set by iterative_deepening has passed
+    '''
 
 class Board:
-    def __init__(self):
-        self.row_count = 6
-        self.column_count = 7
+    def __init__(self, use_bitboard=False, row_count=6, column_count=7, connect=4):
+        self.row_count = row_count
+        self.column_count = column_count
+        self.connect = connect  # discs in a row needed to win
+        self.use_bitboard = use_bitboard  # store the grid as a bitboard Position instead of a numpy array
         self.board = self.create_board()
         self.players = [1, 2]
         self.human = random.choice(self.players)
@@ -13,184 +26,442 @@ class Board:
         self.current_player = 1
         self.winner = None
         self.tie = False
+        self.tt = None  # optional TranspositionTable shared by minimax/negamax, set one per game
+        self.nodes = 0  # nodes searched, also used to check the clock only every so often
+        self.deadline = None  # time.perf_counter() value after which the search gives up
+        self.pv = []  # principal variation of the last completed iteration, tried first at each ply
+        # winning square masks for threat_moves, shared by every Board of this size (MCTSNode makes one per child)
+        self.geometry = geometry_of(self.row_count, self.column_count, self.connect)
+        # move ordering: columns from the center out, two killer moves per ply and a history score per (piece, cell),
+        # the last two made by the first search that needs them
+        self.center_order = self.geometry.center_order
+        self._killers = None
+        self._history = None
+        self.randomize = False  # shuffle equally ranked moves, the search is deterministic otherwise
+        # look for immediate wins and threats before expanding a node, see threat_moves; the pruned moves
+        # change which leaves get backed up, so depth limited scores differ from the search without it
+        self.tactics = True
+        self.stats = None  # optional stats.SearchStats the searches count their work in
+        self.move_stack = []  # (column, row) of every make_move not undone yet, newest last
+        self.tablebase = None  # optional tablebase.Tablebase, exact scores for nearly full boards
+
+    @property
+    def killers(self):
+        if self._killers is None:
+            self._killers = [[None, None] for _ in range(self.row_count * self.column_count + 1)]
+        return self._killers
+
+    @killers.setter
+    def killers(self, killers):
+        self._killers = killers
+
+    @property
+    def history(self):
+        if self._history is None:
+            self._history = [[0] * ((self.row_count + 1) * self.column_count) for _ in self.players]
+        return self._history
+
+    @history.setter
+    def history(self, history):
+        self._history = history
 
     def create_board(self):
+        if self.use_bitboard:
+            return Position(self.row_count, self.column_count, self.connect)
         return np.zeros((self.row_count, self.column_count), dtype=int)
 
     def print_board(self, board):
         print(np.flip(board, 0))
+    # every board helper takes either the numpy array or a bitboard Position
     def check_valid_location(self, board, column):
+        if isinstance(board, Position):
+            return board.check_valid_location(column)
         return board[self.row_count - 1][column] == 0
 
     def next_open_row(self, board, column):
+        if isinstance(board, Position):
+            return board.next_open_row(column)
         for r in range(self.row_count):
             if board[r][column] == 0:
                 return r
         return None
 
     def drop_piece(self, board, row, column, piece):
+        if isinstance(board, Position):
+            board.drop(column, piece)  # a disc always lands on top, so row is implied
+            return
         board[row][column] = piece
 
+    def make_move(self, board, column, piece):
+        '''
+        play column on board in place and remember it, so undo_move can take it back;
+        the searches walk the tree this way instead of copying the board for every child
+        '''
+        row = self.next_open_row(board, column)
+        self.drop_piece(board, row, column, piece)
+        self.move_stack.append((column, row))
+
+    def undo_move(self, board):
+        '''
+        take back the last make_move on board, returns its column
+        '''
+        column, row = self.move_stack.pop()
+        if isinstance(board, Position):
+            board.undo()
+        else:
+            board[row][column] = 0
+        return column
+
     def switch_player(self):
         self.current_player = 2 if self.current_player == 1 else 1
 
 
     def check_for_win(self, board, piece):
+        if isinstance(board, Position):
+            return board.check_for_win(piece)
+
+        n = self.connect
         # Horizontal
-        for c in range(self.column_count - 3):
+        for c in range(self.column_count - (n - 1)):
             for r in range(self.row_count):
-                if all(board[r][c + i] == piece for i in range(4)):
+                if all(board[r][c + i] == piece for i in range(n)):
                     return True
 
         # Vertical
         for c in range(self.column_count):
-            for r in range(self.row_count - 3):
-                if all(board[r + i][c] == piece for i in range(4)):
+            for r in range(self.row_count - (n - 1)):
+                if all(board[r + i][c] == piece for i in range(n)):
                     return True
 
         # Positive diagonal
-        for c in range(self.column_count - 3):
-            for r in range(self.row_count - 3):
-                if all(board[r + i][c + i] == piece for i in range(4)):
+        for c in range(self.column_count - (n - 1)):
+            for r in range(self.row_count - (n - 1)):
+                if all(board[r + i][c + i] == piece for i in range(n)):
                     return True
 
         # Negative diagonal
-        for c in range(self.column_count - 3):
-            for r in range(3, self.row_count):
-                if all(board[r - i][c + i] == piece for i in range(4)):
+        for c in range(self.column_count - (n - 1)):
+            for r in range(n - 1, self.row_count):
+                if all(board[r - i][c + i] == piece for i in range(n)):
                     return True
 
         return False
 
     def is_tie(self, board):
+        if isinstance(board, Position):
+            return board.is_tie()
         return np.all(board != 0)
 
     def player_turn(self):
         return self.current_player == self.human
 
     def get_valid_locations(self, board):
+        if isinstance(board, Position):
+            return board.get_valid_locations()
         return [col for col in range(self.column_count) if self.check_valid_location(board, col)]
 
     def score_position(self, board, piece):
-        score = 0
-        center_array = [int(i) for i in list(board[:, self.column_count // 2])]
-        center_count = center_array.count(piece)
-        score += center_count * 3
-
-        for r in range(self.row_count):
-            row_array = list(board[r, :])
-            for c in range(self.column_count - 3):
-                window = row_array[c:c + 4]
-                score += self.evaluate_window(window, piece)
+        # same scoring as evaluate_window over every window, done in batch by evaluation.py
+        if isinstance(board, Position):
+            return score_bitboards(board, piece)
+        return score_board(board, piece, self.connect)
 
-        for c in range(self.column_count):
-            col_array = list(board[:, c])
-            for r in range(self.row_count - 3):
-                window = col_array[r:r + 4]
-                score += self.evaluate_window(window, piece)
-
-        for r in range(self.row_count - 3):
-            for c in range(self.column_count - 3):
-                window = [board[r + i][c + i] for i in range(4)]
-                score += self.evaluate_window(window, piece)
-
-        for r in range(3, self.row_count):
-            for c in range(self.column_count - 3):
-                window = [board[r - i][c + i] for i in range(4)]
-                score += self.evaluate_window(window, piece)
-
-        return score
+    def score_positions(self, boards, piece):
+        '''
+        score a whole (N, row_count, column_count) stack of boards in one call, returns an (N,) array
+        '''
+        return score_boards(boards, piece, self.connect)
 
     def evaluate_window(self, window, piece):
         score = 0
         opp_piece = 1 if piece == 2 else 2
 
-        if window.count(piece) == 4:
+        n = self.connect
+
+        if window.count(piece) == n:
             score += 100
-        elif window.count(piece) == 3 and window.count(0) == 1:
+        elif window.count(piece) == n - 1 and window.count(0) == 1:
             score += 10
-        elif window.count(piece) == 2 and window.count(0) == 2:
+        elif window.count(piece) == n - 2 and window.count(0) == 2:
             score += 5
 
-        if window.count(opp_piece) == 3 and window.count(0) == 1:
+        if window.count(opp_piece) == n - 1 and window.count(0) == 1:
             score -= 80
 
         return score
 
-    def minimax(self, board, depth, alpha, beta, maximizingPlayer):
-        valid_locations = self.get_valid_locations(board)
-        is_terminal = self.check_for_win(board, 1) or self.check_for_win(board, 2) or self.is_tie(board)
+    def order_moves(self, board, ply, tt_move, piece):
+        '''
+        columns in the order alpha-beta should try them: principal variation and
+        transposition table move, then the killers of this ply, then the rest by
+        history score with the center columns first among equals
+        '''
+        moves = [col for col in self.center_order if board.heights[col] < board.row_count]
+        if board.is_symmetric():
+            # a column and its mirror lead to mirror images of each other, search one of every pair
+            last = board.column_count - 1
+            if self.randomize and random.random() < 0.5:
+                moves = [col for col in moves if col >= last - col]
+            else:
+                moves = [col for col in moves if col <= last - col]
+        if self.randomize:
+            random.shuffle(moves)  # ties are broken at random instead of center-first
+        history = self.history[piece - 1]
+        h1 = board.row_count + 1
+        moves.sort(key=lambda col: -history[col * h1 + board.heights[col]])  # stable, keeps the tie order
+        first = []
+        if ply < len(self.pv):
+            first.append(self.pv[ply])
+        first.append(tt_move)
+        if ply < len(self.killers):
+            first.extend(self.killers[ply])
+        front = 0
+        for move in first:
+            if move in moves and moves.index(move) >= front:
+                moves.remove(move)
+                moves.insert(front, move)
+                front += 1
+        return moves
+
+    def threat_moves(self, board, piece):
+        '''
+        tactics for piece, the side to move, straight from the winning square masks: returns
+        (columns, result) where result is 1 when piece can win at once (columns is that move),
+        -1 when every move loses (the opponent has two threats, or each move would play right
+        under an opponent's winning square) and None otherwise, with columns the moves still
+        worth searching: the one block when the opponent threatens to win, else every move that
+        doesn't hand the opponent a win
+        '''
+        geometry = self.geometry
+        h1 = board.row_count + 1
+        own = board.bitboards[piece - 1]
+        mask = board.bitboards[0] | board.bitboards[1]
+        possible = geometry.possible(mask)
+        wins = geometry.winning_squares(own, mask) & possible
+        if wins:
+            return [((wins & -wins).bit_length() - 1) // h1], 1
+        opponent_wins = geometry.winning_squares(own ^ mask, mask)
+        forced = possible & opponent_wins
+        if forced:
+            if forced & (forced - 1):
+                return [((forced & -forced).bit_length() - 1) // h1], -1  # can only block one of them
+            possible = forced
+        non_losing = possible & ~(opponent_wins >> 1)
+        if not non_losing:
+            return [((possible & -possible).bit_length() - 1) // h1], -1
+        return [col for col in range(board.column_count) if non_losing & geometry.column_masks[col]], None
+
+    def record_cutoff(self, board, column, ply, depth, piece):
+        '''
+        remember a move that caused a beta cutoff as a killer for its ply and in the history table
+        '''
+        killers = self.killers[ply]
+        if killers[0] != column:
+            killers[1] = killers[0]
+            killers[0] = column
+        self.history[piece - 1][column * (board.row_count + 1) + board.heights[column]] += depth * depth
+        if self.stats is not None:
+            self.stats.cutoff(ply)
+
+    def tablebase_lookup(self, board, ply):
+        '''
+        (column, exact score for the side to move) from the tablebase, None if it isn't known;
+        only the root is solved when missing, deeper nodes just look it up so the search stays fast
+        '''
+        if ply == 0:
+            return self.tablebase.best_move(board)
+        score = self.tablebase.probe(board)
+        return None if score is None else (None, score)
 
-        if depth == 0 or is_terminal:
-            if is_terminal:
-                if self.check_for_win(board, self.comp):
-                    return (None, 1000000)
-                elif self.check_for_win(board, self.human):
-                    return (None, -1000000)
-                else:
-                    return (None, 0)
+    def tt_key(self, board, salt):
+        '''
+        (transposition table key, mirrored) of board. A position and its mirror image share one
+        entry, stored as seen from whichever of the two has the smaller hash; when that is the
+        mirror image, mirrored is True and moves going in or out of the entry are flipped.
+        '''
+        if board.mirror_hash < board.hash:
+            return board.mirror_hash ^ salt, True
+        return board.hash ^ salt, False
+
+    def minimax(self, board, depth, alpha, beta, maximizingPlayer, ply=0):
+        self.nodes += 1
+        if self.deadline is not None and self.nodes & 255 == 0 and time.perf_counter() > self.deadline:
+            raise SearchTimeout
+        stats = self.stats
+        if stats is not None:
+            stats.nodes += 1
+            if ply == 0:
+                stats.depth = depth
+        if not isinstance(board, Position):
+            board = Position.from_array(board, self.connect)  # search on a bitboard so each node knows its winner without rescanning
+        is_terminal = board.is_terminal()
+
+        if is_terminal:
+            if board.winner == self.comp:
+                return (None, 1000000)
+            elif board.winner == self.human:
+                return (None, -1000000)
             else:
-                return (None, self.score_position(board, self.comp))
+                return (None, 0)
+
+        if self.tablebase is not None and self.tablebase.covers(board):
+            found = self.tablebase_lookup(board, ply)
+            if found is not None:
+                column, score = found
+                value = 0 if score == 0 else 1000000 if score > 0 else -1000000
+                return column, value if maximizingPlayer else -value
+
+        # transposition table: reuse what an earlier visit of this position found out
+        tt_move = None
+        if self.tt is not None:
+            key, mirrored = self.tt_key(board, 0 if maximizingPlayer else MINIMIZING_KEY)
+            entry = self.tt.probe(key)
+            if stats is not None:
+                stats.tt_probes += 1
+                stats.tt_hits += entry is not None
+            if entry is not None:
+                _, tt_depth, flag, tt_value, tt_move, _ = entry
+                if mirrored and tt_move is not None:
+                    tt_move = board.column_count - 1 - tt_move
+                if tt_depth >= depth:
+                    if flag == EXACT:
+                        return tt_move, tt_value
+                    elif flag == LOWER:
+                        alpha = max(alpha, tt_value)
+                    else:
+                        beta = min(beta, tt_value)
+                    if alpha >= beta:
+                        return tt_move, tt_value
+            # the window actually searched: a bound from a deeper entry may have narrowed it
+            alpha_orig, beta_orig = alpha, beta
+
+        if depth == 0:
+            if stats is not None:
+                stats.leaf_evals += 1
+            value = self.score_position(board, self.comp)
+            if self.tt is not None:
+                self.tt.store(key, 0, EXACT, value, None)
+            return (None, value)
+
+        piece = self.comp if maximizingPlayer else self.human
+        candidates = None
+        if self.tactics:
+            candidates, result = self.threat_moves(board, piece)
+            if result is not None:
+                return candidates[0], result * 1000000 if maximizingPlayer else -result * 1000000
+        valid_locations = self.order_moves(board, ply, tt_move, piece)
+        if candidates is not None:
+            valid_locations = [col for col in valid_locations if col in candidates]
+        best_column = valid_locations[0]
 
         if maximizingPlayer:
             value = -math.inf
-            best_column = random.choice(valid_locations)
             for column in valid_locations:
-                row = self.next_open_row(board, column)
-                temp_board = np.copy(board)
-                self.drop_piece(temp_board, row, column, self.comp)
-                new_score = self.minimax(temp_board, depth - 1, alpha, beta, False)[1]
+                self.make_move(board, column, self.comp)
+                new_score = self.minimax(board, depth - 1, alpha, beta, False, ply + 1)[1]
+                self.undo_move(board)
                 if new_score > value:
                     value = new_score
                     best_column = column
                 alpha = max(alpha, value)
                 if alpha >= beta:
+                    self.record_cutoff(board, column, ply, depth, piece)
                     break
-            return best_column, value
 
         else:
             value = math.inf
-            best_column = random.choice(valid_locations)
             for column in valid_locations:
-                row = self.next_open_row(board, column)
-                temp_board = board.copy()
-                self.drop_piece(temp_board, row, column, self.human)
-                new_score = self.minimax(temp_board, depth - 1, alpha, beta, True)[1]
+                self.make_move(board, column, self.human)
+                new_score = self.minimax(board, depth - 1, alpha, beta, True, ply + 1)[1]
+                self.undo_move(board)
                 if new_score < value:
                     value = new_score
                     best_column = column
                 beta = min(beta, value)
                 if alpha >= beta:
+                    self.record_cutoff(board, column, ply, depth, piece)
                     break
-            return best_column, value
 
-    def negamax(self, board, depth, alpha, beta, color):
-        comp = 1 if self.human == 2 else 2  #need to define comp only for negamax so it's defined here and not under __init__ 
+        if self.tt is not None:
+            flag = UPPER if value <= alpha_orig else LOWER if value >= beta_orig else EXACT
+            self.tt.store(key, depth, flag, value, board.column_count - 1 - best_column if mirrored else best_column)
+        return best_column, value
 
-        valid_locations = self.get_valid_locations(board)
-        is_terminal = self.check_for_win(board, comp) or self.check_for_win(board, self.human) or self.is_tie(board)
+    def negamax(self, board, depth, alpha, beta, color, ply=0):
+        comp = 1 if self.human == 2 else 2  #need to define comp only for negamax so it's defined here and not under __init__ 
 
-        if depth == 0 or is_terminal:
-            if is_terminal:
-                if self.check_for_win(board, comp):
-                    return (None, color * 1000000)
-                elif self.check_for_win(board, self.human):
-                    return (None, color * -1000000)
-                else:
-                    return (None, 0)
+        self.nodes += 1
+        if self.deadline is not None and self.nodes & 255 == 0 and time.perf_counter() > self.deadline:
+            raise SearchTimeout
+        stats = self.stats
+        if stats is not None:
+            stats.nodes += 1
+            if ply == 0:
+                stats.depth = depth
+        if not isinstance(board, Position):
+            board = Position.from_array(board, self.connect)
+        is_terminal = board.is_terminal()
+
+        if is_terminal:
+            if board.winner == comp:
+                return (None, color * 1000000)
+            elif board.winner == self.human:
+                return (None, color * -1000000)
             else:
-                return (None, color * self.score_position(board, comp))
-
+                return (None, 0)
+
+        if self.tablebase is not None and self.tablebase.covers(board):
+            found = self.tablebase_lookup(board, ply)
+            if found is not None:
+                column, score = found
+                return column, 0 if score == 0 else 1000000 if score > 0 else -1000000  # score is for the side to move
+
+        tt_move = None
+        if self.tt is not None:
+            key, mirrored = self.tt_key(board, NEGAMAX_KEY if color == 1 else NEGAMAX_KEY ^ MINIMIZING_KEY)
+            entry = self.tt.probe(key)
+            if stats is not None:
+                stats.tt_probes += 1
+                stats.tt_hits += entry is not None
+            if entry is not None:
+                _, tt_depth, flag, tt_value, tt_move, _ = entry
+                if mirrored and tt_move is not None:
+                    tt_move = board.column_count - 1 - tt_move
+                if tt_depth >= depth:
+                    if flag == EXACT:
+                        return tt_move, tt_value
+                    elif flag == LOWER:
+                        alpha = max(alpha, tt_value)
+                    else:
+                        beta = min(beta, tt_value)
+                    if alpha >= beta:
+                        return tt_move, tt_value
+            alpha_orig, beta_orig = alpha, beta  # after narrowing, as in minimax
+
+        if depth == 0:
+            if stats is not None:
+                stats.leaf_evals += 1
+            value = color * self.score_position(board, comp)
+            if self.tt is not None:
+                self.tt.store(key, 0, EXACT, value, None)
+            return (None, value)
+
+        piece = comp if color == 1 else self.human
+        candidates = None
+        if self.tactics:
+            candidates, result = self.threat_moves(board, piece)
+            if result is not None:
+                return candidates[0], result * 1000000  # already from the side to move's view
+        valid_locations = self.order_moves(board, ply, tt_move, piece)
+        if candidates is not None:
+            valid_locations = [col for col in valid_locations if col in candidates]
         value = -math.inf
-        best_column = random.choice(valid_locations)
+        best_column = valid_locations[0]
 
         for column in valid_locations:
-            row = self.next_open_row(board, column)
-            temp_board = np.copy(board)
-            piece = comp if color == 1 else self.human
-            self.drop_piece(temp_board, row, column, piece)
-
-            new_score = -self.negamax(temp_board, depth - 1, -beta, -alpha, -color)[1]
+            self.make_move(board, column, piece)
+            new_score = -self.negamax(board, depth - 1, -beta, -alpha, -color, ply + 1)[1]
+            self.undo_move(board)
 
             if new_score > value:
                 value = new_score
@@ -198,18 +469,107 @@ class Board:
 
             alpha = max(alpha, value)
             if alpha >= beta:
+                self.record_cutoff(board, column, ply, depth, piece)
                 break
 
+        if self.tt is not None:
+            flag = UPPER if value <= alpha_orig else LOWER if value >= beta_orig else EXACT
+            self.tt.store(key, depth, flag, value, board.column_count - 1 - best_column if mirrored else best_column)
         return best_column, value
 
+    def iterative_deepening(self, board, time_budget_ms, max_depth=None, use_negamax=False, on_iteration=None):
+        '''
+        search depth 1, 2, 3... for the computer until time_budget_ms runs out
+        returns (column, score, depth) of the last iteration that finished;
+        on_iteration(depth, column, score) is called after every finished iteration
+        '''
+        if not isinstance(board, Position):
+            board = Position.from_array(board, self.connect)
+        if self.tt is None:
+            self.tt = TranspositionTable()  # needed to carry the principal variation between iterations
+        self.tt.new_search()
+        self.killers = [[None, None] for _ in self.killers]
+        self.history = [[score // 2 for score in scores] for scores in self.history]  # older cutoffs count for less
+        empty = board.row_count * board.column_count - board.moves
+        max_depth = empty if max_depth is None else min(max_depth, empty)
+        start = time.perf_counter()
+        self.pv = []
+        best = (None, 0, 0)
+        stats = self.stats
+        iteration_start = start
+        stack_depth = len(self.move_stack)
+        try:
+            for depth in range(1, max(max_depth, 1) + 1):
+                # depth 1 always runs to the end so there is a move to return
+                self.deadline = None if depth == 1 else start + time_budget_ms / 1000
+                if stats is not None:
+                    iteration_start, nodes_before = time.perf_counter(), stats.nodes
+                if use_negamax:
+                    column, value = self.negamax(board, depth, -math.inf, math.inf, 1)
+                else:
+                    column, value = self.minimax(board, depth, -math.inf, math.inf, True)
+                best = (column, value, depth)
+                if stats is not None:
+                    elapsed = time.perf_counter() - iteration_start
+                    stats.iterations.append((depth, stats.nodes - nodes_before, elapsed * 1000))
+                    stats.add_time('search', elapsed)
+                self.pv = self.principal_variation(board, depth, use_negamax)
+                if on_iteration is not None:
+                    on_iteration(depth, column, value)
+                if abs(value) >= 1000000 or time.perf_counter() - start > time_budget_ms / 1000:
+                    break  # the game is decided, or the budget is already used up
+        except SearchTimeout:
+            # the search was left somewhere down the tree, take its moves back
+            while len(self.move_stack) > stack_depth:
+                self.undo_move(board)
+            if stats is not None:
+                stats.add_time('aborted iteration', time.perf_counter() - iteration_start)
+        finally:
+            self.deadline = None
+            self.pv = []
+        return best
+
+    def principal_variation(self, board, depth, use_negamax=False):
+        '''
+        follow the best moves stored in the transposition table from board
+        '''
+        position = board.copy()
+        pv = []
+        maximizing = True
+        while len(pv) < depth and not position.is_terminal():
+            if use_negamax:
+                key, mirrored = self.tt_key(position, NEGAMAX_KEY if maximizing else NEGAMAX_KEY ^ MINIMIZING_KEY)
+            else:
+                key, mirrored = self.tt_key(position, 0 if maximizing else MINIMIZING_KEY)
+            entry = self.tt.probe(key)
+            if entry is None or entry[4] is None:
+                break
+            move = position.column_count - 1 - entry[4] if mirrored else entry[4]
+            if not position.check_valid_location(move):
+                break
+            pv.append(move)
+            position.drop(move, self.comp if maximizing else self.human)
+            maximizing = not maximizing
+        return pv
+
 class MCTSNode:
-    def __init__(self, board, parent=None):
+    def __init__(self, board, parent=None, move=None, position=None):
         self.board = board
         self.parent = parent #the previous state that led to the current state
+        self.move = move #column played to get here from the parent
         self.children = [] #all possible future game states from current state
         self.wins = 0 #counts winning result of a simulation 
         self.visits = 0 #counts number of times a node has been visited
-        self.unexplored_moves = self.board.get_valid_locations(self.board.board) 
+        # the grid as a bitboard, made once at the root and by one drop from the parent's for every child,
+        # so the drop has already worked out whether the game is over
+        if position is None:
+            position = board.board if isinstance(board.board, Position) else Position.from_array(board.board, board.connect)
+        self.position = position
+        self.terminal = position.is_terminal()
+        self.unexplored_moves = [] if self.terminal else position.get_valid_locations()
+        if position.is_symmetric():
+            last = self.board.column_count - 1
+            self.unexplored_moves = [col for col in self.unexplored_moves if col <= last - col]  # the mirrored moves give the same results
         
     def print_board(self):
         self.board.print_board(self.board.board) #defined again in MCTSNode or else using it is confsing and wordy 
@@ -224,47 +584,45 @@ class MCTSNode:
         '''
         col = self.unexplored_moves.pop()  # Get a column to explore, remove from unexplored moves since you'll explore it 
         #copy the current board's state 
-        new_board_array = np.copy(self.board.board) #this is the numpy board 
+        new_board_array = self.board.board.copy() #this is the numpy board or bitboard Position
         # create new board with the copied array state
-        new_board = Board() 
+        new_board = Board(self.board.use_bitboard, self.board.row_count, self.board.column_count, self.board.connect)
         new_board.board = new_board_array  
         new_board.current_player = self.board.current_player  # define this so the new board knows whose turn it is 
+        new_board.tablebase = self.board.tablebase
         
         # drop piece in new board 
         row = new_board.next_open_row(new_board.board, col)  # Find the open row for the move
         new_board.drop_piece(new_board.board, row, col, new_board.current_player)  # Drop the piece
+        if isinstance(new_board.board, Position):
+            position = new_board.board
+        else:
+            position = self.position.copy()
+            position.drop(col, new_board.current_player)
         new_board.switch_player()
-        self.children.append(MCTSNode(new_board, self))  # Add the new board as a child node
+        self.children.append(MCTSNode(new_board, self, col, position))  # Add the new board as a child node
         return self.children[-1]  # Return the new child node
     
 
     def simulate(self):
         '''
         run a simulation from the current node to the end of the game
-        returns result of simulation 
+        returns result of simulation for the player who moved into this node,
+        since that is who the parent is choosing for when it compares children
         '''
-
-        new_board_array = np.copy(self.board.board)
-        new_board = Board()
-        new_board.board = new_board_array
-        new_board.current_player = self.board.current_player  # Set the current player for the new board
-        starting_player = new_board.current_player  # Store the starting player to get the results later 
-        #go down the tree until the end 
-        is_terminal=new_board.check_for_win(new_board.board, new_board.current_player) or new_board.is_tie(new_board.board)
-        while not is_terminal:
-            valid_locations= new_board.get_valid_locations(new_board.board)
-            best_column = random.choice(valid_locations) 
-            row = new_board.next_open_row(new_board.board, best_column)
-            new_board.drop_piece(new_board.board, row, best_column, new_board.current_player)
-            new_board.switch_player()
-            is_terminal=new_board.check_for_win(new_board.board, new_board.current_player) or new_board.is_tie(new_board.board)
+        # play the rollout on a bitboard, each drop already knows whether it won
+        position = self.position.copy()
+        current_player = self.board.current_player
+        mover = 2 if current_player == 1 else 1  # player who made the move into this node
+        # play to the end with the rollout policy (win, block, else lean to the center), see rollouts.py
+        winner = rollout(position, current_player, self.board.tablebase) or None
         #results 
-        if new_board.check_for_win(new_board.board, new_board.current_player) and new_board.current_player == starting_player:
-            result=1 #player who started in the simulation wins
-        elif new_board.is_tie(new_board.board):
+        if winner == mover:
+            result=1 #player who moved into this node wins
+        elif winner is None:
             result=0 #tie no one wins
         else:
-            result=-1 #player who started loses 
+            result=-1 #player who moved into this node loses 
         return result 
      
     
@@ -311,34 +669,56 @@ class MCTSNode:
         return best_child
 
 
-def mcts_search(board, max_iterations=100):
+def mcts_search(board, max_iterations=100, stats=None):
     """
     Runs the Monte Carlo Tree Search (MCTS) to determine the best column for the AI to play.
-    The result is the column that the AI should play.
+    The result is the column that the AI should play, None once the game is over.
+    stats is an optional stats.SearchStats that gets the tree size, depth and time per phase.
     """
     root = MCTSNode(board)
+    if root.terminal:
+        return None  # the game is over, there is no move to pick
+    if stats is not None:
+        stats.tree_size += 1
 
     for _ in range(max_iterations):
+        if stats is not None:
+            start = time.perf_counter()
         node = root
+        depth = 0
         while node.is_fully_expanded() and node.children:
             node = max(
                 node.children,
                 key=lambda child: child.wins / child.visits + math.sqrt(2 * math.log(node.visits) / child.visits)
             )
+            depth += 1
+        if stats is not None:
+            selected = time.perf_counter()
 
         # expansion: expand the node if explored
         if not node.is_fully_expanded():
             node = node.expand()
+            depth += 1
+            if stats is not None:
+                stats.tree_size += 1
+        if stats is not None:
+            expanded = time.perf_counter()
         #simulate game
         result = node.simulate()
+        if stats is not None:
+            simulated = time.perf_counter()
         # update node
         node.backpropagation(node, result)
+        if stats is not None:
+            stats.rollouts += 1
+            stats.max_depth = max(stats.max_depth, depth)
+            stats.add_time('select', selected - start)
+            stats.add_time('expand', expanded - selected)
+            stats.add_time('rollout', simulated - expanded)
+            stats.add_time('backpropagate', time.perf_counter() - simulated)
     # Choose based on num of visits
     best_child = max(root.children, key=lambda child: child.visits)
-    #finds column that changed from last time 
-    for col in range(board.column_count):
-        if not (board.board[:, col] == best_child.board.board[:, col]).all():
-            return col
+    return best_child.move
 
 #==== Test MCTS ====#
 # test_board=Board()
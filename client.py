@@ -0,0 +1,180 @@
+'''
+Client side of server.py.
+
+EngineClient sends one request at a time and waits for its reply.
+RemoteWorker has the interface of worker.SearchWorker (request, poll,
+busy, depth, close), so the pygame UI can ask a running server for its
+moves instead of starting a search process of its own:
+
+    python server.py --listen 127.0.0.1:7740
+    python main.py --server 127.0.0.1:7740
+
+Only the standard library and bitboard.py are needed here, the engine
+itself stays in the server.
+'''
+import itertools
+import json
+import socket
+import threading
+import time
+from bitboard import Position
+
+DEFAULT_ADDRESS = '127.0.0.1:7740'
+
+
+def parse_address(address):
+    '''
+    ('unix', path) for "unix:/path/to/socket", ('tcp', host, port) for "host:port"
+    '''
+    if address.startswith('unix:'):
+        return 'unix', address[len('unix:'):]
+    host, _, port = address.rpartition(':')
+    if not host or not port.isdigit():
+        raise ValueError(f"bad address {address!r}, expected host:port or unix:/path")
+    return 'tcp', host.strip('[]'), int(port)
+
+
+def connect(address):
+    kind, *where = parse_address(address)
+    if kind == 'unix':
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(where[0])
+        return sock
+    return socket.create_connection(tuple(where))
+
+
+def position_request(position):
+    '''
+    the fields of a request for position: the move string when the move order is known (and the
+    board has at most 9 columns), its key otherwise
+    '''
+    request = {'rows': position.row_count, 'columns': position.column_count, 'connect': position.connect}
+    if len(position.history) == position.moves and position.column_count <= 9:
+        request['moves'] = position.to_moves()
+    else:
+        request['key'] = position.key()
+    return request
+
+
+class EngineClient:
+
+    def __init__(self, address=DEFAULT_ADDRESS):
+        self.sock = connect(address)
+        self.file = self.sock.makefile('rwb')
+        self.ids = itertools.count(1)
+
+    def call(self, request, on_progress=None):
+        '''
+        send request (a dict, see server.py) and return the reply; on_progress(message) gets the
+        progress messages before it. Raises ValueError when the server turns the request down.
+        '''
+        request = dict(request, id=next(self.ids))
+        self.file.write(json.dumps(request).encode() + b'\n')
+        self.file.flush()
+        while True:
+            line = self.file.readline()
+            if not line:
+                raise ConnectionError("the engine server closed the connection")
+            reply = json.loads(line)
+            if reply.get('id') != request['id']:
+                continue  # left over from a request that was given up on
+            if reply.get('progress'):
+                if on_progress is not None:
+                    on_progress(reply)
+                continue
+            if 'error' in reply:
+                raise ValueError(reply['error'])
+            return reply
+
+    def search(self, moves, time_budget_ms=None, max_depth=None, collect_stats=False, on_progress=None):
+        '''
+        the server's Engine.search for moves, a move string (standard board) or a Position
+        '''
+        request = {'moves': moves} if isinstance(moves, str) else position_request(moves)
+        if time_budget_ms is not None:
+            request['time'] = time_budget_ms
+        if max_depth is not None:
+            request['depth'] = max_depth
+        request['stats'] = collect_stats
+        request['progress'] = on_progress is not None
+        return self.call(request, on_progress)
+
+    def close(self):
+        try:
+            self.file.close()
+        except OSError:
+            pass  # a request still buffered for a server that hung up
+        finally:
+            self.sock.close()
+
+
+class RemoteWorker:
+    '''
+    worker.SearchWorker for the UI, searching on a server.py engine; the reply is waited
+    for on a thread so the pygame loop keeps going
+    '''
+    def __init__(self, address=DEFAULT_ADDRESS, collect_stats=False):
+        self.address = address
+        self.client = None
+        self.thread = None
+        self.busy = False
+        self.started_at = None
+        self.depth = 0
+        self.collect_stats = collect_stats
+        self.last_stats = None
+        self.reply = None
+        self.error = None
+
+    def request(self, board, time_budget_ms):
+        '''
+        start searching the computer's move for board (a Board), returns straight away
+        '''
+        if self.client is None:
+            self.client = EngineClient(self.address)
+        grid = board.board
+        position = grid if isinstance(grid, Position) else Position.from_array(grid, board.connect)
+        request = position_request(position)  # built here, the board may change while the thread waits
+        request.update(time=time_budget_ms, stats=self.collect_stats, progress=True)
+        self.busy = True
+        self.started_at = time.perf_counter()
+        self.depth = 0
+        self.reply, self.error = None, None
+        self.thread = threading.Thread(target=self._wait, args=(request,), daemon=True)
+        self.thread.start()
+
+    def _wait(self, request):
+        try:
+            self.reply = self.client.call(request, self._progress)
+        except (OSError, ValueError) as error:
+            self.error = error
+
+    def _progress(self, message):
+        self.depth = message['depth']
+
+    def poll(self):
+        '''
+        the column once the server has answered, None while it is still searching. Raises the
+        OSError of a lost connection (the next request connects again) or the ValueError of a
+        request the server turned down.
+        '''
+        if not self.busy or self.thread.is_alive():
+            return None
+        self.busy = False
+        if self.error is not None:
+            if isinstance(self.error, OSError):
+                self.close()
+            raise self.error
+        self.last_stats = self.reply.get('stats')
+        return self.reply['column']
+
+    def elapsed_ms(self):
+        return 0 if self.started_at is None else (time.perf_counter() - self.started_at) * 1000
+
+    def close(self):
+        '''
+        hang up; a search still running on the server finishes there and its reply is dropped
+        '''
+        if self.client is not None:
+            self.client.close()
+            self.client = None
+        self.busy = False
@@ -0,0 +1,122 @@
+'''
+The engine without the game: best move for a position within a time budget.
+
+This is what the pygame UI's worker runs (iterative deepening with a
+transposition table and the endgame tablebase), as a library and a command
+line tool. With --book and an opening book built by solver.py, early
+positions whose moves all lead into the book are answered from it without
+searching. It imports numpy and the search modules but never pygame, so
+short-lived analysis processes start in a fraction of the time main.py
+takes.
+
+Positions are move strings of 1-based columns, as in arena.py and
+analysis.py, with player 1 moving first.
+
+    python -m engine 4453 --time 500
+    python engine.py 44444 --depth 8 --stats
+'''
+import argparse
+import json
+import time
+from bitboard import Position
+from board import Board
+from solver import OpeningBook, split
+from stats import SearchStats
+from tablebase import Tablebase
+from transposition import TranspositionTable
+
+
+class Engine:
+    '''
+    one iterative deepening search and its caches, kept warm from one position to the next
+    '''
+    def __init__(self, geometry=(6, 7, 4), tablebase=None, book=None):
+        self.geometry = tuple(geometry)
+        self.board = Board(False, *self.geometry)
+        self.board.tt = TranspositionTable()
+        self.board.tablebase = tablebase
+        self.book = book if self.geometry == (6, 7, 4) else None  # build_book only solves the standard board
+
+    def book_move(self, position):
+        '''
+        (column, exact score) from the opening book when every move leads to a book position, else None
+        '''
+        book = self.book
+        if book is None or not len(book) or position.moves >= book.depth:
+            return None
+        side = 1 if position.moves % 2 == 0 else 2
+        area = position.row_count * position.column_count
+        best = None
+        # center first, so ties go to the same move the solver would pick
+        for col in sorted(position.get_valid_locations(), key=lambda col: abs(col - position.column_count // 2)):
+            position.drop(col, side)
+            if position.winner is not None:
+                score = (area + 2 - position.moves) // 2  # wins straight away, as the solver scores it
+            else:
+                current, mask = split(position)
+                score = book.get(current + mask)
+                score = None if score is None else -score
+            position.undo()
+            if score is None:
+                return None
+            if best is None or score > best[1]:
+                best = (col, score)
+        return best
+
+    def search(self, moves, time_budget_ms=1000, max_depth=None, collect_stats=False, on_iteration=None):
+        '''
+        {'moves', 'to_move', 'column', 'score', 'depth', 'ms', 'source'} for the position after moves,
+        column 0-based and None once the game is over, source 'book' or 'search'; 'stats'
+        (SearchStats.as_dict()) too when collect_stats is set. moves can also be a Position.
+        on_iteration(depth, column, score) is passed on to Board.iterative_deepening.
+        Raises ValueError for a move string that can't be played.
+        '''
+        if isinstance(moves, str):
+            position = Position.from_moves(moves, *self.geometry)
+        else:
+            position, moves = moves, None
+        to_move = 1 if position.moves % 2 == 0 else 2
+        result = {'moves': moves, 'to_move': to_move, 'column': None, 'score': None, 'depth': 0, 'ms': 0.0, 'source': None}
+        board = self.board
+        board.stats = SearchStats() if collect_stats else None
+        start = time.perf_counter()
+        found = None if position.is_terminal() else self.book_move(position)
+        if found is not None:
+            column, score = found
+            # the same scale as the tablebase answers in the search
+            result.update(column=column, score=0 if score == 0 else 1000000 if score > 0 else -1000000, source='book')
+        elif not position.is_terminal():
+            board.comp, board.human = to_move, 3 - to_move  # the search plays for comp
+            column, score, depth = board.iterative_deepening(position, time_budget_ms, max_depth, on_iteration=on_iteration)
+            result.update(column=column, score=score, depth=depth, source='search')
+        result['ms'] = (time.perf_counter() - start) * 1000
+        if collect_stats:
+            result['stats'] = board.stats.as_dict()
+        board.stats = None
+        return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="best move for a position, without the game window")
+    parser.add_argument("moves", nargs="?", default="", help="move string of 1-based columns, empty for the start position")
+    parser.add_argument("--time", type=int, default=1000, help="time budget in ms")
+    parser.add_argument("--depth", type=int, default=None, help="stop at this depth even if there is time left")
+    parser.add_argument("--stats", action="store_true", help="include the search stats")
+    parser.add_argument("--tablebase", action="store_true", help="use and extend the endgame tablebase on disk (standard board only)")
+    parser.add_argument("--book", action="store_true", help="answer from the solver's opening book when it has the position")
+    parser.add_argument("--rows", type=int, default=6)
+    parser.add_argument("--columns", type=int, default=7)
+    parser.add_argument("--connect", type=int, default=4, help="discs in a row needed to win")
+    args = parser.parse_args()
+    geometry = (args.rows, args.columns, args.connect)
+    if args.tablebase and geometry != (6, 7, 4):
+        parser.error("the tablebase file is for the standard board, --tablebase needs 6 rows, 7 columns, connect 4")
+    tablebase = Tablebase() if args.tablebase else None
+    engine = Engine(geometry, tablebase, OpeningBook.load() if args.book else None)
+    try:
+        result = engine.search(args.moves, args.time, args.depth, args.stats)
+    except ValueError as error:
+        parser.error(str(error))
+    if tablebase is not None:
+        tablebase.flush()
+    print(json.dumps(result))
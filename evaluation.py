@@ -0,0 +1,108 @@
+'''
+Vectorized version of Board.score_position.
+
+The windows of `connect` cells (69 of them for four in a row on 6x7) are
+worked out once per board size. A window is turned into one base-3 code
+(0 empty, 1 player 1, 2 player 2 per cell) and its score is read from a
+table built with the same rules as Board.evaluate_window, so a whole board,
+or a whole stack of boards, is scored with a couple of numpy gathers.
+'''
+import numpy as np
+from functools import lru_cache
+from bitboard import fits_uint64
+
+
+@lru_cache(maxsize=None)
+def window_cells(row_count, column_count, connect=4):
+    '''
+    (n_windows, connect) array of flat (row-major) cell indices of every window on the board
+    '''
+    windows = []
+    for dr, dc in ((0, 1), (1, 0), (1, 1), (-1, 1)):
+        for row in range(row_count):
+            for col in range(column_count):
+                cells = [(row + i * dr, col + i * dc) for i in range(connect)]
+                if all(0 <= r < row_count and 0 <= c < column_count for r, c in cells):
+                    windows.append([r * column_count + c for r, c in cells])
+    return np.array(windows, dtype=np.intp).reshape(-1, connect)
+
+
+@lru_cache(maxsize=None)
+def window_bits(row_count, column_count, connect=4):
+    '''
+    same windows as window_cells but as bit indices of the bitboard layout in bitboard.py
+    '''
+    cells = window_cells(row_count, column_count, connect)
+    rows, cols = np.divmod(cells, column_count)
+    return (cols * (row_count + 1) + rows).astype(np.uint64)
+
+
+def center_columns(column_count):
+    '''
+    the column or two columns the center bonus counts: both middle ones on an even width,
+    so the score of a position and of its mirror image are the same
+    '''
+    return sorted({(column_count - 1) // 2, column_count // 2})
+
+
+@lru_cache(maxsize=None)
+def window_scores(piece, connect=4):
+    '''
+    score of every window code for piece, same rules as Board.evaluate_window
+    '''
+    opp_piece = 1 if piece == 2 else 2
+    scores = np.zeros(3 ** connect, dtype=np.int64)
+    for code in range(3 ** connect):
+        cells = [(code // 3 ** i) % 3 for i in range(connect)]
+        own, opp, empty = cells.count(piece), cells.count(opp_piece), cells.count(0)
+        if own == connect:
+            scores[code] += 100
+        elif own == connect - 1 and empty == 1:
+            scores[code] += 10
+        elif own == connect - 2 and empty == 2:
+            scores[code] += 5
+        if opp == connect - 1 and empty == 1:
+            scores[code] -= 80
+    return scores
+
+
+@lru_cache(maxsize=None)
+def powers(connect=4):
+    return 3 ** np.arange(connect, dtype=np.int64)
+
+
+def score_boards(boards, piece, connect=4):
+    '''
+    score_position for a stack of numpy boards with shape (N, rows, columns), returns an (N,) array
+    '''
+    boards = np.asarray(boards)
+    n, row_count, column_count = boards.shape
+    flat = boards.reshape(n, -1).astype(np.int64, copy=False)
+    codes = flat[:, window_cells(row_count, column_count, connect)] @ powers(connect)  # (N, n_windows)
+    center = (boards[:, :, center_columns(column_count)] == piece).sum(axis=(1, 2))
+    return window_scores(piece, connect)[codes].sum(axis=1) + 3 * center
+
+
+def score_board(board, piece, connect=4):
+    '''
+    score_position for one numpy board
+    '''
+    return int(score_boards(np.asarray(board)[None], piece, connect)[0])
+
+
+def score_bitboards(position, piece):
+    '''
+    score_position straight from a bitboard Position, without building the numpy board first
+    '''
+    if not fits_uint64(position.row_count, position.column_count):
+        return score_board(position.to_array(), piece, position.connect)
+    bits = window_bits(position.row_count, position.column_count, position.connect)
+    one = np.uint64(1)
+    weights = powers(position.connect)
+    codes = ((np.uint64(position.bitboards[0]) >> bits) & one).astype(np.int64) @ weights
+    codes += 2 * (((np.uint64(position.bitboards[1]) >> bits) & one).astype(np.int64) @ weights)
+    center_mask = 0
+    for col in center_columns(position.column_count):
+        center_mask |= ((1 << position.row_count) - 1) << (col * (position.row_count + 1))
+    center_count = (position.bitboards[piece - 1] & center_mask).bit_count()
+    return int(window_scores(piece, position.connect)[codes].sum()) + 3 * center_count
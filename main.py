@@ -1,11 +1,17 @@
+import argparse
 import pygame
 from board import Board
+from client import RemoteWorker
 from ui import UI
 
 def main():
+    parser = argparse.ArgumentParser(description="play connect 4 against the computer")
+    parser.add_argument("--server", default=None, help="let a running server.py (host:port or unix:/path) search instead of a process of our own")
+    args = parser.parse_args()
     pygame.init()  
-    board = Board()  
-    ui = UI(board)  
+    board = Board(use_bitboard=True)  
+    worker = RemoteWorker(args.server) if args.server else None
+    ui = UI(board, worker)  
     ui.on_execute()  
     pygame.quit()
 
@@ -0,0 +1,361 @@
+'''
+Array-backed Monte Carlo Tree Search.
+
+Same algorithm as MCTSNode/mcts_search in board.py, but the tree lives in
+preallocated parallel arrays instead of one Python object per node, and
+every iteration plays its moves on a single Position with drop/undo
+instead of copying boards. The children of a node are stored next to each
+other, so a node only needs the index of its first child and how many it
+has.
+
+Rollouts follow the policy in rollouts.py (win, block, else a center
+weighted random column). With leaf_rollouts > 1 the playouts of a leaf run
+together as one numpy batch, which is where most of the rollouts per
+second come from.
+'''
+import math
+import os
+import random
+import threading
+import time
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from bitboard import Position
+from rollouts import playouts, rollout as policy_rollout
+
+
+class MCTS:
+
+    def __init__(self, capacity=1 << 20, exploration=math.sqrt(2), leaf_rollouts=1, workers=1):
+        '''
+        capacity is the most nodes the tree can hold; once it is full the search keeps
+        running rollouts from the existing leaves instead of growing.
+        leaf_rollouts is how many playouts each new leaf gets; with workers > 1 they are
+        split over that many processes (call close() when done with the engine)
+        '''
+        self.capacity = capacity
+        self.exploration = exploration
+        self.leaf_rollouts = leaf_rollouts
+        self.workers = workers
+        self.pool = None
+        self.visits = array('l', [0]) * capacity
+        self.wins = array('l', [0]) * capacity  # +1/0/-1 per rollout, for the player who moved into the node
+        self.first_child = array('l', [-1]) * capacity  # -1 until the node is expanded
+        self.child_count = array('b', bytes(capacity))
+        self.move = array('b', [-1]) * capacity  # column played to reach the node
+        self.parent = array('l', [-1]) * capacity
+        self.size = 0
+        self.position = None
+        self.player = None  # player to move at the root
+        self.stats = None  # optional stats.SearchStats, gets the tree size, depth and time per phase
+        self.tablebase = None  # optional tablebase.Tablebase, ends rollouts with the exact result near the end
+
+    def reset(self, position, player, connect=4):
+        '''
+        start a new tree for position with player to move; the position is played on in place
+        but always handed back unchanged. connect is only used when position is a numpy board.
+        '''
+        if not isinstance(position, Position):
+            position = Position.from_array(position, connect)
+        self.position = position
+        self.player = player
+        self.first_child[0] = -1
+        self.child_count[0] = 0
+        self.visits[0] = 0
+        self.wins[0] = 0
+        self.parent[0] = -1
+        self.move[0] = -1
+        self.size = 1
+
+    def search(self, position, player, iterations=1000):
+        '''
+        run iterations rounds of selection, expansion, rollout and backpropagation, returns the best column
+        '''
+        self.reset(position, player)
+        for _ in range(iterations):
+            self.iterate()
+        return self.best_move()
+
+    def iterate(self):
+        position = self.position
+        visits, wins, first_child, move = self.visits, self.wins, self.first_child, self.move
+        player = self.player
+        stats = self.stats
+        if stats is not None:
+            start = time.perf_counter()
+        node = 0
+        depth = 0
+
+        # selection: follow the best UCT child down to a leaf
+        while first_child[node] != -1 and not position.is_terminal():
+            node = self.select(node)
+            position.drop(move[node], player)
+            player = 2 if player == 1 else 1
+            depth += 1
+        if stats is not None:
+            selected = time.perf_counter()
+
+        # expansion: add every move of the leaf at once, then go down to the first one
+        if not position.is_terminal() and self.expand(node):
+            node = first_child[node]
+            position.drop(move[node], player)
+            player = 2 if player == 1 else 1
+            depth += 1
+        if stats is not None:
+            expanded = time.perf_counter()
+
+        if self.leaf_rollouts == 1:
+            result = self.rollout(player)
+        else:
+            result = self.rollouts(player, self.leaf_rollouts)
+        count = self.leaf_rollouts
+        if stats is not None:
+            simulated = time.perf_counter()
+
+        # backpropagation, result is for the player who moved into the node
+        while node != -1:
+            visits[node] += count
+            wins[node] += result
+            result = -result
+            node = self.parent[node]
+        for _ in range(depth):
+            position.undo()
+        if stats is not None:
+            stats.rollouts += count
+            stats.tree_size = self.size
+            stats.max_depth = max(stats.max_depth, depth)
+            stats.add_time('select', selected - start)
+            stats.add_time('expand', expanded - selected)
+            stats.add_time('rollout', simulated - expanded)
+            stats.add_time('backpropagate', time.perf_counter() - simulated)
+
+    def select(self, node):
+        visits, wins = self.visits, self.wins
+        start = self.first_child[node]
+        log_visits = math.log(visits[node])
+        best, best_value = start, -math.inf
+        for child in range(start, start + self.child_count[node]):
+            child_visits = visits[child]
+            if child_visits == 0:
+                return child  # unvisited children first
+            value = wins[child] / child_visits + self.exploration * math.sqrt(log_visits / child_visits)
+            if value > best_value:
+                best, best_value = child, value
+        return best
+
+    def expand(self, node):
+        position = self.position
+        moves = position.get_valid_locations()
+        if position.is_symmetric():
+            # a column and its mirror lead to mirror images, one child for both is enough
+            moves = [col for col in moves if col <= position.column_count - 1 - col]
+        if self.size + len(moves) > self.capacity:
+            return False  # tree is full, keep rolling out from this leaf
+        start = self.size
+        for i, col in enumerate(moves):
+            child = start + i
+            self.move[child] = col
+            self.parent[child] = node
+            self.first_child[child] = -1
+            self.child_count[child] = 0
+            self.visits[child] = 0
+            self.wins[child] = 0
+        self.first_child[node] = start
+        self.child_count[node] = len(moves)
+        self.size += len(moves)
+        return True
+
+    def rollout(self, player):
+        '''
+        policy playout from the current position with player to move; the moves are undone
+        again afterwards. Returns +1/0/-1 for the player who made the last move before it.
+        '''
+        winner = policy_rollout(self.position, player, self.tablebase)
+        if winner == 0:
+            return 0
+        return -1 if winner == player else 1
+
+    def rollouts(self, player, count):
+        '''
+        sum of count rollout results from the current position, spread over the pool when there is one
+        '''
+        if self.workers <= 1 or self.position.is_terminal():
+            winners = playouts(self.position, player, count, tablebase=self.tablebase)
+            return int(np.count_nonzero(winners == 3 - player)) - int(np.count_nonzero(winners == player))
+        if self.pool is None:
+            self.pool = ProcessPoolExecutor(self.workers)
+        workers = self.workers
+        shares = [count // workers + (i < count % workers) for i in range(workers)]
+        grid = self.position.to_array()
+        jobs = [(grid, self.position.connect, player, share, random.getrandbits(32)) for share in shares if share]
+        return sum(self.pool.map(_rollout_job, jobs))
+
+    def advance(self, column):
+        '''
+        play column at the root and keep the subtree under it as the new tree, so the
+        work already done on that line is not thrown away
+        '''
+        start = self.first_child[0]
+        child = None
+        if start != -1:
+            for node in range(start, start + self.child_count[0]):
+                if self.move[node] == column:
+                    child = node
+                    break
+        self.position.drop(column, self.player)
+        self.player = 2 if self.player == 1 else 1
+        if child is None:
+            self.reset(self.position, self.player)
+            return
+        # copy the subtree breadth first to the front of the arrays; everything is read
+        # before anything is written, so the old and new slots can overlap
+        nodes = [(child, -1)]  # (old index, new index of its parent)
+        records = []
+        for old, new_parent in nodes:
+            records.append((self.visits[old], self.wins[old], self.move[old], new_parent, self.child_count[old]))
+            start = self.first_child[old]
+            if start != -1:
+                new_index = len(records) - 1
+                nodes.extend((node, new_index) for node in range(start, start + self.child_count[old]))
+        # the children of every node were queued together, so they also land next to each other
+        first_child = [-1] * len(records)
+        for new_index in range(len(records) - 1, 0, -1):
+            first_child[records[new_index][3]] = new_index
+        for new_index, (visits, wins, move, parent, count) in enumerate(records):
+            self.visits[new_index] = visits
+            self.wins[new_index] = wins
+            self.move[new_index] = move
+            self.parent[new_index] = parent
+            self.first_child[new_index] = first_child[new_index]
+            self.child_count[new_index] = count if first_child[new_index] != -1 else 0
+        self.move[0] = -1
+        self.size = len(records)
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+
+    def root_children(self):
+        '''
+        {column: (visits, wins)} of the root's children
+        '''
+        start = self.first_child[0]
+        if start == -1:
+            return {}
+        return {self.move[child]: (self.visits[child], self.wins[child]) for child in range(start, start + self.child_count[0])}
+
+    def best_move(self):
+        # the most visited child is the most reliable one
+        children = self.root_children()
+        if not children:
+            moves = self.position.get_valid_locations()
+            return moves[0] if moves else None
+        return max(children, key=lambda col: children[col][0])
+
+
+def _rollout_job(job):
+    grid, connect, player, count, seed = job
+    random.seed(seed)
+    mcts = MCTS(capacity=1)
+    mcts.reset(grid, player, connect)
+    return mcts.rollouts(player, count)
+
+
+def _root_job(job):
+    grid, connect, player, iterations, seed, capacity, leaf_rollouts = job
+    random.seed(seed)
+    mcts = MCTS(capacity=capacity, leaf_rollouts=leaf_rollouts)
+    mcts.reset(grid, player, connect)
+    for _ in range(iterations):
+        mcts.iterate()
+    return mcts.root_children()
+
+
+def parallel_search(position, player, iterations=10000, workers=None, capacity=1 << 18, leaf_rollouts=1, connect=4):
+    '''
+    root parallel MCTS: every worker process grows its own tree from position for its share of
+    the iterations, then the visit counts of the root children are added up.
+    returns (column, {column: (visits, wins)}); connect is only used when position is a numpy board
+    '''
+    if not isinstance(position, Position):
+        position = Position.from_array(position, connect)
+    workers = workers or os.cpu_count() or 1
+    grid = position.to_array()
+    per_worker = max(1, iterations // workers)
+    jobs = [(grid, position.connect, player, per_worker, random.getrandbits(32), capacity, leaf_rollouts) for _ in range(workers)]
+    merged = {}
+    with ProcessPoolExecutor(workers) as pool:
+        for children in pool.map(_root_job, jobs):
+            for col, (visits, wins) in children.items():
+                total_visits, total_wins = merged.get(col, (0, 0))
+                merged[col] = (total_visits + visits, total_wins + wins)
+    if not merged:
+        moves = position.get_valid_locations()
+        return (moves[0] if moves else None), merged
+    return max(merged, key=lambda col: merged[col][0]), merged
+
+
+class MCTSAgent:
+    '''
+    MCTS player that lives for a whole game: it thinks for a time budget, keeps the
+    subtree of the moves actually played, and can be stopped at any time with its
+    best move so far
+    '''
+    def __init__(self, time_budget_ms=1000, capacity=1 << 20, **kwargs):
+        self.time_budget_ms = time_budget_ms
+        self.mcts = MCTS(capacity=capacity, **kwargs)
+        self.stop_event = threading.Event()
+        self.iterations = 0  # iterations run by the last think()
+        self.new_game()
+
+    def new_game(self, position=None, connect=4):
+        '''
+        start from position (empty board by default), player 1 moves first;
+        connect is only used when position is a numpy board
+        '''
+        if position is None:
+            position = Position()
+        elif not isinstance(position, Position):
+            position = Position.from_array(position, connect)
+        self.position = position
+        self.mcts.reset(position, 1 if position.moves % 2 == 0 else 2)
+
+    def play(self, column):
+        '''
+        tell the agent about a move that was played, by either side
+        '''
+        self.mcts.advance(column)
+
+    def think(self, time_budget_ms=None, max_iterations=None):
+        '''
+        search until the time budget is used, max_iterations have run or stop() is called,
+        returns the best column found
+        '''
+        budget = self.time_budget_ms if time_budget_ms is None else time_budget_ms
+        deadline = time.perf_counter() + budget / 1000
+        self.stop_event.clear()
+        self.iterations = 0
+        if self.position.is_terminal():
+            return None
+        while not self.stop_event.is_set():
+            self.mcts.iterate()
+            self.iterations += 1
+            if max_iterations is not None and self.iterations >= max_iterations:
+                break
+            if self.iterations & 15 == 0 and time.perf_counter() > deadline:
+                break
+        return self.best_move()
+
+    def stop(self):
+        '''
+        make a running think() return now, safe to call from another thread
+        '''
+        self.stop_event.set()
+
+    def best_move(self):
+        return self.mcts.best_move()
+
+    def close(self):
+        self.mcts.close()
@@ -0,0 +1,35 @@
+'''
+Random positions for the test modules
+'''
+import random
+from bitboard import Position
+
+
+def random_positions(count, seed, moves=None, empty=None, geometry=(6, 7, 4), ended='skip'):
+    '''
+    count positions of random games. Each game stops after a number of moves drawn from the
+    range moves (low, high), or with a number of empty cells drawn from empty (low, high);
+    anywhere from the empty board to the full one by default. geometry is a (row_count,
+    column_count, connect) or a list of them taken in turn. A game that ends before it gets
+    there is skipped with ended='skip', kept as it ended with 'keep', and played on past the
+    win with 'play on', so both sides can have lines.
+    '''
+    rng = random.Random(seed)
+    geometries = geometry if isinstance(geometry, list) else [geometry]
+    found = []
+    while len(found) < count:
+        row_count, column_count, connect = geometries[len(found) % len(geometries)]
+        area = row_count * column_count
+        if moves is not None:
+            stop = rng.randint(*moves)
+        elif empty is not None:
+            stop = area - rng.randint(*empty)
+        else:
+            stop = rng.randint(0, area)
+        position = Position(row_count, column_count, connect)
+        while position.moves < stop and (ended == 'play on' or not position.is_terminal()):
+            position.drop(rng.choice(position.get_valid_locations()), 1 if position.moves % 2 == 0 else 2)
+        if ended == 'skip' and position.is_terminal():
+            continue
+        found.append(position)
+    return found
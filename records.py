@@ -0,0 +1,168 @@
+'''
+Compact binary files of game records, for self-play and training data.
+
+A file is a 16 byte header (magic, row_count, column_count, connect)
+followed by fixed size records, so it can be memory mapped as one numpy
+structured array and any game read without going through the ones before
+it. A record is the number of moves, the result (the winner 1 or 2, 0 for
+a draw, as in arena.py) and the columns, two to a byte. A full 6x7 game
+takes 23 bytes.
+
+    with RecordWriter('games.c4r') as writer:
+        writer.write('4453', 0)
+    reader = RecordReader('games.c4r')
+    moves, result = reader[0]
+'''
+import os
+import struct
+import numpy as np
+from bitboard import Position
+
+MAGIC = b'C4R1'
+HEADER = struct.Struct('<4sBBB9x')  # magic, row_count, column_count, connect, padded to 16 bytes
+
+
+def record_dtype(row_count, column_count):
+    area = row_count * column_count
+    if column_count > 9 or area > 255:
+        raise ValueError(f"{row_count}x{column_count} games don't fit in a record, move strings stop at 9 columns")
+    return np.dtype([('length', 'u1'), ('result', 'u1'), ('moves', 'u1', ((area + 1) // 2,))])
+
+
+def pack_moves(columns, size):
+    '''
+    0-based columns as column + 1 in a nibble each, the first move in the low nibble of the first byte
+    '''
+    packed = np.zeros(size, dtype=np.uint8)
+    nibbles = np.asarray(columns, dtype=np.uint8) + 1
+    packed[:(len(nibbles) + 1) // 2] |= nibbles[0::2]
+    packed[:len(nibbles) // 2] |= nibbles[1::2] << 4
+    return packed
+
+
+def unpack_moves(packed, length):
+    nibbles = np.empty(2 * len(packed), dtype=np.uint8)
+    nibbles[0::2] = packed & 15
+    nibbles[1::2] = packed >> 4
+    return (nibbles[:length] - 1).tolist()
+
+
+class RecordWriter:
+    '''
+    appends game records to path, creating it if needed; records are buffered
+    and written in chunks, so close it (or use it as a context manager) when done
+    '''
+    def __init__(self, path, row_count=6, column_count=7, connect=4, chunk=4096):
+        self.dtype = record_dtype(row_count, column_count)
+        self.geometry = (row_count, column_count, connect)
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            with open(path, 'rb') as f:
+                found = read_header(f)
+            if found != self.geometry:
+                raise ValueError(f"{path} holds {found} games, not {self.geometry}")
+            self.file = open(path, 'ab')
+        else:
+            self.file = open(path, 'wb')
+            self.file.write(HEADER.pack(MAGIC, row_count, column_count, connect))
+        self.buffer = np.zeros(chunk, dtype=self.dtype)
+        self.buffered = 0
+
+    def write(self, moves, result):
+        '''
+        add one game: moves as a move string of 1-based columns or a list of 0-based ones, result
+        the winner (1 or 2) or 0 for a draw; raises ValueError for anything a record can't hold
+        '''
+        if isinstance(moves, str):
+            moves = [ord(char) - ord('1') for char in moves]
+        row_count, column_count, _ = self.geometry
+        for i, column in enumerate(moves):
+            if not 0 <= column < column_count:
+                raise ValueError(f"bad column {column} at move {i + 1}, the board has {column_count} columns")
+        if len(moves) > row_count * column_count:
+            raise ValueError(f"{len(moves)} moves don't fit on a {row_count}x{column_count} board")
+        if result not in (0, 1, 2):
+            raise ValueError(f"bad result {result!r}, it is the winner 1 or 2, or 0 for a draw")
+        record = self.buffer[self.buffered]
+        record['length'] = len(moves)
+        record['result'] = result
+        record['moves'] = pack_moves(moves, self.dtype['moves'].shape[0])
+        self.buffered += 1
+        if self.buffered == len(self.buffer):
+            self.flush()
+
+    def flush(self):
+        self.buffer[:self.buffered].tofile(self.file)
+        self.buffered = 0
+        self.file.flush()
+
+    def close(self):
+        if not self.file.closed:
+            self.flush()
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def read_header(f):
+    magic, row_count, column_count, connect = HEADER.unpack(f.read(HEADER.size))
+    if magic != MAGIC:
+        raise ValueError("not a game record file")
+    return row_count, column_count, connect
+
+
+class RecordReader:
+    '''
+    memory mapped view of a record file: len(), indexing and iteration give
+    (move string, result) and nothing is read until it is used
+    '''
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self.row_count, self.column_count, self.connect = read_header(f)
+        dtype = record_dtype(self.row_count, self.column_count)
+        count = (os.path.getsize(path) - HEADER.size) // dtype.itemsize
+        if count:
+            self.records = np.memmap(path, dtype=dtype, mode='r', offset=HEADER.size, shape=(count,))
+        else:
+            self.records = np.zeros(0, dtype=dtype)  # mmap can't map an empty file
+
+    def __len__(self):
+        return len(self.records)
+
+    def __getitem__(self, index):
+        record = self.records[index]
+        columns = unpack_moves(record['moves'], int(record['length']))
+        return ''.join(str(column + 1) for column in columns), int(record['result'])
+
+    def __iter__(self):
+        for index in range(len(self.records)):
+            yield self[index]
+
+    @property
+    def results(self):
+        return self.records['result']
+
+    @property
+    def lengths(self):
+        return self.records['length']
+
+    def columns(self, start=0, stop=None):
+        '''
+        moves of games start:stop as one (games, row_count * column_count) int8 array of
+        0-based columns, -1 after the end of each game; unpacked in bulk, for training sets
+        '''
+        packed = np.asarray(self.records['moves'][start:stop])
+        nibbles = np.empty((len(packed), 2 * packed.shape[1]), dtype=np.int8)
+        nibbles[:, 0::2] = packed & 15
+        nibbles[:, 1::2] = packed >> 4
+        return nibbles[:, :self.row_count * self.column_count] - 1
+
+    def position(self, index, ply=None):
+        '''
+        the Position of game index after ply moves (the final position by default)
+        '''
+        moves, _ = self[index]
+        return Position.from_moves(moves[:ply], self.row_count, self.column_count, self.connect)
@@ -0,0 +1,184 @@
+'''
+Rollout policy for MCTS, and many rollouts at once as a numpy batch.
+
+Uniformly random playouts say little about a position: half of them walk
+past a win in one or let the opponent have one. The policy here is still
+cheap but plays the obvious moves. It takes a win when it has one, blocks
+the opponent's win when there is one, and otherwise picks a random column
+weighted towards the center (1, 2, 3, 4, 3, 2, 1 on 7 columns).
+
+Since a move that completes a line is always taken as a win, a playout
+can only end with a win on a move the policy saw as one, and no disc ever
+needs a check_for_win.
+
+playouts() runs count rollouts from the same position in lockstep. Every
+game is a pair of uint64 bitboards in one array, so a ply of all of them is a
+handful of numpy operations. The games all have the same number of discs
+at every ply, which also lets the tablebase take over for all of them at
+once. policy_move() is the same policy for one rollout on a Position.
+'''
+import numpy as np
+import random
+from functools import lru_cache
+from bitboard import Position, fits_uint64
+from solver import Geometry
+
+
+def center_weights(column_count):
+    return [min(col, column_count - 1 - col) + 1 for col in range(column_count)]
+
+
+@lru_cache(maxsize=None)
+def weighted_columns(column_count):
+    # every column as often as its weight, so random.choice draws center weighted
+    return [col for col, weight in enumerate(center_weights(column_count)) for _ in range(weight)]
+
+
+@lru_cache(maxsize=None)
+def geometry_of(row_count, column_count, connect=4):
+    return Geometry(row_count, column_count, connect)
+
+
+@lru_cache(maxsize=None)
+def tables(row_count, column_count, connect=4):
+    '''
+    (Geometry, column masks as uint64, center weights) of a board size that fits in 64 bits
+    '''
+    geometry = geometry_of(row_count, column_count, connect)
+    return geometry, np.array(geometry.column_masks, dtype=np.uint64), np.array(center_weights(column_count), dtype=np.float64)
+
+
+def policy_move(position, player, geometry=None):
+    '''
+    the rollout policy's column for player, the side to move: win, else block, else a center weighted random column
+    '''
+    if geometry is None:
+        geometry = geometry_of(position.row_count, position.column_count, position.connect)
+    current = position.bitboards[player - 1]
+    mask = position.bitboards[0] | position.bitboards[1]
+    possible = geometry.possible(mask)
+    forced = geometry.winning_squares(current, mask) & possible
+    if not forced:
+        forced = geometry.winning_squares(current ^ mask, mask) & possible
+    if forced:
+        return ((forced & -forced).bit_length() - 1) // (position.row_count + 1)
+    columns = weighted_columns(position.column_count)
+    while True:
+        col = random.choice(columns)  # full columns are just drawn again, cheaper than weighting the open ones
+        if position.heights[col] < position.row_count:
+            return col
+
+
+def rollout(position, player, tablebase=None):
+    '''
+    one policy playout from position with player to move, played with drop and undone again;
+    returns the winner, 0 for a draw. With a tablebase, the playout stops once it has few enough
+    empty cells and takes the perfect play result instead.
+    '''
+    geometry = geometry_of(position.row_count, position.column_count, position.connect)
+    area = position.row_count * position.column_count
+    plies = 0
+    winner = 0
+    while not position.is_terminal():
+        if tablebase is not None and area - position.moves <= tablebase.rollout_empty and tablebase.covers(position):
+            score = tablebase.score(position)
+            winner = 0 if score == 0 else player if score > 0 else 3 - player
+            break
+        position.drop(policy_move(position, player, geometry), player)
+        player = 3 - player
+        plies += 1
+    else:
+        winner = position.winner or 0
+    for _ in range(plies):
+        position.undo()
+    return winner
+
+
+def winning_squares(geometry, current, mask):
+    '''
+    Geometry.winning_squares for arrays of uint64 bitboards
+    '''
+    if geometry.connect == 4:
+        return geometry.winning_squares(current, mask)  # only shifts and masks, works on arrays as it is
+    # any line length, as Geometry._winning_squares but without the -1 that uint64 can't take
+    n = geometry.connect
+    r = current << np.uint64(1)
+    for i in range(2, n):
+        r &= current << np.uint64(i)
+    for shift in (geometry.row_count + 1, geometry.row_count, geometry.row_count + 2):
+        for k in range(n):
+            p = ~np.zeros_like(current)
+            for i in range(1, k + 1):
+                p &= current << np.uint64(i * shift)
+            for i in range(1, n - k):
+                p &= current >> np.uint64(i * shift)
+            r |= p
+    return r & (np.uint64(geometry.board_mask) ^ mask)
+
+
+def playouts(position, player, count, rng=None, tablebase=None):
+    '''
+    winners of count policy playouts from position with player to move, as an int8 array
+    (1, 2, or 0 for a draw). rng is a numpy Generator, seeded from random by default so
+    random.seed still makes the rollouts reproducible.
+    '''
+    if position.winner is not None or position.is_tie():
+        return np.full(count, position.winner or 0, dtype=np.int8)
+    row_count, column_count, connect = position.row_count, position.column_count, position.connect
+    if not fits_uint64(row_count, column_count):
+        return np.array([rollout(position, player, tablebase) for _ in range(count)], dtype=np.int8)
+    if rng is None:
+        rng = np.random.default_rng(random.getrandbits(64))
+    geometry, column_masks, weights = tables(row_count, column_count, connect)
+    bottom, board_mask = np.uint64(geometry.bottom_mask), np.uint64(geometry.board_mask)
+    area = geometry.area
+    winners = np.zeros(count, dtype=np.int8)
+    games = np.arange(count)  # the games still going, as indices into winners
+    # the discs of the side to move and of the opponent, one column per game
+    sides = np.empty((2, count), dtype=np.uint64)
+    sides[0] = position.bitboards[player - 1]
+    sides[1] = position.bitboards[2 - player]
+    mask = sides[0] | sides[1]
+    moves = position.moves
+    while len(games) and moves < area:
+        if tablebase is not None and area - moves <= tablebase.rollout_empty:
+            if settle(tablebase, sides[0], mask, geometry, player, winners, games):
+                break
+            tablebase = None  # the tablebase doesn't cover this board
+        possible = (mask + bottom) & board_mask
+        # winning squares of both sides in one go, mask broadcasts over the two rows
+        squares = winning_squares(geometry, sides, mask) & possible
+        won = squares[0] != 0
+        if won.any():
+            winners[games[won]] = player
+            going = ~won
+            games, sides, mask, possible, squares = games[going], sides[:, going], mask[going], possible[going], squares[:, going]
+        threats = squares[1]
+        # a center weighted random column among the ones that aren't full
+        open_columns = (possible[:, None] & column_masks) != 0
+        cumulative = np.cumsum(open_columns * weights, axis=1)
+        pick = rng.random(len(games)) * cumulative[:, -1]
+        columns = np.argmax(cumulative > pick[:, None], axis=1)
+        # or the block: the lowest threat, a second one can't be stopped anyway
+        move = np.where(threats != 0, threats & (~threats + np.uint64(1)), possible & column_masks[columns])
+        sides = np.stack((sides[1], sides[0] | move))  # the opponent is the side to move now
+        mask = mask | move
+        player = 3 - player
+        moves += 1
+    return winners
+
+
+def settle(tablebase, current, mask, geometry, player, winners, games):
+    '''
+    fill in the winners of the games still going from the tablebase, False if it doesn't cover them
+    '''
+    keys = current | (mask + np.uint64(geometry.bottom_mask))  # Position.key of every game
+    unique, inverse = np.unique(keys, return_inverse=True)
+    results = np.zeros(len(unique), dtype=np.int8)
+    for i, key in enumerate(unique):
+        score = tablebase.score(Position.from_key(int(key), geometry.row_count, geometry.column_count, geometry.connect))
+        if score is None:
+            return False
+        results[i] = 0 if score == 0 else player if score > 0 else 3 - player
+    winners[games] = results[inverse.reshape(-1)]
+    return True
@@ -0,0 +1,229 @@
+'''
+Engine server: one long-lived engine for many clients.
+
+Every game used to start its own search with cold caches. The server keeps
+one engine.Engine per board size for as long as it runs, so the
+transposition table and the endgame tablebase are warm for every game
+that comes after. With --book it also answers from an opening book built
+with solver.py.
+
+Clients connect over TCP or a Unix socket and send one JSON object per
+line, and get one JSON object per line back:
+
+    {"id": 7, "moves": "4453", "time": 500}
+    {"id": 7, "moves": "4453", "to_move": 1, "column": 6, "score": 3, "depth": 8, "ms": 497.2, "source": "search"}
+
+moves is a move string of 1-based columns; key (Position.key()) can be
+sent instead when the move order isn't known. The other fields are
+optional: time (ms), depth, stats (add SearchStats), progress (also send
+{"id", "progress": true, "depth", "column", "score"} after every finished
+iteration) and rows/columns/connect for other board sizes (4 to 9 rows and
+columns, connect from 2 up to the smaller of the two). A request that
+can't be served gets {"id", "error"}. Replies carry the request's id, and
+a connection may have many requests out at once, so one client can drive
+many games.
+
+The searches are pure Python and hold the GIL, so they run one at a time
+on a single search thread. The event loop meanwhile keeps reading and
+answering every connection. A request's time budget counts from when it
+arrived, waiting for the search thread included, and is capped at
+max_time_ms.
+
+    python server.py --listen 127.0.0.1:7740
+    python server.py --listen unix:/tmp/connect4.sock
+'''
+import argparse
+import asyncio
+import json
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+from bitboard import Position
+from client import DEFAULT_ADDRESS, parse_address
+from engine import Engine
+from solver import OpeningBook
+from tablebase import Tablebase
+
+SIZES = range(4, 10)  # rows and columns a request can ask for, move strings stop at 9 columns
+
+
+def number(request, name, default):
+    '''
+    request[name] as a finite float; raises ValueError for anything else (JSON has NaN and Infinity)
+    '''
+    value = request.get(name, default)
+    if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+        raise ValueError(f"{name} must be a number")
+    try:
+        value = float(value)
+    except OverflowError:
+        value = math.inf  # an int too large for a float
+    if not math.isfinite(value):
+        raise ValueError(f"{name} must be a finite number")
+    return value
+
+
+def whole_number(request, name, default):
+    value = number(request, name, default)
+    if value != int(value):
+        raise ValueError(f"{name} must be a whole number")
+    return int(value)
+
+
+class EngineServer:
+
+    def __init__(self, time_budget_ms=1000, max_time_ms=10000, use_tablebase=True, use_book=False, flush_interval=30):
+        '''
+        time_budget_ms is for requests that don't give one; the tablebase is written
+        back to disk at most every flush_interval seconds, and by close()
+        '''
+        self.time_budget_ms = time_budget_ms
+        self.max_time_ms = max_time_ms
+        self.use_tablebase = use_tablebase
+        self.use_book = use_book
+        self.flush_interval = flush_interval
+        self.engines = {}  # (row_count, column_count, connect) -> Engine, shared by every game on that board
+        self.executor = ThreadPoolExecutor(max_workers=1)  # the search thread, Engine isn't thread safe
+        self.last_flush = time.perf_counter()
+        self.served = 0  # requests answered so far
+
+    def engine(self, geometry):
+        engine = self.engines.get(geometry)
+        if engine is None:
+            standard = geometry == (6, 7, 4)  # the tablebase file and the book are for the standard board
+            tablebase = Tablebase() if self.use_tablebase and standard else None
+            book = OpeningBook.load() if self.use_book and standard else None
+            engine = self.engines[geometry] = Engine(geometry, tablebase, book)
+        return engine
+
+    def geometry(self, request):
+        '''
+        (row_count, column_count, connect) of a request; raises ValueError for a board the server
+        won't keep an engine for, every size gets one for as long as the server runs
+        '''
+        row_count, column_count, connect = whole_number(request, 'rows', 6), whole_number(request, 'columns', 7), whole_number(request, 'connect', 4)
+        if row_count not in SIZES or column_count not in SIZES:
+            raise ValueError(f"{row_count}x{column_count} board, rows and columns go from {SIZES[0]} to {SIZES[-1]}")
+        if not 2 <= connect <= min(row_count, column_count):
+            raise ValueError(f"connect {connect} on a {row_count}x{column_count} board, it goes from 2 to {min(row_count, column_count)}")
+        return row_count, column_count, connect
+
+    def search(self, request, arrived, on_iteration):
+        '''
+        one request on the search thread, returns Engine.search's result
+        '''
+        geometry = self.geometry(request)
+        engine = self.engine(geometry)
+        if 'key' in request:
+            if isinstance(request['key'], bool) or not isinstance(request['key'], int):
+                raise ValueError("key must be an integer")
+            moves = Position.from_key(request['key'], *geometry)
+        else:
+            moves = request.get('moves', '')
+            if not isinstance(moves, str):
+                raise ValueError("moves must be a move string")
+        budget = min(max(number(request, 'time', self.time_budget_ms), 0), self.max_time_ms)
+        budget -= (time.perf_counter() - arrived) * 1000  # the wait for the search thread counts too
+        depth = None if request.get('depth') is None else whole_number(request, 'depth', None)
+        if depth is not None and depth < 1:
+            raise ValueError("depth must be at least 1")
+        result = engine.search(moves, max(budget, 0), depth, bool(request.get('stats')), on_iteration)
+        if time.perf_counter() - self.last_flush > self.flush_interval:
+            self.flush()
+        return result
+
+    def flush(self):
+        for engine in self.engines.values():
+            if engine.board.tablebase is not None:
+                engine.board.tablebase.flush()
+        self.last_flush = time.perf_counter()
+
+    async def answer(self, request, arrived, send):
+        loop = asyncio.get_running_loop()
+        request_id = request.get('id')
+        on_iteration = None
+        if request.get('progress'):
+            def on_iteration(depth, column, score):
+                # called on the search thread, the message is sent from the loop
+                loop.call_soon_threadsafe(send, {'id': request_id, 'progress': True, 'depth': depth, 'column': column, 'score': score})
+        try:
+            result = await loop.run_in_executor(self.executor, self.search, request, arrived, on_iteration)
+        except (ValueError, TypeError) as error:
+            result = {'error': str(error)}
+        except Exception as error:
+            # whatever else a request manages to break, it gets its reply and the connection carries on
+            result = {'error': f"{type(error).__name__}: {error}"}
+        result['id'] = request_id
+        self.served += 1
+        send(result)
+
+    async def handle(self, reader, writer):
+        '''
+        one connection: read requests until it closes, answering each as soon as its search is done
+        '''
+        def send(message):
+            if not writer.is_closing():
+                writer.write(json.dumps(message).encode() + b'\n')
+
+        pending = set()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                arrived = time.perf_counter()
+                try:
+                    request = json.loads(line)
+                    if not isinstance(request, dict):
+                        raise ValueError("a request is a JSON object")
+                except ValueError as error:
+                    send({'id': None, 'error': str(error)})
+                    continue
+                task = asyncio.create_task(self.answer(request, arrived, send))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+                await writer.drain()
+            if pending:
+                await asyncio.gather(*pending)  # the client may have half closed and still be reading
+            await writer.drain()
+        except ConnectionError:
+            pass  # the client went away, whatever it still had running finishes without it
+        except asyncio.CancelledError:
+            pass  # the server is shutting down; nothing waits on this task, so end it quietly
+        finally:
+            writer.close()
+
+    async def listen(self, address=DEFAULT_ADDRESS):
+        '''
+        serve on address (host:port or unix:/path) until cancelled
+        '''
+        kind, *where = parse_address(address)
+        if kind == 'unix':
+            server = await asyncio.start_unix_server(self.handle, where[0])
+        else:
+            server = await asyncio.start_server(self.handle, *where)
+        async with server:
+            await server.serve_forever()
+
+    def close(self):
+        self.executor.shutdown()
+        self.flush()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="keep one warm engine running for many clients")
+    parser.add_argument("--listen", default=DEFAULT_ADDRESS, help="host:port or unix:/path/to/socket")
+    parser.add_argument("--time", type=int, default=1000, help="time budget in ms for requests that don't give one")
+    parser.add_argument("--max-time", type=int, default=10000, help="longest time budget a request can ask for, in ms")
+    parser.add_argument("--no-tablebase", action="store_true", help="don't use or extend the endgame tablebase")
+    parser.add_argument("--book", action="store_true", help="answer from the solver's opening book (python solver.py DEPTH builds it)")
+    args = parser.parse_args()
+    server = EngineServer(args.time, args.max_time, not args.no_tablebase, args.book)
+    try:
+        asyncio.run(server.listen(args.listen))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
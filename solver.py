@@ -0,0 +1,352 @@
+'''
+Perfect-play solver.
+
+Unlike Board.minimax/negamax, which stop at a fixed depth and fall back on
+score_position, this searches every position to the end of the game and
+returns its exact value. It works on raw bitboards: `current` holds the
+discs of the side to move and `mask` all discs, so the key current + mask
+is unique for every position.
+
+Scores follow the usual convention for connect 4 solvers: 0 is a draw, a
+positive score means the side to move wins and is larger the sooner it
+wins (one point for every disc of its own it doesn't need to play), a
+negative score is the same for a loss.
+'''
+import numpy as np
+import os
+from bitboard import Position, mirror_key
+from transposition import TranspositionTable, LOWER, UPPER
+
+BOOK_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'opening_book.npy')
+
+
+class Geometry:
+    '''
+    masks of one board size, shared by every search on it
+    '''
+    def __init__(self, row_count, column_count, connect=4):
+        self.row_count = row_count
+        self.column_count = column_count
+        self.connect = connect
+        self.area = row_count * column_count
+        h1 = row_count + 1
+        self.bottom_mask = sum(1 << (col * h1) for col in range(column_count))
+        self.board_mask = self.bottom_mask * ((1 << row_count) - 1)
+        self.column_masks = [((1 << row_count) - 1) << (col * h1) for col in range(column_count)]
+        self.top_masks = [1 << (row_count - 1 + col * h1) for col in range(column_count)]
+        self.center_order = sorted(range(column_count), key=lambda col: abs(col - column_count // 2))
+
+    def winning_squares(self, current, mask):
+        '''
+        bitmask of the empty cells where the side owning `current` would complete a line
+        '''
+        height = self.row_count
+        if self.connect != 4:
+            return self._winning_squares(current, mask)
+        # vertical
+        r = (current << 1) & (current << 2) & (current << 3)
+        # horizontal and the two diagonals, a four can be completed at either end or in the middle
+        for shift in (height + 1, height, height + 2):
+            p = (current << shift) & (current << 2 * shift)
+            r |= p & (current << 3 * shift)
+            r |= p & (current >> shift)
+            p = (current >> shift) & (current >> 2 * shift)
+            r |= p & (current << shift)
+            r |= p & (current >> 3 * shift)
+        return r & (self.board_mask ^ mask)
+
+    def _winning_squares(self, current, mask):
+        # any line length: a cell wins with k discs of the line on one side of it and connect - 1 - k on the other
+        n = self.connect
+        r = -1
+        for i in range(1, n):
+            r &= current << i  # vertical, discs below only
+        for shift in (self.row_count + 1, self.row_count, self.row_count + 2):
+            for k in range(n):
+                p = -1
+                for i in range(1, k + 1):
+                    p &= current << (i * shift)
+                for i in range(1, n - k):
+                    p &= current >> (i * shift)
+                r |= p
+        return r & (self.board_mask ^ mask)
+
+    def possible(self, mask):
+        # the lowest empty cell of every column that isn't full
+        return (mask + self.bottom_mask) & self.board_mask
+
+
+def split(position):
+    '''
+    (current, mask) of a Position, assuming player 1 moved first
+    '''
+    side = 1 if position.moves % 2 == 0 else 2
+    return position.bitboards[side - 1], position.bitboards[0] | position.bitboards[1]
+
+
+class OpeningBook:
+    '''
+    exact scores of early positions, stored as two sorted arrays (keys, scores) in one .npy file
+    so it can be memory mapped and searched with np.searchsorted
+    '''
+    def __init__(self, keys=None, scores=None, depth=0):
+        self.keys = np.zeros(0, dtype=np.uint64) if keys is None else keys
+        self.scores = np.zeros(0, dtype=np.int8) if scores is None else scores
+        self.depth = depth  # positions with at most this many moves are in the book
+
+    @classmethod
+    def load(cls, path=BOOK_PATH):
+        if not os.path.exists(path):
+            return cls()
+        table = np.load(path, mmap_mode='r')
+        return cls(table['key'], table['score'], int(table['moves'].max()) if len(table) else 0)
+
+    def save(self, path=BOOK_PATH, moves=None):
+        table = np.zeros(len(self.keys), dtype=[('key', '<u8'), ('score', 'i1'), ('moves', 'u1')])
+        table['key'] = self.keys
+        table['score'] = self.scores
+        table['moves'] = self.depth if moves is None else moves
+        np.save(path, table)
+
+    def get(self, key):
+        i = np.searchsorted(self.keys, key)
+        if i < len(self.keys) and self.keys[i] == key:
+            return int(self.scores[i])
+        return None
+
+    def __len__(self):
+        return len(self.keys)
+
+
+class Solver:
+
+    def __init__(self, tt_size=1 << 20, book=None):
+        self.tt = TranspositionTable(tt_size)
+        self.book = OpeningBook.load() if book is None else book
+        self.geometry = None
+        self.nodes = 0
+
+    def _geometry(self, position):
+        size = (position.row_count, position.column_count, position.connect)
+        if self.geometry is None or (self.geometry.row_count, self.geometry.column_count, self.geometry.connect) != size:
+            self.geometry = Geometry(*size)
+            self.tt.clear()  # keys of another board size mean something else
+        return self.geometry
+
+    def solve(self, position, weak=False):
+        '''
+        game-theoretic value of position for the side to move
+        returns (result, distance): result is 1 win, 0 draw, -1 loss, distance is the number of
+        plies until the game ends with perfect play (None for a weak solve, which only finds the result)
+        '''
+        score = self.solve_score(position, weak)
+        result = (score > 0) - (score < 0)
+        if weak:
+            return result, None
+        return result, self.distance(position, score)
+
+    def distance(self, position, score):
+        '''
+        plies left until the end of the game for an exact score of position
+        '''
+        area = position.row_count * position.column_count
+        moves = position.moves
+        if score == 0:
+            return area - moves  # a draw is only over when the board is full
+        # the last move is played at ply `last` (0-based), which gives (area + 1 - last) // 2 == |score|,
+        # and it is played by the side to move for a win, by the opponent for a loss
+        last = area + 1 - 2 * abs(score)
+        if (last - moves) % 2 != (0 if score > 0 else 1):
+            last -= 1
+        return last - moves + 1
+
+    def solve_score(self, position, weak=False):
+        '''
+        exact score of position (see the module docstring), or only its sign with weak=True
+        '''
+        if position.winner is not None:
+            # the side to move already lost
+            return -1 if weak else -((position.row_count * position.column_count + 2 - position.moves) // 2)
+        geometry = self._geometry(position)
+        current, mask = split(position)
+        moves = position.moves
+        area = geometry.area
+        if moves == area:
+            return 0
+        if geometry.winning_squares(current, mask) & geometry.possible(mask):
+            return 1 if weak else (area + 1 - moves) // 2
+        book_score = self._book_score(current, mask, moves)
+        if book_score is not None:
+            return book_score if not weak else (book_score > 0) - (book_score < 0)
+
+        low, high = -((area - moves) // 2), (area + 1 - moves) // 2
+        if weak:
+            low, high = -1, 1
+        # null window searches that keep halving the range the score can be in
+        while low < high:
+            med = low + (high - low) // 2
+            if med <= 0 and int(low / 2) < med:
+                med = int(low / 2)
+            elif med >= 0 and high // 2 > med:
+                med = high // 2
+            score = self._negamax(current, mask, moves, med, med + 1)
+            if score <= med:
+                high = score
+            else:
+                low = score
+        if weak:
+            return (low > 0) - (low < 0)  # the bounds found outside (-1, 1) are not exact
+        return low
+
+    def best_move(self, position, weak=False):
+        '''
+        (column, score) of the best move for the side to move
+        '''
+        geometry = self._geometry(position)
+        current, mask = split(position)
+        side = 1 if position.moves % 2 == 0 else 2
+        wins = geometry.winning_squares(current, mask) & geometry.possible(mask)
+        symmetric = position.is_symmetric()
+        best = None
+        for col in geometry.center_order:
+            if not position.check_valid_location(col):
+                continue
+            if symmetric and col > geometry.column_count - 1 - col:
+                continue  # same score as its mirror column
+            if wins & geometry.column_masks[col]:
+                return col, (geometry.area + 1 - position.moves) // 2
+            position.drop(col, side)
+            score = -self.solve_score(position, weak)
+            position.undo()
+            if best is None or score > best[1]:
+                best = (col, score)
+        return best
+
+    def _book_score(self, current, mask, moves):
+        if moves > self.book.depth or not len(self.book):
+            return None
+        if (self.geometry.row_count, self.geometry.column_count, self.geometry.connect) != (6, 7, 4):
+            return None  # build_book only solves the standard board
+        return self.book.get(current + mask)
+
+    def _negamax(self, current, mask, moves, alpha, beta):
+        '''
+        score of a position where the side to move can't win at once, within the window (alpha, beta)
+        '''
+        self.nodes += 1
+        geometry = self.geometry
+        area = geometry.area
+        possible = geometry.possible(mask)
+        opponent_wins = geometry.winning_squares(current ^ mask, mask)
+        forced = possible & opponent_wins
+        if forced:
+            if forced & (forced - 1):
+                return -((area - moves) // 2)  # two threats at once, only one of them can be blocked
+            possible = forced  # one threat, it has to be blocked
+        non_losing = possible & ~(opponent_wins >> 1)  # never play right below an opponent's winning cell
+        if not non_losing:
+            return -((area - moves) // 2)
+        if moves >= area - 2:
+            return 0
+
+        lowest = -((area - 2 - moves) // 2)
+        if alpha < lowest:
+            alpha = lowest
+            if alpha >= beta:
+                return alpha
+        highest = (area - 1 - moves) // 2
+        if beta > highest:
+            beta = highest
+            if alpha >= beta:
+                return beta
+        key = current + mask
+        entry = self.tt.probe(key)
+        if entry is not None:
+            if entry[2] == UPPER:
+                if beta > entry[3]:
+                    beta = entry[3]
+                    if alpha >= beta:
+                        return beta
+            elif alpha < entry[3]:
+                alpha = entry[3]
+                if alpha >= beta:
+                    return alpha
+        if moves <= self.book.depth:
+            book_score = self._book_score(current, mask, moves)
+            if book_score is not None:
+                return book_score
+
+        # moves that set up the most new threats first, center first among equals
+        candidates = []
+        for rank, col in enumerate(geometry.center_order):
+            move = non_losing & geometry.column_masks[col]
+            if move:
+                threats = geometry.winning_squares(current | move, mask).bit_count()
+                candidates.append((-threats, rank, move))
+        candidates.sort()
+
+        for _, _, move in candidates:
+            score = -self._negamax(current ^ mask, mask | move, moves + 1, -beta, -alpha)
+            if score >= beta:
+                self.tt.store(key, area - moves, LOWER, score, None)
+                return score
+            if score > alpha:
+                alpha = score
+        self.tt.store(key, area - moves, UPPER, alpha, None)
+        return alpha
+
+
+def build_book(depth, path=BOOK_PATH, solver=None, on_layer=None):
+    '''
+    solve every position with at most depth moves and save them as the opening book.
+    The deepest layer is solved first and added to the solver's book before the layer above
+    it, so a shallower position finds all its children in the book and costs next to nothing.
+    The deepest layer is still solved from scratch, and in pure Python that is minutes per
+    position once it is more than a few moves from the end, so a book only finishes for layers
+    close to the end of the game; none ships with the repo. on_layer(moves, count) is called
+    after every solved layer.
+    '''
+    solver = Solver(book=OpeningBook()) if solver is None else solver
+    # every layer as {book key: move string}, a position and its mirror image only once
+    layers = [{0: ''}]
+    for moves in range(depth):
+        layer = {}
+        for played in layers[-1].values():
+            position = Position.from_moves(played)
+            if position.is_terminal():
+                continue
+            side = 1 if position.moves % 2 == 0 else 2
+            for col in position.get_valid_locations():
+                position.drop(col, side)
+                current, mask = split(position)
+                key = min(current + mask, mirror_key(current + mask, 6, 7))
+                if key not in layer:
+                    layer[key] = position.to_moves()
+                position.undo()
+        layers.append(layer)
+    found = {}  # book key -> (score, moves), both mirror images
+    for moves in range(depth, -1, -1):
+        for played in layers[moves].values():
+            position = Position.from_moves(played)
+            if position.is_terminal():
+                continue  # a finished game has no score to look up
+            score = solver.solve_score(position)
+            current, mask = split(position)
+            found[current + mask] = found[mirror_key(current + mask, 6, 7)] = (score, moves)
+        keys = np.array(sorted(found), dtype=np.uint64)
+        solver.book = OpeningBook(keys, np.array([found[int(k)][0] for k in keys], dtype=np.int8), depth)
+        if on_layer is not None:
+            on_layer(moves, len(layers[moves]))
+    book = solver.book
+    book.save(path, np.array([found[int(k)][1] for k in book.keys], dtype=np.uint8))
+    return book
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="build the solver's opening book")
+    parser.add_argument("depth", type=int, help="book covers positions with at most this many moves")
+    parser.add_argument("--path", default=BOOK_PATH)
+    args = parser.parse_args()
+    book = build_book(args.depth, args.path, on_layer=lambda moves, count: print(f"{count} positions with {moves} moves solved", flush=True))
+    print(len(book), "positions")
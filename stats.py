@@ -0,0 +1,62 @@
+'''
+Counters for what a search did, for finding out where the time goes.
+
+Nothing is counted unless a SearchStats is handed to the search
+(board.stats for minimax/negamax/iterative_deepening, mcts.stats for the
+array MCTS, the stats argument of mcts_search); with None the searches only
+pay for one `is not None` check per node.
+'''
+
+
+class SearchStats:
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.nodes = 0
+        self.leaf_evals = 0  # score_position calls at depth 0
+        self.cutoffs = []  # alpha-beta cutoffs per ply
+        self.tt_probes = 0
+        self.tt_hits = 0
+        self.depth = 0  # depth of the last alpha-beta search started at the root
+        self.iterations = []  # (depth, nodes, ms) of every iteration iterative deepening finished
+        self.rollouts = 0
+        self.tree_size = 0  # MCTS nodes in the tree
+        self.max_depth = 0  # deepest MCTS node reached
+        self.times = {}  # phase -> seconds
+
+    def cutoff(self, ply):
+        while len(self.cutoffs) <= ply:
+            self.cutoffs.append(0)
+        self.cutoffs[ply] += 1
+
+    def add_time(self, phase, seconds):
+        self.times[phase] = self.times.get(phase, 0.0) + seconds
+
+    def branching_factor(self):
+        '''
+        effective branching factor: how much the tree grew per extra ply of the last
+        iterative deepening, or the depth-th root of the node count for a single search
+        '''
+        if len(self.iterations) >= 2 and self.iterations[-2][1]:
+            return self.iterations[-1][1] / self.iterations[-2][1]
+        if self.depth and self.nodes:
+            return self.nodes ** (1 / self.depth)
+        return 0.0
+
+    def as_dict(self):
+        return {
+            'nodes': self.nodes,
+            'leaf_evals': self.leaf_evals,
+            'cutoffs': list(self.cutoffs),
+            'tt_probes': self.tt_probes,
+            'tt_hits': self.tt_hits,
+            'depth': self.depth,
+            'iterations': [list(iteration) for iteration in self.iterations],
+            'branching_factor': self.branching_factor(),
+            'rollouts': self.rollouts,
+            'tree_size': self.tree_size,
+            'max_depth': self.max_depth,
+            'ms': {phase: seconds * 1000 for phase, seconds in self.times.items()},
+        }
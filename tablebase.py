@@ -0,0 +1,184 @@
+'''
+Endgame tablebase: exact scores of nearly full positions, kept on disk.
+
+Once a position has few enough empty cells the solver settles it in a few
+milliseconds, and the same endgames come up again and again, so every
+score solved here is remembered. A position and its mirror image have the
+same score, so both are stored under the smaller of their two keys
+(Position.key). Lookups go through an LRU cache first, then a sorted key
+file that is memory mapped and searched with np.searchsorted like the
+opening book. New scores are kept in memory until flush() merges them into
+the file. Several processes can share one file (the UI's worker, the
+server, engine.py runs): flush holds a lock file while it rereads, merges
+and replaces it, so nobody's scores get lost.
+
+The same key is another position on another board size, so the file
+starts with a 16 byte header (magic, row_count, column_count, connect) as
+in records.py, and a file for another board is refused.
+
+Scores are the solver's (see solver.py), for the side to move.
+'''
+import numpy as np
+import os
+import struct
+import tempfile
+from collections import OrderedDict
+from bitboard import fits_uint64, mirror_key
+from solver import Solver
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None  # windows, flushes are not locked there
+
+TABLEBASE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tablebase.c4t')
+MAGIC = b'C4T1'
+HEADER = struct.Struct('<4sBBB9x')  # magic, row_count, column_count, connect, padded to 16 bytes
+ENTRY = np.dtype([('key', '<u8'), ('score', 'i1')])
+
+
+class Tablebase:
+
+    def __init__(self, path=TABLEBASE_PATH, max_empty=16, rollout_empty=10, cache_size=1 << 16,
+                 geometry=(6, 7, 4), solver=None):
+        '''
+        positions with at most max_empty empty cells are solved and stored; MCTS rollouts
+        stop and take the exact result once rollout_empty cells are left
+        '''
+        self.path = path
+        self.max_empty = max_empty
+        self.rollout_empty = rollout_empty
+        self.cache_size = cache_size
+        self.geometry = tuple(geometry)
+        self.solver = Solver() if solver is None else solver
+        self.cache = OrderedDict()  # canonical key -> score, most recently used last
+        self.pending = {}  # solved since the last flush
+        self.keys = np.zeros(0, dtype=np.uint64)
+        self.scores = np.zeros(0, dtype=np.int8)
+        self.load()
+
+    def load(self):
+        '''
+        map the file's scores; raises ValueError if it isn't a tablebase file or is for another board
+        '''
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'rb') as f:
+            magic, row_count, column_count, connect = HEADER.unpack(f.read(HEADER.size))
+        if magic != MAGIC:
+            raise ValueError(f"{self.path} is not a tablebase file")
+        if (row_count, column_count, connect) != self.geometry:
+            raise ValueError(f"{self.path} holds {(row_count, column_count, connect)} scores, not {self.geometry}")
+        count = (os.path.getsize(self.path) - HEADER.size) // ENTRY.itemsize
+        if count:
+            table = np.memmap(self.path, dtype=ENTRY, mode='r', offset=HEADER.size, shape=(count,))
+            self.keys, self.scores = table['key'], table['score']
+
+    def covers(self, position):
+        return ((position.row_count, position.column_count, position.connect) == self.geometry
+                and fits_uint64(position.row_count, position.column_count)
+                and position.row_count * position.column_count - position.moves <= self.max_empty)
+
+    def canonical_key(self, position):
+        key = position.key()
+        return min(key, mirror_key(key, position.row_count, position.column_count))
+
+    def probe(self, position):
+        '''
+        the stored score of position, None if it isn't known yet (nothing is solved)
+        '''
+        if position.is_terminal() or not self.covers(position):
+            return None
+        return self._lookup(self.canonical_key(position))
+
+    def _lookup(self, key):
+        score = self.cache.get(key)
+        if score is not None:
+            self.cache.move_to_end(key)
+            return score
+        score = self.pending.get(key)
+        if score is None and len(self.keys):
+            i = np.searchsorted(self.keys, key)
+            if i < len(self.keys) and self.keys[i] == key:
+                score = int(self.scores[i])
+        if score is not None:
+            self._remember(key, score)
+        return score
+
+    def _remember(self, key, score):
+        self.cache[key] = score
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+
+    def score(self, position):
+        '''
+        exact score of position, solved and stored if it isn't known yet;
+        None for positions the tablebase doesn't cover (too early, finished, other board size)
+        '''
+        if position.is_terminal() or not self.covers(position):
+            return None
+        key = self.canonical_key(position)
+        score = self._lookup(key)
+        if score is None:
+            score = self.solver.solve_score(position)
+            self.pending[key] = score
+            self._remember(key, score)
+        return score
+
+    def best_move(self, position):
+        '''
+        (column, score) of the best move, None when position isn't covered
+        '''
+        if position.is_terminal() or not self.covers(position):
+            return None
+        side = 1 if position.moves % 2 == 0 else 2
+        area = position.row_count * position.column_count
+        symmetric = position.is_symmetric()
+        best = None
+        for col in position.get_valid_locations():
+            if symmetric and col > position.column_count - 1 - col:
+                continue  # same score as its mirror column
+            position.drop(col, side)
+            if position.winner is not None:
+                score = (area + 2 - position.moves) // 2  # wins straight away
+            elif position.is_tie():
+                score = 0
+            else:
+                score = -self.score(position)
+            position.undo()
+            if best is None or score > best[1]:
+                best = (col, score)
+        return best
+
+    def flush(self):
+        '''
+        merge the scores solved since the last flush into the file;
+        raises ValueError, and writes nothing, if the file is for another board
+        '''
+        if not self.pending:
+            return
+        with open(self.path + '.lock', 'a') as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)  # released when the file is closed
+            self.load()  # another process may have added to the file since it was opened
+            keys = np.concatenate([np.asarray(self.keys), np.fromiter(self.pending.keys(), dtype=np.uint64, count=len(self.pending))])
+            scores = np.concatenate([np.asarray(self.scores), np.fromiter(self.pending.values(), dtype=np.int8, count=len(self.pending))])
+            keys, first = np.unique(keys, return_index=True)  # sorted, and a key that is in both only once
+            table = np.zeros(len(keys), dtype=ENTRY)
+            table['key'] = keys
+            table['score'] = scores[first]
+            # write next to the old file and swap it in, readers never see half a file
+            fd, temp = tempfile.mkstemp(dir=os.path.dirname(self.path) or '.', suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(HEADER.pack(MAGIC, *self.geometry))
+                    table.tofile(f)
+                os.replace(temp, self.path)
+            except BaseException:
+                os.unlink(temp)
+                raise
+        self.pending = {}
+        self.load()
+
+    def __len__(self):
+        return len(self.keys) + len(self.pending)
@@ -0,0 +1,53 @@
+'''
+analyze / annotate: engine specs, side to move, order and finished games
+'''
+import pytest
+from analysis import Analyzer, analyze, annotate
+
+ENGINES = ['minimax:2', 'negamax:2', 'id:50', 'mcts:300', 'solve']
+
+
+@pytest.mark.parametrize('engine', ['minimax', 'negamax:', 'id', 'mcts', 'mcts:0', 'negamax:-2', 'id:fast', 'alphabeta:4'])
+def test_bad_engine(engine):
+    with pytest.raises(ValueError):
+        Analyzer(engine)
+    with pytest.raises(ValueError):
+        analyze(['44', '4'], engine, workers=2)  # turned down before any worker starts
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_side_to_move(engine):
+    # whoever is to move has three in a row on the bottom with both ends open
+    first, second = analyze(['445566', '1445566'], engine, workers=1)
+    assert first['to_move'] == 1 and second['to_move'] == 2
+    for result in (first, second):
+        if engine != 'mcts:300':
+            assert result['column'] in (2, 6)
+        assert result['score'] > 0  # from the side to move's view
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_order(workers):
+    # late in the game so the solver is quick without an opening book
+    positions = ['275436477222141216472117434756', '1212121', '357233364634731146154272446156',
+                 '56164171266251172255133566254447', '271712742466652264463726513113', '445566']
+    # exact scores, so which worker shares its cache with which position can't change them
+    results = analyze(positions, 'solve', workers=workers)
+    assert [result['moves'] for result in results] == positions
+    assert results == [Analyzer('solve').analyze(moves) for moves in positions]
+
+
+def test_finished_games():
+    first, second = analyze(['1212121', '31212121'], 'negamax:2', workers=1)  # four in column 1 for either side
+    assert first['to_move'] == 2 and second['to_move'] == 1
+    for result in (first, second):
+        assert result['column'] is None and result['score'] is None
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_annotate(workers):
+    game = '4453627'
+    results = annotate(game, 'negamax:2', workers=workers)
+    assert [result['moves'] for result in results] == [game[:ply] for ply in range(len(game))]
+    assert [result['played'] for result in results] == [int(char) - 1 for char in game]
+    assert [result['to_move'] for result in results] == [1, 2, 1, 2, 1, 2, 1]
@@ -0,0 +1,65 @@
+'''
+Agent specs, single games, whole matches and the win rate interval
+'''
+import json
+import math
+import pytest
+from arena import make_agent, parse_spec, play_game, run_match, wilson_interval
+from bitboard import Position
+from records import RecordReader
+
+
+@pytest.mark.parametrize('spec', ['mcts', 'id:abc', 'minimax:', 'negamax:0', 'id:-5', 'mcts:2.5', 'alphabeta:4', 'solve'])
+def test_bad_spec(spec):
+    with pytest.raises(ValueError):
+        parse_spec(spec)
+    with pytest.raises(ValueError):
+        make_agent(spec)
+    with pytest.raises(ValueError):
+        run_match('minimax:1', spec, games=2, workers=1)  # turned down before any worker starts
+
+
+def test_specs():
+    assert parse_spec('minimax:4') == ('minimax', 4)
+    assert parse_spec('mcts:2000') == ('mcts', 2000)
+    assert make_agent('id:50', (5, 6, 4)).board.column_count == 6
+
+
+def test_wilson_interval():
+    assert wilson_interval(0, 0) == (0.0, 1.0)
+    low, high = wilson_interval(50, 100)
+    assert math.isclose(low, 0.4038, abs_tol=1e-4) and math.isclose(high, 0.5962, abs_tol=1e-4)
+    # all won: the top end is 1 and the bottom end is n / (n + z^2)
+    low, high = wilson_interval(10, 10)
+    assert high == 1.0 and math.isclose(low, 10 / (10 + 1.96 ** 2))
+    assert wilson_interval(0, 10)[0] == 0.0 and math.isclose(wilson_interval(0, 10)[1], 1 - low)  # the mirror image
+    for games in (1, 5, 40):
+        for score in range(games + 1):
+            low, high = wilson_interval(score, games)
+            assert 0 <= low <= score / games <= high <= 1
+
+
+@pytest.mark.parametrize('geometry', [(6, 7, 4), (5, 6, 3)])
+def test_play_game(geometry):
+    record = play_game((3, 'minimax:2', 'mcts:50', 2, 7, geometry))
+    position = Position.from_moves(record['moves'], *geometry)
+    assert position.is_terminal()
+    assert record['winner'] == (position.winner or 0)
+    assert (record['game'], record['first'], record['second'], record['geometry']) == (3, 'minimax:2', 'mcts:50', list(geometry))
+    # every move but the random opening ones is timed
+    assert len(record['ms']) == len(record['nodes']) == len(record['moves']) - 2
+
+
+def test_two_game_match(tmp_path):
+    log, records = str(tmp_path / 'match.jsonl'), str(tmp_path / 'games.c4r')
+    report = run_match('minimax:1', 'negamax:2', games=2, workers=1, log_path=log, records_path=records)
+    assert report['games'] == 2
+    assert report['a']['wins'] + report['b']['wins'] + report['draws'] == 2
+    for role, spec in (('a', 'minimax:1'), ('b', 'negamax:2')):
+        assert report[role]['spec'] == spec
+        assert 0 <= report[role]['ci95'][0] <= report[role]['score'] <= report[role]['ci95'][1] <= 1
+    assert math.isclose(report['a']['score'] + report['b']['score'], 1)
+    with open(log) as f:
+        games = [json.loads(line) for line in f]
+    assert [game['first'] for game in games] == ['minimax:1', 'negamax:2']  # they take turns moving first
+    assert list(RecordReader(records)) == [(game['moves'], game['winner']) for game in games]
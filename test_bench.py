@@ -0,0 +1,64 @@
+'''
+bench.py on a tiny corpus, so the benchmark keeps running as the engines change
+'''
+import json
+import pytest
+from bench import CORPUS, ENGINES, compare, percentile, run, run_engine
+from bitboard import Position
+
+TINY = [CORPUS[1], CORPUS[5]]  # an opening and a middlegame
+FAST = ['minimax:2', 'negamax:2', 'id:20', 'mcts:50', 'mcts_search:20']
+
+
+def test_corpus():
+    # none of the positions is over and nobody can win on the next move
+    for _, moves in CORPUS:
+        position = Position.from_moves(moves)
+        assert not position.is_terminal()
+        for col in position.get_valid_locations():
+            for piece in (1, 2):
+                position.drop(col, piece)
+                assert position.winner is None
+                position.undo()
+
+
+@pytest.mark.parametrize('spec', ENGINES)
+def test_every_engine_runs(spec):
+    kind, _, setting = spec.partition(':')
+    fast = f"{kind}:{min(int(setting), 2 if 'max' in kind else 50)}"  # the same engine, a smaller setting
+    ms, stats = run_engine(fast, Position.from_moves(TINY[1][1]))
+    assert ms > 0
+    assert stats.nodes > 0 or stats.rollouts > 0
+
+
+def test_percentile():
+    assert percentile([], 50) == 0.0
+    assert percentile([3, 1, 2], 50) == 2
+    assert percentile(list(range(1, 101)), 90) == 90
+    assert percentile([5], 99) == 5
+
+
+def test_run_and_compare(tmp_path):
+    results = run(FAST, TINY, repeat=1, min_time=0)
+    assert results['corpus'] == [name for name, _ in TINY]
+    assert set(results['engines']) == set(FAST)
+    assert all(result['per_sec'] > 0 for result in results['primitives'].values())
+    for spec, result in results['engines'].items():
+        assert result['moves'] == len(TINY)
+        assert set(result['ms']) == {'p50', 'p90', 'p99', 'max'}
+        rate = 'rollouts_per_sec' if spec.startswith('mcts') else 'nodes_per_sec'
+        assert result[rate] > 0
+    # written out and read back as the --baseline file would be
+    path = tmp_path / 'before.json'
+    path.write_text(json.dumps(results))
+    baseline = json.loads(path.read_text())
+    assert compare(results, baseline) == []
+    slower = json.loads(path.read_text())
+    slower['engines']['minimax:2']['nodes_per_sec'] /= 2
+    slower['engines']['minimax:2']['ms']['p50'] *= 3
+    slower['primitives']['check_for_win/bitboard']['per_sec'] /= 2
+    regressions = compare(slower, baseline)
+    assert len(regressions) == 3
+    assert any(line.startswith('minimax:2 nodes_per_sec') for line in regressions)
+    assert any(line.startswith('minimax:2 ms p50') for line in regressions)
+    assert compare(slower, baseline, tolerance=5) == []
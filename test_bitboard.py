@@ -0,0 +1,138 @@
+'''
+bitboard.Position and the solver's line masks against a plain grid scan
+'''
+import numpy as np
+import pytest
+from bitboard import Position, fits_uint64, mirror_key
+from random_games import random_positions
+from rollouts import winning_squares as batch_winning_squares
+from solver import Geometry
+
+# (row_count, column_count, connect), the last two don't fit in 64 bits
+GEOMETRIES = [(6, 7, 4), (5, 6, 4), (4, 5, 3), (7, 8, 5), (6, 9, 4), (9, 8, 6), (9, 9, 5)]
+POSITIONS = 300  # per geometry
+
+
+def positions(geometry):
+    return random_positions(POSITIONS, hash(geometry), geometry=geometry, ended='play on')
+
+
+def grid(position):
+    '''
+    cells[col][row] of the position: 0 empty, 1 or 2
+    '''
+    h1 = position.row_count + 1
+    return [[1 if position.bitboards[0] >> (col * h1 + row) & 1 else 2 if position.bitboards[1] >> (col * h1 + row) & 1 else 0
+             for row in range(position.row_count)] for col in range(position.column_count)]
+
+
+def has_line(cells, piece, connect):
+    column_count, row_count = len(cells), len(cells[0])
+    for col in range(column_count):
+        for row in range(row_count):
+            for dc, dr in ((1, 0), (0, 1), (1, 1), (1, -1)):
+                if all(0 <= col + i * dc < column_count and 0 <= row + i * dr < row_count and cells[col + i * dc][row + i * dr] == piece
+                       for i in range(connect)):
+                    return True
+    return False
+
+
+def completes_line(cells, piece, connect, col, row):
+    '''
+    whether a disc of piece on the empty cell (col, row) would be part of a line
+    '''
+    column_count, row_count = len(cells), len(cells[0])
+    for dc, dr in ((1, 0), (0, 1), (1, 1), (1, -1)):
+        run = 1
+        for sign in (1, -1):
+            c, r = col + sign * dc, row + sign * dr
+            while 0 <= c < column_count and 0 <= r < row_count and cells[c][r] == piece:
+                run += 1
+                c, r = c + sign * dc, r + sign * dr
+        if run >= connect:
+            return True
+    return False
+
+
+def brute_winning_squares(position, piece):
+    cells = grid(position)
+    h1 = position.row_count + 1
+    squares = 0
+    for col in range(position.column_count):
+        for row in range(position.row_count):
+            if cells[col][row] == 0 and completes_line(cells, piece, position.connect, col, row):
+                squares |= 1 << (col * h1 + row)
+    return squares
+
+
+@pytest.mark.parametrize('geometry', GEOMETRIES)
+def test_check_for_win(geometry):
+    for position in positions(geometry):
+        cells = grid(position)
+        for piece in (1, 2):
+            assert position.check_for_win(piece) == has_line(cells, piece, position.connect), position.to_moves()
+
+
+@pytest.mark.parametrize('geometry', GEOMETRIES)
+def test_winning_squares(geometry):
+    lines = Geometry(*geometry)
+    for position in positions(geometry):
+        mask = position.bitboards[0] | position.bitboards[1]
+        for piece in (1, 2):
+            assert lines.winning_squares(position.bitboards[piece - 1], mask) == brute_winning_squares(position, piece), position.to_moves()
+
+
+@pytest.mark.parametrize('geometry', [geometry for geometry in GEOMETRIES if fits_uint64(*geometry[:2])])
+def test_batch_winning_squares(geometry):
+    lines = Geometry(*geometry)
+    found = positions(geometry)
+    current = np.array([position.bitboards[0] for position in found], dtype=np.uint64)
+    mask = np.array([position.bitboards[0] | position.bitboards[1] for position in found], dtype=np.uint64)
+    squares = batch_winning_squares(lines, current, mask)
+    for i, position in enumerate(found):
+        assert int(squares[i]) == lines.winning_squares(int(current[i]), int(mask[i]))
+
+
+@pytest.mark.parametrize('geometry', GEOMETRIES)
+def test_key_round_trip(geometry):
+    for position in positions(geometry):
+        found = Position.from_key(position.key(), *geometry)
+        assert found.bitboards == position.bitboards
+        assert found.heights == position.heights
+        assert found.moves == position.moves
+        assert found.hash == position.hash
+        assert found.key() == position.key()
+        assert (found.winner is None) == (not position.check_for_win(1) and not position.check_for_win(2))
+
+
+def test_bad_keys():
+    key = Position.from_moves('4453').key()
+    for bad in (-key, key | 1 << 49, 0, 1 << 7):
+        with pytest.raises(ValueError):
+            Position.from_key(bad)
+
+
+def test_wide_move_strings():
+    position = Position(6, 10)
+    position.drop(9, 1)
+    with pytest.raises(ValueError):
+        position.to_moves()
+    with pytest.raises(ValueError):
+        Position.from_moves('0', 6, 10)
+
+
+def test_mirror_key():
+    for position in random_positions(100, 7, ended='play on'):
+        mirrored = Position()
+        for column, piece, _ in position.history:
+            mirrored.drop(6 - column, piece)
+        assert mirror_key(position.key(), 6, 7) == mirrored.key()
+        assert position.mirror_hash == mirrored.hash
+
+
+def test_moves_round_trip():
+    for position in random_positions(100, 11, ended='play on'):
+        moves = position.to_moves()
+        if position.winner is not None and position.history[-1][2] is not None:
+            continue  # from_moves stops at the first win
+        assert Position.from_moves(moves).bitboards == position.bitboards
@@ -0,0 +1,37 @@
+'''
+score_position against the window by window loop it replaced
+'''
+import numpy as np
+import pytest
+from board import Board
+from random_games import random_positions
+
+GEOMETRIES = [(6, 7, 4), (5, 6, 4), (7, 8, 5), (6, 9, 3), (9, 9, 5)]  # the last one doesn't fit in 64 bits
+
+
+def loop_score(board, grid, piece):
+    '''
+    the original score_position: center discs and Board.evaluate_window over every window,
+    with both middle columns counted as center on an even width
+    '''
+    n = board.connect
+    rows, cols = grid.shape
+    score = 3 * sum([int(cell) for cell in grid[:, col]].count(piece) for col in {(cols - 1) // 2, cols // 2})
+    for r in range(rows):
+        for c in range(cols):
+            for dr, dc in ((0, 1), (1, 0), (1, 1), (-1, 1)):
+                if 0 <= r + (n - 1) * dr < rows and c + (n - 1) * dc < cols:
+                    score += board.evaluate_window([int(grid[r + i * dr][c + i * dc]) for i in range(n)], piece)
+    return score
+
+
+@pytest.mark.parametrize('geometry', GEOMETRIES)
+def test_score_position(geometry):
+    board = Board(False, *geometry)
+    positions = random_positions(100, 0, geometry=geometry, ended='play on')
+    grids = np.array([position.to_array() for position in positions])
+    for piece in (1, 2):
+        expected = [loop_score(board, grid, piece) for grid in grids]
+        assert [board.score_position(grid, piece) for grid in grids] == expected
+        assert [board.score_position(position, piece) for position in positions] == expected
+        assert board.score_positions(grids, piece).tolist() == expected
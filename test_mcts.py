@@ -0,0 +1,218 @@
+'''
+the array backed MCTS tree
+'''
+import random
+import pytest
+from bitboard import Position
+from board import Board, MCTSNode, mcts_search
+from mcts import MCTS, MCTSAgent, parallel_search
+
+
+def children(mcts, node):
+    start = mcts.first_child[node]
+    return [] if start == -1 else list(range(start, start + mcts.child_count[node]))
+
+
+def check_tree(mcts):
+    '''
+    every node but the root is the child of exactly the node its parent link names, and a
+    node has seen at least as many rollouts as all its children together
+    '''
+    seen = {0}
+    assert mcts.parent[0] == -1
+    for node in range(mcts.size):
+        assert abs(mcts.wins[node]) <= mcts.visits[node]
+        kids = children(mcts, node)
+        assert all(node < child < mcts.size for child in kids)
+        for child in kids:
+            assert mcts.parent[child] == node
+            assert child not in seen
+            seen.add(child)
+        assert mcts.visits[node] >= sum(mcts.visits[child] for child in kids)
+    assert seen == set(range(mcts.size))
+
+
+@pytest.mark.parametrize('moves', ['', '4', '4453', '44443332'])
+def test_search(moves):
+    random.seed(1)
+    position = Position.from_moves(moves)
+    before = (position.bitboards[:], position.heights[:], position.moves, position.hash)
+    player = 1 if position.moves % 2 == 0 else 2
+    mcts = MCTS(capacity=20000)
+    column = mcts.search(position, player, 2000)
+    assert (position.bitboards, position.heights, position.moves, position.hash) == before
+    assert position.check_valid_location(column)
+    assert mcts.visits[0] == 2000
+    check_tree(mcts)
+    for child in children(mcts, 0):
+        assert position.check_valid_location(mcts.move[child])
+
+
+def test_full_tree_keeps_going():
+    random.seed(2)
+    mcts = MCTS(capacity=200)
+    mcts.search(Position(), 1, 3000)
+    assert mcts.size <= 200
+    assert mcts.visits[0] == 3000
+    check_tree(mcts)
+
+
+def test_takes_a_win():
+    random.seed(3)
+    position = Position.from_moves('445566')  # player 1 wins with 3 or 7
+    assert MCTS(capacity=20000).search(position, 1, 2000) in (2, 6)
+
+
+def subtree(mcts, node):
+    '''
+    (visits, wins, move) of node and everything under it, breadth first with children in order
+    '''
+    found, queue = [], [node]
+    for node in queue:
+        found.append((mcts.visits[node], mcts.wins[node], mcts.move[node]))
+        queue.extend(children(mcts, node))
+    return found
+
+
+@pytest.mark.parametrize('moves', ['4', '4453', '1234'])
+def test_advance_keeps_the_subtree(moves):
+    random.seed(4)
+    position = Position.from_moves(moves)
+    player = 1 if position.moves % 2 == 0 else 2
+    mcts = MCTS(capacity=20000)
+    mcts.search(position, player, 3000)
+    for child in children(mcts, 0):
+        if children(mcts, child):
+            break
+    column = mcts.move[child]
+    kept = subtree(mcts, child)
+    mcts.advance(column)
+    assert mcts.position is position and position.moves == len(moves) + 1 and position.heights[column] > 0
+    assert mcts.player == 3 - player
+    assert mcts.size == len(kept)
+    assert [(visits, wins) for visits, wins, _ in subtree(mcts, 0)] == [(visits, wins) for visits, wins, _ in kept]
+    assert [move for _, _, move in subtree(mcts, 0)][1:] == [move for _, _, move in kept][1:]
+    assert mcts.move[0] == -1
+    check_tree(mcts)
+    # and the kept tree searches on like a fresh one
+    for _ in range(500):
+        mcts.iterate()
+    check_tree(mcts)
+    assert mcts.visits[0] == kept[0][0] + 500
+
+
+def test_advance_off_the_tree_starts_over():
+    random.seed(5)
+    mcts = MCTS(capacity=20000)
+    mcts.search(Position(), 1, 500)
+    mcts.advance(6)  # the empty board is symmetric, only columns 0 to 3 have children
+    assert mcts.size == 1 and mcts.visits[0] == 0 and mcts.player == 2
+    assert mcts.position.heights[6] == 1
+
+
+def test_agent_plays_a_game():
+    random.seed(6)
+    agent = MCTSAgent(capacity=5000)
+    position = agent.position
+    while not position.is_terminal():
+        column = agent.think(max_iterations=200)
+        assert position.check_valid_location(column)
+        agent.play(column)
+        check_tree(agent.mcts)
+    assert agent.think(max_iterations=10) is None
+
+
+@pytest.mark.parametrize('moves', ['', '4453'])
+def test_root_parallel(moves):
+    random.seed(7)
+    position = Position.from_moves(moves)
+    player = 1 if position.moves % 2 == 0 else 2
+    column, merged = parallel_search(position, player, iterations=600, workers=2, capacity=5000)
+    assert position.to_moves() == moves
+    assert position.check_valid_location(column)
+    assert all(position.check_valid_location(col) for col in merged)
+    assert sum(visits for visits, _ in merged.values()) == 600  # every iteration lands on one root child
+    assert all(abs(wins) <= visits for visits, wins in merged.values())
+    assert merged[column][0] == max(visits for visits, _ in merged.values())
+
+
+def test_leaf_parallel():
+    random.seed(8)
+    mcts = MCTS(capacity=5000, leaf_rollouts=9, workers=2)
+    try:
+        # player 1 wins every playout straight away, so the sum over both workers counts the playouts
+        mcts.reset(Position.from_moves('171717'), 1)
+        assert mcts.rollouts(1, 9) == -9  # shares of 5 and 4, all lost for player 2 who moved last
+        column = mcts.search(Position.from_moves('4453'), 1, 40)
+        assert mcts.position.check_valid_location(column)
+        assert mcts.visits[0] == 40 * 9
+        check_tree(mcts)
+    finally:
+        mcts.close()
+
+
+# the tree of MCTSNode objects in board.py
+
+def board_after(moves, geometry=(6, 7, 4), use_bitboard=False):
+    '''
+    a Board with moves played on it and current_player to move next
+    '''
+    board = Board(use_bitboard, *geometry)
+    for char in moves:
+        col = int(char) - 1
+        board.drop_piece(board.board, board.next_open_row(board.board, col), col, board.current_player)
+        board.switch_player()
+    return board
+
+
+@pytest.mark.parametrize('use_bitboard', [False, True])
+def test_node_positions(use_bitboard):
+    # every child's bitboard is its parent's plus one drop, and matches the child's own grid
+    random.seed(9)
+    root = MCTSNode(board_after('4453', use_bitboard=use_bitboard))
+    for _ in range(200):
+        node = root
+        while node.is_fully_expanded() and node.children and not node.terminal:
+            node = random.choice(node.children)
+        if node.terminal:
+            continue
+        child = node.expand()
+        grid = child.board.board
+        expected = grid if isinstance(grid, Position) else Position.from_array(grid, child.board.connect)
+        assert child.position.bitboards == expected.bitboards
+        assert child.position.moves == node.position.moves + 1
+        assert child.terminal == expected.is_terminal()
+        assert child.board.current_player != node.board.current_player
+    assert root.position.bitboards == Position.from_moves('4453').bitboards  # the children's drops don't touch their parent's
+
+
+def test_symmetric_nodes_expand_half_the_moves():
+    assert sorted(MCTSNode(board_after('')).unexplored_moves) == [0, 1, 2, 3]
+    assert sorted(MCTSNode(board_after('44')).unexplored_moves) == [0, 1, 2, 3]
+    assert sorted(MCTSNode(board_after('4453')).unexplored_moves) == list(range(7))
+    assert sorted(MCTSNode(board_after('11', (6, 8, 4))).unexplored_moves) == list(range(8))
+    assert sorted(MCTSNode(board_after('', (6, 8, 4))).unexplored_moves) == [0, 1, 2, 3]
+
+
+def test_node_rollouts_use_the_policy():
+    # player 1 to move wins at once in column 1, the policy never misses it
+    random.seed(10)
+    node = MCTSNode(board_after('171717'))
+    assert all(node.simulate() == -1 for _ in range(50))  # lost for player 2, who moved into the node
+    random.seed(11)
+    assert mcts_search(board_after('171717'), 300) == 0
+
+
+@pytest.mark.parametrize('use_bitboard', [False, True])
+def test_mcts_search(use_bitboard):
+    random.seed(12)
+    board = board_after('4453', use_bitboard=use_bitboard)
+    column = mcts_search(board, 300)
+    assert board.check_valid_location(board.board, column)
+    assert mcts_search(board_after('', (6, 8, 4), use_bitboard), 100) in range(8)
+
+
+def test_mcts_search_when_the_game_is_over():
+    board = board_after('14243', (5, 5, 3))  # three in a row on the bottom for player 1
+    assert mcts_search(board, 50) is None
+    assert mcts_search(board_after('1212121'), 50) is None
@@ -0,0 +1,96 @@
+'''
+RecordWriter / RecordReader round trips
+'''
+import numpy as np
+import pytest
+from bitboard import Position
+from random_games import random_positions
+from records import RecordReader, RecordWriter
+
+
+def random_games(count, geometry=(6, 7, 4), seed=3):
+    '''
+    (move string, result) of count random games played to the end
+    '''
+    return [(position.to_moves(), position.winner or 0)
+            for position in random_positions(count, seed, empty=(0, 0), geometry=geometry, ended='keep')]
+
+
+def test_round_trip(tmp_path):
+    path = str(tmp_path / 'games.c4r')
+    games = random_games(500) + [('', 0)]
+    with RecordWriter(path, chunk=64) as writer:  # a small chunk so the buffer is flushed on the way too
+        for moves, result in games:
+            writer.write(moves, result)
+    reader = RecordReader(path)
+    assert len(reader) == len(games)
+    assert list(reader) == games
+    assert reader[-1] == ('', 0)
+    assert reader.results.tolist() == [result for _, result in games]
+    assert reader.lengths.tolist() == [len(moves) for moves, _ in games]
+    columns = reader.columns()
+    for row, (moves, _) in zip(columns, games):
+        assert row[:len(moves)].tolist() == [int(char) - 1 for char in moves]
+        assert (row[len(moves):] == -1).all()
+    assert reader.position(3, 10).bitboards == Position.from_moves(games[3][0][:10]).bitboards
+
+
+def test_append(tmp_path):
+    path = str(tmp_path / 'games.c4r')
+    games = random_games(300, (5, 9, 4))
+    with RecordWriter(path, 5, 9, 4) as writer:
+        for moves, result in games[:100]:
+            writer.write(moves, result)
+    assert len(RecordReader(path)) == 100
+    with RecordWriter(path, 5, 9, 4) as writer:
+        for moves, result in games[100:]:
+            # 0-based columns work too
+            writer.write([int(char) - 1 for char in moves], result)
+    reader = RecordReader(path)
+    assert (reader.row_count, reader.column_count, reader.connect) == (5, 9, 4)
+    assert list(reader) == games
+
+
+def test_empty_file(tmp_path):
+    path = str(tmp_path / 'games.c4r')
+    RecordWriter(path).close()
+    reader = RecordReader(path)
+    assert len(reader) == 0
+    assert list(reader) == []
+    assert reader.columns().shape == (0, 42)
+
+
+def test_other_geometry_rejected(tmp_path):
+    path = str(tmp_path / 'games.c4r')
+    RecordWriter(path).close()
+    with pytest.raises(ValueError):
+        RecordWriter(path, 5, 6, 4)
+    with pytest.raises(ValueError):
+        RecordWriter(str(tmp_path / 'wide.c4r'), 6, 10, 4)  # move strings stop at 9 columns
+
+
+@pytest.mark.parametrize('moves, result', [
+    ('4483', 0),  # no column 8 on 6x7
+    ('44z3', 0),
+    ('4403', 0),
+    ([3, 3, 7], 0),
+    ([3, -1], 0),
+    ('1234567' * 6 + '1', 0),  # one move more than the board has cells
+    ('4453', 3),
+    ('4453', -1),
+    ('4453', None),
+])
+def test_bad_records_rejected(tmp_path, moves, result):
+    path = str(tmp_path / 'games.c4r')
+    with RecordWriter(path) as writer:
+        writer.write('4453', 1)
+        with pytest.raises(ValueError):
+            writer.write(moves, result)
+    assert list(RecordReader(path)) == [('4453', 1)]  # nothing of the bad record got in
+
+
+def test_not_a_record_file(tmp_path):
+    path = tmp_path / 'games.c4r'
+    path.write_bytes(np.zeros(16, dtype=np.uint8).tobytes())
+    with pytest.raises(ValueError):
+        RecordReader(str(path))
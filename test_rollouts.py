@@ -0,0 +1,108 @@
+'''
+The rollout policy, scalar rollouts against the batched playouts, and the tablebase shortcut
+'''
+import random
+import numpy as np
+import pytest
+from bitboard import Position
+from random_games import random_positions
+from rollouts import playouts, policy_move, rollout
+from solver import OpeningBook, Solver
+from tablebase import Tablebase
+
+
+def test_takes_the_win():
+    position = Position.from_moves('171717')  # three in column 1 for player 1, three in column 7 for player 2
+    random.seed(1)
+    assert all(policy_move(position, 1) == 0 for _ in range(50))
+
+
+def test_blocks_a_threat():
+    position = Position.from_moves('17171')  # player 2 to move, no win of its own
+    random.seed(2)
+    assert all(policy_move(position, 2) == 0 for _ in range(50))
+
+
+def test_never_plays_a_full_column():
+    rng = random.Random(3)
+    random.seed(3)
+    for _ in range(200):
+        position = Position.from_moves('444444333333')  # two full columns in the middle, where the weights are highest
+        while not position.is_terminal() and rng.random() < 0.95:
+            position.drop(rng.choice(position.get_valid_locations()), 1 if position.moves % 2 == 0 else 2)
+        if position.is_terminal():
+            continue
+        player = 1 if position.moves % 2 == 0 else 2
+        for _ in range(10):
+            assert position.check_valid_location(policy_move(position, player))
+
+
+@pytest.mark.parametrize('moves, player, winner', [
+    ('171717', 1, 1),  # wins straight away
+    ('37475', 2, 1),  # player 1 has both ends of a three open, only one can be blocked
+])
+def test_forced_results(moves, player, winner):
+    position = Position.from_moves(moves)
+    random.seed(4)
+    assert all(rollout(position, player) == winner for _ in range(20))
+    assert position.to_moves() == moves  # rollout undoes its moves
+    assert (playouts(position, player, 200, np.random.default_rng(4)) == winner).all()
+
+
+def test_playouts_agree_with_rollout():
+    # the same policy played one game at a time and in lockstep: same result frequencies
+    position = Position.from_moves('4453')
+    count = 3000
+    random.seed(5)
+    scalar = np.array([rollout(position, 1) for _ in range(count)])
+    batch = playouts(position, 1, count, np.random.default_rng(5))
+    for winner in (0, 1, 2):
+        assert abs((scalar == winner).mean() - (batch == winner).mean()) < 0.05
+
+
+def test_playouts_of_a_finished_game():
+    position = Position.from_moves('1212121')
+    assert (playouts(position, 2, 10) == 1).all()
+
+
+@pytest.fixture
+def tablebase(tmp_path):
+    return Tablebase(str(tmp_path / 'tb.c4t'), rollout_empty=10, solver=Solver(book=OpeningBook()))
+
+
+def endgame(empty, seed):
+    return random_positions(1, seed, empty=(empty, empty))[0]
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_tablebase_settles_playouts(tablebase, seed):
+    # with rollout_empty or fewer cells left every playout takes the perfect play result
+    position = endgame(10, seed)
+    player = 1 if position.moves % 2 == 0 else 2
+    score = Solver(book=OpeningBook()).solve_score(position)
+    expected = 0 if score == 0 else player if score > 0 else 3 - player
+    assert (playouts(position, player, 50, np.random.default_rng(seed), tablebase) == expected).all()
+    assert rollout(position, player, tablebase) == expected
+    assert len(tablebase) == 1
+
+
+def test_tablebase_later_in_the_playouts(tablebase):
+    # the playouts run on by policy until rollout_empty cells are left, then all of them are settled at once
+    position = endgame(13, 9)  # most random endgames are decided within three moves, this one isn't
+    player = 1 if position.moves % 2 == 0 else 2
+    winners = playouts(position, player, 100, np.random.default_rng(9), tablebase)
+    assert set(winners.tolist()) <= {0, 1, 2}
+    assert 0 < len(tablebase) <= 100
+    for key in tablebase.pending:
+        assert 42 - Position.from_key(key).moves == 10
+
+
+def test_tablebase_for_another_board(tablebase):
+    # the tablebase doesn't cover 5x6 games, they are played to the end instead
+    position = Position(5, 6, 4)
+    for col in (2, 3, 2, 3, 1, 4, 0, 5, 1, 4, 5, 0, 2, 3, 1, 4, 0, 5, 5, 0):
+        position.drop(col, 1 if position.moves % 2 == 0 else 2)
+    assert not position.is_terminal()
+    winners = playouts(position, 1, 50, np.random.default_rng(7), tablebase)
+    assert set(winners.tolist()) <= {0, 1, 2}
+    assert len(tablebase) == 0
@@ -0,0 +1,250 @@
+'''
+Board.minimax / negamax: what the speedups around them must not change
+'''
+import math
+import random
+import numpy as np
+import pytest
+from bitboard import Position
+from board import Board
+from random_games import random_positions
+from solver import OpeningBook, Solver
+from transposition import LOWER, NEGAMAX_KEY, UPPER, TranspositionTable
+
+
+def midgames(count, seed, moves=(4, 20), geometry=(6, 7, 4)):
+    '''
+    random_games.random_positions stopped after 4 to 20 moves by default, none of them over
+    '''
+    return random_positions(count, seed, moves, geometry=geometry)
+
+
+def searcher(position, tt=False, tactics=False):
+    '''
+    a fresh Board searching for the side to move in position
+    '''
+    board = Board(False, position.row_count, position.column_count, position.connect)
+    board.comp = 1 if position.moves % 2 == 0 else 2
+    board.human = 3 - board.comp
+    board.tt = TranspositionTable() if tt else None
+    board.tactics = tactics
+    return board
+
+
+def minimax_value(position, depth, **kwargs):
+    return searcher(position, **kwargs).minimax(position, depth, -math.inf, math.inf, True)[1]
+
+
+def negamax_value(position, depth, **kwargs):
+    return searcher(position, **kwargs).negamax(position, depth, -math.inf, math.inf, 1)[1]
+
+
+@pytest.mark.parametrize('position', midgames(30, 1), ids=lambda position: position.to_moves())
+def test_transposition_table_keeps_values(position):
+    for depth in (3, 4):
+        assert minimax_value(position, depth, tt=True) == minimax_value(position, depth)
+        assert negamax_value(position, depth, tt=True) == negamax_value(position, depth)
+
+
+@pytest.mark.parametrize('position', midgames(20, 11), ids=lambda position: position.to_moves())
+def test_transposition_table_bounds_from_deeper_entries(position):
+    # a bound left by a deeper search on an earlier move narrows the window, and what
+    # the search finds inside the narrowed window is only a bound at its own depth
+    depth = 3
+    for search, salt, value in (('minimax', 0, minimax_value(position, depth)),
+                                ('negamax', NEGAMAX_KEY, negamax_value(position, depth))):
+        for flag, tt_value, expected in ((UPPER, value - 100, LOWER), (LOWER, value + 100, UPPER)):
+            board = searcher(position, tt=True)
+            key, _ = board.tt_key(position, salt)
+            board.tt.store(key, depth + 6, flag, tt_value, None)
+            board.tt.new_search()
+            if search == 'minimax':
+                board.minimax(position, depth, -math.inf, math.inf, True)
+            else:
+                board.negamax(position, depth, -math.inf, math.inf, 1)
+            assert board.tt.probe(key)[2] == expected
+
+
+def plain_minimax(board, position, depth, maximizing):
+    '''
+    every move to depth, no alpha-beta and no move ordering, scored like Board.minimax
+    '''
+    if position.winner is not None:
+        return 1000000 if position.winner == board.comp else -1000000
+    if position.is_tie():
+        return 0
+    if depth == 0:
+        return board.score_position(position, board.comp)
+    values = []
+    for col in position.get_valid_locations():
+        position.drop(col, board.comp if maximizing else board.human)
+        values.append(plain_minimax(board, position, depth - 1, not maximizing))
+        position.undo()
+    return max(values) if maximizing else min(values)
+
+
+@pytest.mark.parametrize('position', midgames(30, 3), ids=lambda position: position.to_moves())
+def test_alpha_beta_matches_plain_minimax(position):
+    board = searcher(position)
+    expected = plain_minimax(board, position, 3, True)
+    assert minimax_value(position, 3) == expected
+    assert negamax_value(position, 3) == expected
+
+
+def test_boards_share_their_geometry():
+    # MCTSNode makes a Board per child, the masks are made once per size and the search tables on first use
+    board = Board()
+    assert board.geometry is Board().geometry
+    assert Board(False, 5, 6, 4).geometry is not board.geometry
+    assert board._killers is None and board._history is None
+    board.comp, board.human = 1, 2
+    board.minimax(Position.from_moves('4453'), 3, -math.inf, math.inf, True)
+    assert len(board.killers) == 43 and len(board.history) == 2
+
+
+def test_killers_and_history_keep_values():
+    # one board searching one position after another carries its killers and history along
+    board = searcher(Position())
+    for position in midgames(20, 4):
+        board.comp = 1 if position.moves % 2 == 0 else 2
+        board.human = 3 - board.comp
+        assert board.minimax(position, 4, -math.inf, math.inf, True)[1] == minimax_value(position, 4)
+    assert any(killer is not None for killers in board.killers for killer in killers)
+
+
+def test_order_moves():
+    # every move once, the transposition table move first
+    board = searcher(Position())
+    rng = random.Random(5)
+    for position in midgames(50, 5):
+        if position.is_symmetric():
+            continue  # only one of every mirror pair is searched there
+        moves = position.get_valid_locations()
+        tt_move = rng.choice(moves)
+        ordered = board.order_moves(position, 0, tt_move, board.comp)
+        assert sorted(ordered) == moves
+        assert ordered[0] == tt_move
+
+
+def snapshot(position):
+    return position.bitboards[:], position.heights[:], position.moves, position.history[:], position.winner, position.hash, position.mirror_hash
+
+
+@pytest.mark.parametrize('position', midgames(20, 6), ids=lambda position: position.to_moves())
+def test_search_leaves_the_board_as_it_was(position):
+    before = snapshot(position)
+    grid = position.to_array()
+    for tt in (False, True):
+        board = searcher(position, tt=tt, tactics=True)
+        board.minimax(position, 4, -math.inf, math.inf, True)
+        board.negamax(position, 4, -math.inf, math.inf, 1)
+        board.minimax(grid, 3, -math.inf, math.inf, True)
+        assert snapshot(position) == before
+        assert board.move_stack == []
+    assert np.array_equal(grid, position.to_array())
+
+
+def test_timed_out_search_takes_its_moves_back():
+    for position in midgames(10, 7, (0, 6)):
+        before = snapshot(position)
+        board = searcher(position, tt=True, tactics=True)
+        column, _, depth = board.iterative_deepening(position, 20)
+        assert depth < 42 - position.moves  # the budget ran out somewhere down the tree
+        assert position.check_valid_location(column)
+        assert snapshot(position) == before
+        assert board.move_stack == []
+
+
+def mirrored(position):
+    found = Position(position.row_count, position.column_count, position.connect)
+    for column, piece, _ in position.history:
+        found.drop(position.column_count - 1 - column, piece)
+    return found
+
+
+# on 6x8 there are two middle columns, the center bonus has to count both for this to hold
+@pytest.mark.parametrize('position', midgames(20, 8) + midgames(10, 8, geometry=(6, 8, 4)), ids=lambda position: position.to_moves())
+def test_mirror_images_search_the_same(position):
+    other = mirrored(position)
+    board = searcher(position)
+    assert board.tt_key(position, 0)[0] == board.tt_key(other, 0)[0]
+    for kwargs in ({}, {'tt': True}, {'tt': True, 'tactics': True}):
+        assert minimax_value(position, 4, **kwargs) == minimax_value(other, 4, **kwargs)
+        assert negamax_value(position, 4, **kwargs) == negamax_value(other, 4, **kwargs)
+
+
+def test_shared_entry_for_mirror_images():
+    # one table, the position and then its mirror image: the stored move comes back flipped and legal
+    for position in midgames(20, 9):
+        board = searcher(position, tt=True)
+        value = board.minimax(position, 4, -math.inf, math.inf, True)[1]
+        other = mirrored(position)
+        column, other_value = board.minimax(other, 4, -math.inf, math.inf, True)
+        assert other_value == value
+        assert other.check_valid_location(column)
+
+
+@pytest.mark.parametrize('moves', ['', '4455', '1188'])
+def test_folding_on_an_even_width(moves):
+    # symmetric 6x8 positions only search the left half, the right half must not score better
+    position = Position.from_moves(moves, 6, 8, 4)
+    assert position.is_symmetric()
+    board = searcher(position)
+    expected = plain_minimax(board, position, 3, True)
+    assert minimax_value(position, 3) == expected
+    assert negamax_value(position, 3) == expected
+
+
+def test_symmetric_positions_search_half_the_moves():
+    board = searcher(Position())
+    for moves in ('', '4', '44', '4444'):
+        position = Position.from_moves(moves)
+        assert position.is_symmetric()
+        ordered = board.order_moves(position, 0, None, board.comp)
+        assert sorted(ordered) == [col for col in position.get_valid_locations() if col <= 6 - col]
+
+
+@pytest.fixture(scope='module')
+def solver():
+    return Solver(book=OpeningBook())
+
+
+def endgames(count, seed):
+    '''
+    random positions 30 to 34 moves in, mostly ones where the side to move can't just win
+    '''
+    found = []
+    for position in midgames(20 * count, seed, (30, 34)):
+        piece = 1 if position.moves % 2 == 0 else 2
+        if searcher(position).threat_moves(position, piece)[1] != 1 or len(found) % 10 == 0:
+            found.append(position)
+        if len(found) == count:
+            return found
+    return found
+
+
+@pytest.mark.parametrize('position', endgames(60, 10), ids=lambda position: position.to_moves())
+def test_threat_moves_agree_with_the_solver(solver, position):
+    board = searcher(position)
+    piece = 1 if position.moves % 2 == 0 else 2
+    columns, result = board.threat_moves(position, piece)
+    score = solver.solve_score(position)
+    if result == 1:
+        assert score > 0
+        position.drop(columns[0], piece)
+        assert position.winner == piece
+        position.undo()
+        return
+    if result == -1:
+        assert score < 0
+        return
+    # the moves left out lose, and the best one is still in
+    scores = {}
+    for col in position.get_valid_locations():
+        position.drop(col, piece)
+        scores[col] = -solver.solve_score(position)
+        position.undo()
+    for col in scores:
+        if col not in columns:
+            assert scores[col] < 0
+    assert max(scores[col] for col in columns) == score
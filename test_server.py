@@ -0,0 +1,256 @@
+'''
+EngineServer over a socket pair, and EngineClient against a listening server
+'''
+import asyncio
+import json
+import os
+import socket
+import threading
+import time
+import pytest
+from bitboard import Position
+from board import Board
+from client import EngineClient, RemoteWorker, parse_address
+from server import EngineServer
+
+
+async def exchange(server, lines):
+    '''
+    send lines on one connection to server.handle, half close, and read every reply until it hangs up
+    '''
+    server_side, client_side = socket.socketpair()
+    server_reader, server_writer = await asyncio.open_connection(sock=server_side)
+    handler = asyncio.create_task(server.handle(server_reader, server_writer))
+    reader, writer = await asyncio.open_connection(sock=client_side)
+    for line in lines:
+        writer.write((line if isinstance(line, str) else json.dumps(line)).encode() + b'\n')
+    await writer.drain()
+    writer.write_eof()
+    replies = []
+    while line := await reader.readline():
+        replies.append(json.loads(line))
+    await handler
+    writer.close()
+    return replies
+
+
+def talk(lines, **kwargs):
+    server = EngineServer(use_tablebase=False, use_book=False, **kwargs)
+    try:
+        return asyncio.run(asyncio.wait_for(exchange(server, lines), 60))
+    finally:
+        server.close()
+
+
+def answers(replies):
+    '''
+    {id: final reply}, checking every id got exactly one (lines that aren't requests all answer with id None)
+    '''
+    final = [reply for reply in replies if not reply.get('progress') and reply['id'] is not None]
+    found = {reply['id']: reply for reply in final}
+    assert len(found) == len(final)
+    found[None] = [reply for reply in replies if reply['id'] is None]
+    return found
+
+
+@pytest.mark.parametrize('line', [
+    '{"id": 1, "time": NaN}',
+    '{"id": 1, "time": Infinity}',
+    '{"id": 1, "time": -Infinity}',
+    '{"id": 1, "time": %s}' % ('9' * 400),  # too large for a float
+    '{"id": 1, "depth": 1e999}',
+    '{"id": 1, "depth": 0}',
+    '{"id": 1, "depth": -3}',
+    '{"id": 1, "depth": 2.5}',
+    '{"id": 1, "time": "soon"}',
+    '{"id": 1, "time": true}',
+    '{"id": 1, "rows": NaN}',
+])
+def test_bad_numbers(line):
+    reply, = talk([line])
+    assert reply['id'] == 1 and 'error' in reply
+
+
+def test_negative_time_searches_one_depth():
+    reply, = talk([{'id': 1, 'moves': '44', 'time': -50}])
+    assert reply['id'] == 1 and reply['depth'] == 1 and reply['column'] is not None
+
+
+@pytest.mark.parametrize('request_', [
+    {'key': 'x'},
+    {'key': True},
+    {'key': 1.5},
+    {'key': 1 << 70},
+    {'key': -3},
+    {'moves': 44},
+    {'moves': '88'},
+    {'moves': '1111111'},  # the seventh disc doesn't fit
+])
+def test_bad_positions(request_):
+    reply, = talk([dict(request_, id=2)])
+    assert reply['id'] == 2 and 'error' in reply
+
+
+@pytest.mark.parametrize('size', [{'rows': 12}, {'rows': -4}, {'columns': 3}, {'columns': 10},
+                                  {'connect': 1}, {'connect': 7}, {'rows': 4, 'columns': 5, 'connect': 5}])
+def test_unsupported_boards(size):
+    reply, = talk([dict(size, id=3)])
+    assert reply['id'] == 3 and 'error' in reply
+
+
+def test_other_board_sizes():
+    found = answers(talk([{'id': 1, 'rows': 5, 'columns': 5, 'connect': 4, 'moves': '33', 'depth': 2},
+                          {'id': 2, 'rows': 4, 'columns': 9, 'connect': 3, 'moves': '5', 'depth': 2}]))
+    assert 0 <= found[1]['column'] < 5 and 0 <= found[2]['column'] < 9
+
+
+def test_key_instead_of_moves():
+    key = Position.from_moves('4453').key()
+    found = answers(talk([{'id': 1, 'moves': '4453', 'depth': 3}, {'id': 2, 'key': key, 'depth': 3}]))
+    assert found[1]['column'] == found[2]['column'] and found[1]['score'] == found[2]['score']
+    assert found[2]['moves'] is None
+
+
+def test_many_requests_on_one_connection():
+    lines = [
+        {'id': 1, 'moves': '4453', 'depth': 3, 'progress': True},
+        '{"id": 2, "time": NaN}',
+        'not json',
+        '[1, 2]',
+        {'id': 3, 'moves': '', 'depth': 2},
+        {'id': 4, 'rows': 20},
+        {'id': 5, 'moves': '444', 'depth': 2},
+    ]
+    replies = talk(lines)
+    found = answers(replies)
+    assert set(found) == {1, 2, 3, 4, 5, None}
+    assert len(found[None]) == 2 and all('error' in reply for reply in found[None])
+    assert 'error' in found[2] and 'error' in found[4]
+    assert [found[i]['moves'] for i in (1, 3, 5)] == ['4453', '', '444']
+    assert all(found[i]['column'] is not None for i in (1, 3, 5))
+    # progress of request 1: one message per finished depth, all before its reply
+    progress = [i for i, reply in enumerate(replies) if reply['id'] == 1 and reply.get('progress')]
+    assert [replies[i]['depth'] for i in progress] == [1, 2, 3]
+    assert max(progress) < replies.index(found[1])
+    assert replies[progress[-1]]['column'] == found[1]['column']
+
+
+def test_game_over():
+    reply, = talk([{'id': 1, 'moves': '1212121'}])  # player 1 has four in column 1
+    assert reply['column'] is None and reply['to_move'] == 2
+
+
+@pytest.fixture
+def listening(tmp_path):
+    '''
+    address of an EngineServer listening on a Unix socket from a thread of its own
+    '''
+    path = str(tmp_path / 'engine.sock')
+    server = EngineServer(use_tablebase=False, use_book=False)
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    future = asyncio.run_coroutine_threadsafe(server.listen('unix:' + path), loop)
+    deadline = time.perf_counter() + 10
+    while not os.path.exists(path) and time.perf_counter() < deadline:
+        time.sleep(0.01)
+    yield 'unix:' + path
+    future.cancel()
+
+    async def cancel_all():
+        # the listener and any connection still open, so none is left pending when the loop stops
+        tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    asyncio.run_coroutine_threadsafe(cancel_all(), loop).result(10)
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join()
+    loop.close()
+    server.close()
+
+
+def test_client(listening):
+    client = EngineClient(listening)
+    try:
+        depths = []
+        reply = client.search('4453', 10000, 3, on_progress=lambda message: depths.append(message['depth']))
+        assert reply['depth'] == 3 and depths == [1, 2, 3]
+        with pytest.raises(ValueError):
+            client.search('88')
+        # a non-standard board with an unknown move order goes as a key
+        position = Position(5, 6, 4)
+        position.drop(2, 1)
+        position.history.clear()
+        assert 0 <= client.search(position, max_depth=2)['column'] < 6
+    finally:
+        client.close()
+
+
+def wait(worker, timeout=30):
+    '''
+    poll worker until it answers, returns the column
+    '''
+    deadline = time.perf_counter() + timeout
+    while worker.busy and time.perf_counter() < deadline:
+        col = worker.poll()
+        if col is not None:
+            return col
+        time.sleep(0.01)
+    raise AssertionError("no answer")
+
+
+def test_remote_worker(listening):
+    board = Board(False)
+    board.human, board.comp = 1, 2
+    worker = RemoteWorker(listening)
+    try:
+        worker.request(board, 200)
+        assert 0 <= wait(worker) < 7
+        # the server turns an 11 column board down, poll raises its error once and is ready for more
+        wide = Board(False, 6, 11, 4)
+        wide.human, wide.comp = 1, 2
+        worker.request(wide, 200)
+        with pytest.raises(ValueError):
+            wait(worker)
+        assert not worker.busy and worker.poll() is None
+        worker.request(board, 200)
+        assert 0 <= wait(worker) < 7
+    finally:
+        worker.close()
+
+
+def test_remote_worker_hung_up_on(tmp_path):
+    # a "server" that hangs up on every connection without a word
+    path = str(tmp_path / 'engine.sock')
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(path)
+    listener.listen()
+
+    def hang_up():
+        connection, _ = listener.accept()
+        connection.close()
+
+    thread = threading.Thread(target=hang_up, daemon=True)
+    thread.start()
+    board = Board(False)
+    board.human, board.comp = 1, 2
+    worker = RemoteWorker('unix:' + path)
+    try:
+        worker.request(board, 200)
+        with pytest.raises(ConnectionError):
+            wait(worker)
+        assert not worker.busy and worker.client is None  # the next request connects again
+    finally:
+        worker.close()
+        thread.join()
+        listener.close()
+
+
+def test_parse_address():
+    assert parse_address('127.0.0.1:7740') == ('tcp', '127.0.0.1', 7740)
+    assert parse_address('[::1]:80') == ('tcp', '::1', 80)
+    assert parse_address('unix:/tmp/x.sock') == ('unix', '/tmp/x.sock')
+    with pytest.raises(ValueError):
+        parse_address('localhost')
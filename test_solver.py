@@ -0,0 +1,76 @@
+'''
+Solver against a plain negamax over every move, on endgames small enough for it
+'''
+from functools import lru_cache
+import numpy as np
+import pytest
+from bitboard import Position
+from random_games import random_positions
+from engine import Engine
+from solver import OpeningBook, Solver, split
+
+GEOMETRIES = [(6, 7, 4), (5, 6, 4), (4, 5, 3)]
+ENDGAMES = 100
+
+
+@lru_cache(maxsize=None)
+def brute_force(moves, geometry):
+    '''
+    (score, plies until the game ends) of the position after moves, by trying every move
+    '''
+    position = Position.from_moves(moves, *geometry)
+    area = position.row_count * position.column_count
+    if position.winner is not None:
+        return -((area + 2 - position.moves) // 2), 0  # the move before this one won
+    if position.moves == area:
+        return 0, 0
+    best = None
+    for col in position.get_valid_locations():
+        score, plies = brute_force(moves + str(col + 1), geometry)
+        if best is None or -score > best[0]:
+            best = (-score, plies + 1)
+    return best
+
+
+@pytest.fixture(scope='module')
+def solver():
+    return Solver(book=OpeningBook())
+
+
+# random games stopped with 6 to 10 empty cells left and no winner yet
+@pytest.mark.parametrize('position', random_positions(ENDGAMES, 1, empty=(6, 10), geometry=GEOMETRIES), ids=lambda position: position.to_moves())
+def test_solve(solver, position):
+    geometry = (position.row_count, position.column_count, position.connect)
+    moves = position.to_moves()
+    score, plies = brute_force(moves, geometry)
+    assert solver.solve_score(position) == score
+    assert solver.solve_score(position, weak=True) == (score > 0) - (score < 0)
+    assert solver.distance(position, score) == plies
+    assert solver.solve(position) == ((score > 0) - (score < 0), plies)
+    column, best = solver.best_move(position)
+    assert best == score
+    assert position.check_valid_location(column)
+    # the column it picks has to keep the score, or be the mirror of one that does
+    scores = {col: -brute_force(moves + str(col + 1), geometry)[0] for col in position.get_valid_locations()}
+    assert scores[column] == score or scores.get(position.column_count - 1 - column) == score
+    assert position.to_moves() == moves  # solving leaves the position as it was
+
+
+def test_engine_answers_from_the_book():
+    # no book ships with the repo and build_book is far too slow for a test, so the book is made up:
+    # every child of 4453 is in it, and the one after column 3 is the best for the side to move
+    position = Position.from_moves('4453')
+    found = {}
+    for col in position.get_valid_locations():
+        position.drop(col, 1)
+        current, mask = split(position)
+        found[current + mask] = -5 if col == 2 else 2
+        position.undo()
+    keys = np.array(sorted(found), dtype=np.uint64)
+    book = OpeningBook(keys, np.array([found[int(key)] for key in keys], dtype=np.int8), 5)
+    engine = Engine(book=book)
+    assert engine.book_move(position) == (2, 5)
+    result = engine.search('4453')
+    assert (result['source'], result['column'], result['score'], result['depth']) == ('book', 2, 1000000, 0)
+    assert Engine(book=book).search('44533', max_depth=2)['source'] == 'search'  # its children aren't in the book
+    assert Engine().search('4453', max_depth=2)['source'] == 'search'
@@ -0,0 +1,82 @@
+'''
+SearchStats as every kind of search fills it in
+'''
+import math
+import random
+import pytest
+from bitboard import Position
+from board import Board, mcts_search
+from engine import Engine
+from mcts import MCTS
+from stats import SearchStats
+from transposition import TranspositionTable
+
+MCTS_PHASES = {'select', 'expand', 'rollout', 'backpropagate'}
+
+
+def searcher(position, stats):
+    board = Board(False, position.row_count, position.column_count, position.connect)
+    board.comp = 1 if position.moves % 2 == 0 else 2
+    board.human = 3 - board.comp
+    board.tt = TranspositionTable()
+    board.stats = stats
+    return board
+
+
+@pytest.mark.parametrize('kind', ['minimax', 'negamax'])
+def test_alpha_beta(kind):
+    position = Position.from_moves('4453')
+    results = []
+    for stats in (None, SearchStats()):
+        board = searcher(position, stats)
+        if kind == 'minimax':
+            results.append(board.minimax(position, 4, -math.inf, math.inf, True))
+        else:
+            results.append(board.negamax(position, 4, -math.inf, math.inf, 1))
+    assert results[0] == results[1]  # counting doesn't change the search
+    found = stats.as_dict()
+    assert found['depth'] == 4
+    assert found['nodes'] == board.nodes > 1
+    assert 0 < found['leaf_evals'] < found['nodes']
+    assert 0 < found['tt_hits'] <= found['tt_probes'] <= found['nodes']
+    assert sum(found['cutoffs']) > 0 and found['cutoffs'][0] == 0  # nothing cuts off at the root, every move is searched
+    assert found['branching_factor'] > 1
+    assert found['rollouts'] == found['tree_size'] == 0
+
+
+def test_iterative_deepening():
+    result = Engine().search('4453', time_budget_ms=60000, max_depth=5, collect_stats=True)
+    found = result['stats']
+    assert result['depth'] == found['depth'] == 5
+    assert [depth for depth, _, _ in found['iterations']] == [1, 2, 3, 4, 5]
+    assert sum(nodes for _, nodes, _ in found['iterations']) == found['nodes']
+    assert all(nodes > 0 and ms >= 0 for _, nodes, ms in found['iterations'])
+    assert math.isclose(found['ms']['search'], sum(ms for _, _, ms in found['iterations']))
+    assert found['branching_factor'] == found['iterations'][-1][1] / found['iterations'][-2][1]
+    assert 'stats' not in Engine().search('4453', max_depth=2)
+
+
+def test_array_mcts():
+    random.seed(1)
+    mcts = MCTS(capacity=5000)
+    mcts.stats = SearchStats()
+    mcts.search(Position.from_moves('4453'), 1, 500)
+    found = mcts.stats.as_dict()
+    assert found['rollouts'] == 500
+    assert found['tree_size'] == mcts.size > 1
+    assert found['max_depth'] >= 1
+    assert set(found['ms']) == MCTS_PHASES and all(ms >= 0 for ms in found['ms'].values())
+    assert found['nodes'] == found['leaf_evals'] == 0
+
+
+def test_mcts_search():
+    random.seed(2)
+    board = Board(use_bitboard=True)
+    board.board = Position.from_moves('4453')
+    stats = SearchStats()
+    mcts_search(board, 300, stats)
+    found = stats.as_dict()
+    assert found['rollouts'] == 300
+    assert 1 < found['tree_size'] <= 301  # at most one new node per iteration, plus the root
+    assert found['max_depth'] >= 1
+    assert set(found['ms']) == MCTS_PHASES
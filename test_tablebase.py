@@ -0,0 +1,87 @@
+'''
+Tablebase lookups, mirror folding and sharing one file
+'''
+import pytest
+from bitboard import Position
+from random_games import random_positions
+from solver import OpeningBook, Solver
+from tablebase import Tablebase
+
+
+def endgames(count, seed=5):
+    '''
+    random 6x7 games stopped with 8 to 12 empty cells left and no winner yet
+    '''
+    return random_positions(count, seed, empty=(8, 12))
+
+
+def mirrored(position):
+    return Position.from_moves(''.join(str(8 - int(char)) for char in position.to_moves()))
+
+
+@pytest.fixture(scope='module')
+def solver():
+    return Solver(book=OpeningBook())
+
+
+def test_mirror_images_share_an_entry(tmp_path, solver):
+    tablebase = Tablebase(str(tmp_path / 'tb.c4t'), solver=solver)
+    position = next(position for position in endgames(20) if not position.is_symmetric())
+    mirror = mirrored(position)
+    assert mirror.key() != position.key()
+    assert tablebase.probe(mirror) is None
+    score = tablebase.score(position)
+    assert tablebase.probe(mirror) == score == solver.solve_score(mirror)
+    assert tablebase.score(mirror) == score
+    assert len(tablebase) == 1
+    tablebase.flush()
+    assert len(Tablebase(str(tmp_path / 'tb.c4t'), solver=solver)) == 1
+
+
+def test_lookups_agree(tmp_path, solver):
+    path = str(tmp_path / 'tb.c4t')
+    positions = endgames(30)
+    tablebase = Tablebase(path, cache_size=4, solver=solver)  # most lookups miss the LRU cache
+    scores = [tablebase.score(position) for position in positions]
+    assert scores == [solver.solve_score(position) for position in positions]
+    assert len(tablebase.cache) == 4
+    assert [tablebase.probe(position) for position in positions] == scores  # from pending
+    tablebase.flush()
+    assert not tablebase.pending
+    tablebase.cache.clear()
+    assert [tablebase.probe(position) for position in positions] == scores  # from the file
+    assert [Tablebase(path, solver=solver).probe(position) for position in positions] == scores
+
+
+def test_two_instances_share_a_file(tmp_path, solver):
+    path = str(tmp_path / 'tb.c4t')
+    positions = endgames(20, seed=6)
+    first, second = Tablebase(path, solver=solver), Tablebase(path, solver=solver)
+    scores = [first.score(position) for position in positions[:10]] + [second.score(position) for position in positions[10:]]
+    first.flush()
+    second.flush()  # rereads the file under the lock, the first instance's scores stay
+    merged = Tablebase(path, solver=solver)
+    assert len(merged) == len({merged.canonical_key(position) for position in positions})
+    assert [merged.probe(position) for position in positions] == scores
+
+
+def test_other_geometry_rejected(tmp_path, solver):
+    path = str(tmp_path / 'tb.c4t')
+    other = Tablebase(path, geometry=(6, 7, 5), solver=solver)  # no file yet
+    tablebase = Tablebase(path, solver=solver)
+    tablebase.score(endgames(1)[0])
+    tablebase.flush()
+    with pytest.raises(ValueError):
+        Tablebase(path, geometry=(6, 7, 5), solver=solver)
+    position = Position.from_moves(endgames(1)[0].to_moves(), 6, 7, 5)
+    other.score(position)
+    with pytest.raises(ValueError):
+        other.flush()
+    assert len(Tablebase(path, solver=solver)) == 1  # the file is as the standard board left it
+
+
+def test_not_a_tablebase_file(tmp_path):
+    path = tmp_path / 'tb.c4t'
+    path.write_bytes(bytes(16))
+    with pytest.raises(ValueError):
+        Tablebase(str(path))
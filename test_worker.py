@@ -0,0 +1,57 @@
+'''
+SearchWorker: searches in its own process, and carries on when that process dies
+'''
+import time
+from board import Board
+from worker import SearchWorker
+
+
+def threat_board():
+    '''
+    a Board where the computer (player 2) is to move and wins in column 7
+    '''
+    board = Board(False)
+    board.human, board.comp = 1, 2
+    for col, piece in ((0, 1), (6, 2), (0, 1), (6, 2), (1, 1), (6, 2), (2, 1)):
+        board.drop_piece(board.board, board.next_open_row(board.board, col), col, piece)
+    return board
+
+
+def wait(worker, timeout=30):
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        col = worker.poll()
+        if col is not None:
+            return col
+        time.sleep(0.01)
+    raise AssertionError("the worker never answered")
+
+
+def test_search():
+    worker = SearchWorker(collect_stats=True)
+    try:
+        worker.request(threat_board(), 200)
+        assert worker.busy
+        assert wait(worker) == 6
+        assert not worker.busy and worker.last_stats['nodes'] > 0
+        worker.request(threat_board(), 200)  # the same process takes the next one
+        assert wait(worker) == 6
+    finally:
+        worker.close()
+    assert worker.process is None
+
+
+def test_dead_process():
+    worker = SearchWorker()
+    try:
+        worker.start()
+        worker.process.kill()
+        worker.process.join()
+        worker.request(threat_board(), 200)  # goes to a queue nobody reads any more
+        assert wait(worker) == 6  # searched in this process instead
+        assert not worker.busy and worker.process is None
+        worker.request(threat_board(), 200)  # and a new process is started for the next one
+        assert worker.process.is_alive()
+        assert wait(worker) == 6
+    finally:
+        worker.close()
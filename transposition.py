@@ -0,0 +1,59 @@
+'''
+Transposition table for minimax and negamax.
+
+Positions are looked up by their zobrist hash (see bitboard.py). Each slot
+remembers the search depth, whether the stored value is exact or only a
+bound, and the best move found, so a position reached through a different
+move order doesn't have to be searched again.
+'''
+import random
+
+# what the stored value means
+EXACT = 0  # the real value at that depth
+LOWER = 1  # the search failed high, the real value is at least this
+UPPER = 2  # the search failed low, the real value is at most this
+
+# xored into the hash so entries for different searches/sides never get mixed up
+_rng = random.Random(0xC4)
+MINIMIZING_KEY = _rng.getrandbits(64)  # minimax called with maximizingPlayer=False
+NEGAMAX_KEY = _rng.getrandbits(64)  # negamax values are from the side to move, minimax from the computer
+
+
+class TranspositionTable:
+
+    def __init__(self, size=1 << 18):
+        '''
+        size is the number of slots (rounded down to a power of two); the table never
+        grows past it, new entries replace old ones instead
+        '''
+        self.size = 1 << (max(1, size).bit_length() - 1)
+        self.mask = self.size - 1
+        self.entries = [None] * self.size  # (key, depth, flag, value, move, generation)
+        self.generation = 0
+
+    def new_search(self):
+        '''
+        call once per move; entries from earlier moves stay usable but are the first to be replaced
+        '''
+        self.generation += 1
+
+    def clear(self):
+        self.entries = [None] * self.size
+        self.generation = 0
+
+    def probe(self, key):
+        entry = self.entries[key & self.mask]
+        if entry is not None and entry[0] == key:
+            return entry
+        return None
+
+    def store(self, key, depth, flag, value, move):
+        index = key & self.mask
+        old = self.entries[index]
+        # depth-preferred replacement: keep a deeper result of the current search,
+        # anything else (empty, older search, not deeper) is overwritten
+        if old is None or old[5] != self.generation or depth >= old[1]:
+            self.entries[index] = (key, depth, flag, value, move, self.generation)
+
+    def __len__(self):
+        return sum(1 for entry in self.entries if entry is not None)
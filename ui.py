@@ -2,7 +2,7 @@ import pygame
 from pygame.locals import *
 import sys
 from board import Board 
-import math 
+from worker import SearchWorker
 import numpy as np
 
 '''
@@ -14,9 +14,13 @@ layout of file:
 5. game logic (handle_mouse_click, show_turn)
 '''
 
+# the window was uncovered or restored and its contents are gone; the WINDOW* events are pygame 2 only
+EXPOSE_EVENTS = {pygame.VIDEOEXPOSE} | {getattr(pygame, name) for name in ('WINDOWEXPOSED', 'WINDOWRESTORED', 'WINDOWSHOWN') if hasattr(pygame, name)}
+
+
 class UI:
 
-    def __init__(self,board):
+    def __init__(self,board,worker=None):
         #initialize board
         self.board = board
         self.row_count = self.board.row_count
@@ -26,10 +30,12 @@ class UI:
         self.running=True
         self.token_size = 100 # best size (less than 50 the window is too small and greater than 100 you can't see all of the  board
         self.show_hover_token = True
+        self.time_budget_ms = 1000  # how long the computer may think about one move
+        self.worker = SearchWorker() if worker is None else worker  # runs the computer's search in another process, or e.g. a client.RemoteWorker
 
-        #pygame.time.Clock()
         self._display_surf = None
         self._clock = None 
+        self.fps = 30  # frame cap, the loop sleeps the rest of each frame instead of spinning
         self.player_pieces = {1: 'red', 2: 'yellow'}  
         self.colors = {
             0: (255, 255, 255), # white - empty slot
@@ -44,17 +50,21 @@ class UI:
         self.font = pygame.font.SysFont(None, 36)
         self.message = "" 
         self.winner_message = ""
+        self.text_cache = {}  # (text, color) -> rendered surface
+
+        # what is on screen already, so a frame only redraws what changed
+        self.board_surface = None  # the board area, discs included
+        self.drawn_grid = None  # grid the board surface shows
+        self.drawn_header = None  # everything the strip above the board depends on
+        self.exposed = False  # the whole window has to be drawn again, see handle_events
+        self.board_rect = pygame.Rect(0, self.token_size, self.column_count * self.token_size, self.row_count * self.token_size)
+        self.header_rect = pygame.Rect(0, 0, self.column_count * self.token_size, self.token_size)
 
         # self.hint_column = None
         # self.hint_button_rect = pygame.Rect(20, 20, 100, 40) 
 
-        # screen 
-        # Update the screen width to include space for the hint button
-        screen_width = self.column_count * self.token_size + 1000  # Add extra space for hint button
-        screen_height = self.row_count * self.token_size  # Keep the board height the same
-        self._display_surf = pygame.display.set_mode((screen_width, screen_height))
+        # the window itself is opened once, by on_execute
 
-            
         # hint_button_width = 100  # Width of the hint button
         # hint_button_height = 50  # Height of the hint button
         # hint_button_x = self.column_count * self.token_size -10  # Positioned in the white space
@@ -65,33 +75,34 @@ class UI:
 # # =========== Main Game Functions =========== # # 
     def on_execute(self):
         '''
-        Game logic 
+        Game logic, pygame.init() must have been called (main.py does)
         '''
-        depth = 3
-        alpha = -math.inf
-        beta = math.inf
-        pygame.init()
         hint_button_space = 0  # Additional space on the right for the hint button
         width = self.column_count * self.token_size + hint_button_space  # Add space for the hint button
         height = (self.row_count + 1) * self.token_size
         self._display_surf = pygame.display.set_mode((width, height))
 
         pygame.display.set_caption("Connect 4")
+        self._clock = pygame.time.Clock()
+        self._display_surf.fill((255, 255, 255))
+        pygame.display.flip()
+        self.board_surface = self.build_board_surface()
+        self.drawn_grid = None
+        self.drawn_header = None
 
         while self.running:
             self.handle_events()  # Handle user input
             self.on_render()  # Render the game state
+            self._clock.tick(self.fps)
 
-            # If it's the computer's turn
-            if self.board.current_player != self.board.human:
-                pygame.time.delay(200) 
-                col, _ = self.board.minimax(self.board.board, depth, alpha, beta, True)
+            # If it's the computer's turn, start a search or see if it's done
+            if self.running and self.board.current_player != self.board.human:
+                col = self.poll_worker()
 
-                if self.board.check_valid_location(self.board.board, col):
+                if col is not None and self.board.check_valid_location(self.board.board, col):
                     row = self.board.next_open_row(self.board.board, col)
                     self.board.drop_piece(self.board.board, row, col, self.board.current_player)
                     self.on_render()  # Render after the computer's move
-                    pygame.display.flip()  # Update display
 
                     # After the AI's move, check for a win or tie
                     if self.board.check_for_win(self.board.board, self.board.current_player):
@@ -106,53 +117,102 @@ class UI:
                     else:
                         self.board.switch_player()  # Switch to the other player
 
+        self.worker.close()  # also cancels a search still running when the window is closed
+
         # Once the game ends, display the winner message
         if self.winner_message:
             self.on_render()  # Render the winner message after the game ends
-            pygame.display.flip()  # Ensure the screen updates to show the winner message
             pygame.time.delay(2000)
     
+    def poll_worker(self):
+        '''
+        start the computer's search if it isn't running yet, and return its column once it is done.
+        A worker that fails (e.g. a client.RemoteWorker whose server went away or turned the
+        request down) is reported and replaced by a local SearchWorker, which starts over.
+        '''
+        try:
+            if not self.worker.busy:
+                self.worker.request(self.board, self.time_budget_ms)
+            return self.worker.poll()
+        except (OSError, ValueError) as error:
+            print(f"the search failed ({error}), searching locally from now on", file=sys.stderr)
+            self.worker.close()
+            self.worker = SearchWorker()
+            return None
+
     def on_render(self):
         '''
-        show whatever is happening 
+        show whatever is happening, redrawing only the parts that changed since the last frame
+        '''
+        exposed = self.exposed
+        if exposed:
+            # forget what is on screen, so both parts are drawn again below
+            self.exposed = False
+            self.drawn_grid = None
+            self.drawn_header = None
+        dirty = []
+        if self.update_board_surface():
+            self._display_surf.blit(self.board_surface, self.board_rect)
+            dirty.append(self.board_rect)
+        header = self.header_state()
+        if header != self.drawn_header:
+            self.drawn_header = header
+            self._display_surf.fill((255, 255, 255), self.header_rect)
+            # self.draw_hint_button(self._display_surf)  # Draw the hint button
+            self.display_token()
+            self.display_turn()
+            if self.winner_message:
+                self.display_winner()
+            dirty.append(self.header_rect)
+        if exposed:
+            pygame.display.flip()
+        elif dirty:
+            pygame.display.update(dirty)
+
+    def header_state(self):
+        '''
+        everything the strip above the board shows; it is only redrawn when this changes
         '''
-        self._display_surf.fill((255, 255, 255))
-        self.draw_board(self._display_surf)
-        # self.draw_hint_button(self._display_surf)  # Draw the hint button
-        self.display_token()
         self.update_turn_message()
-        self.display_turn()
-        if self.winner_message:
-            self.display_winner()
-        pygame.display.flip()
+        hover = self.mouse_column if self.show_hover_token and self.board.current_player == self.board.human else None
+        progress = None
+        if self.worker.busy:
+            progress = (int(self.token_size * 2 * min(1, self.worker.elapsed_ms() / self.time_budget_ms)), self.worker.depth)
+        return (hover, self.board.current_player, self.message, self.winner_message, progress)
 
 # # =========== Drawing Functions =========== # # 
-    def draw_board(self, screen):
-        # hint_button_space = 200  # Space for the hint button on the right
-        board_width = self.column_count * self.token_size
-        board_height = self.row_count * self.token_size
-
-        # Draw the blue board
-        pygame.draw.rect(
-            screen,
-            (0, 0, 255),  # Blue color
-            (0,  # Upper left corner X
-            self.token_size,  # Upper left corner Y
-            board_width,  # Adjusted width for the board
-            board_height)  # Height remains unchanged
-        )
-
-        # Draw empty slots
+    def build_board_surface(self):
+        '''
+        the blue board with empty slots, drawn once; discs are added to it as they are played
+        '''
+        surface = pygame.Surface(self.board_rect.size).convert()
+        surface.fill((0, 0, 255))  # Blue color
         for row in range(self.row_count):
             for col in range(self.column_count):
-                piece = int(self.board.board[row][col])  # Get the value from the board grid
-                pygame.draw.circle(
-                    screen,
-                    self.colors[piece],  # Token color based on value
-                    (int(col * self.token_size + self.token_size / 2),  # X position
-                    int((self.row_count - row - 1) * self.token_size + self.token_size / 2 + self.token_size)),  # Y position
-                    int(self.token_size / 2 - 5)  # Radius
-                )
+                self.draw_slot(surface, row, col, 0)
+        return surface
+
+    def draw_slot(self, surface, row, col, piece):
+        pygame.draw.circle(
+            surface,
+            self.colors[piece],  # Token color based on value
+            (int(col * self.token_size + self.token_size / 2),  # X position
+            int((self.row_count - row - 1) * self.token_size + self.token_size / 2)),  # Y position
+            int(self.token_size / 2 - 5)  # Radius
+        )
+
+    def update_board_surface(self):
+        '''
+        draw the slots that changed since the last frame onto the board surface,
+        returns whether anything did
+        '''
+        grid = np.array(self.board.board)  # works for the numpy board and the bitboard Position
+        if self.drawn_grid is not None and np.array_equal(grid, self.drawn_grid):
+            return False
+        for row, col in zip(*np.nonzero(grid != (0 if self.drawn_grid is None else self.drawn_grid))):
+            self.draw_slot(self.board_surface, row, col, int(grid[row][col]))
+        self.drawn_grid = grid
+        return True
 
     def draw_token(self, column):
         color = (255, 0, 0) if self.board.current_player == 1 else (255, 255, 0)
@@ -216,6 +276,9 @@ class UI:
             if event.type == pygame.QUIT:
                 self.running = False
 
+            if event.type in EXPOSE_EVENTS:
+                self.exposed = True
+
             if event.type == pygame.MOUSEMOTION:
                 self.handle_mouse_motion(event.pos)
 
@@ -228,9 +291,6 @@ class UI:
                         self.board.drop_piece(self.board.board, row, self.mouse_column, self.board.current_player)
                         self.show_hover_token = False  # Hide token preview
 
-                        self.on_render()
-                        pygame.display.update()
-
                         if self.board.check_for_win(self.board.board, self.board.current_player):
                             self.winner_message = "You win!"
                             # self.display_winner()
@@ -245,12 +305,38 @@ class UI:
 
     
     
+    def render_text(self, message, color):
+        '''
+        font.render is slow, so every (message, color) is only rendered once
+        '''
+        key = (message, color)
+        if key not in self.text_cache:
+            self.text_cache[key] = self.font.render(message, True, color)
+        return self.text_cache[key]
+
     def display_turn(self):
-        text= self.font.render(self.message, True, (0, 0, 0)) 
+        text= self.render_text(self.message, (0, 0, 0)) 
         self._display_surf.blit(text, (self.token_size // 2, 0))
+        if self.worker.busy:
+            self.display_progress(text.get_width())
+
+    def display_progress(self, text_width):
+        '''
+        while the computer thinks: a bar filling up over its time budget and the depth reached
+        '''
+        x = self.token_size // 2 + text_width + 20
+        y = self.token_size // 4
+        width = self.token_size * 2
+        height = self.token_size // 5
+        done = min(1, self.worker.elapsed_ms() / self.time_budget_ms)
+        pygame.draw.rect(self._display_surf, (200, 200, 200), (x, y, width, height))
+        pygame.draw.rect(self._display_surf, (0, 0, 255), (x, y, int(width * done), height))
+        if self.worker.depth:
+            depth_text = self.render_text(f"depth {self.worker.depth}", (0, 0, 0))
+            self._display_surf.blit(depth_text, (x + width + 10, 0))
     
     def display_winner(self):
-        text = self.font.render(self.winner_message, True, (255, 0, 0)) 
+        text = self.render_text(self.winner_message, (255, 0, 0)) 
         text_rect = text.get_rect(center=(self._display_surf.get_width() // 2, text.get_height() // 2 + 10))
         self._display_surf.blit(text, text_rect)
 
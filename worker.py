@@ -0,0 +1,143 @@
+'''
+Runs the computer's search in a separate process so the pygame loop keeps
+drawing and handling events while it thinks. A process rather than a
+thread, because the search is pure Python and would hold the GIL.
+
+The process lives for the whole game, so its transposition table carries
+over from one move to the next like it did when the search ran in-process.
+Should it die, the move it was searching is searched in-process instead
+and the next move starts a new one. Nothing here imports pygame.
+'''
+import multiprocessing
+import numpy as np
+import queue
+import signal
+import time
+from board import Board
+from stats import SearchStats
+from tablebase import Tablebase
+from transposition import TranspositionTable
+
+FLUSH_INTERVAL = 60  # seconds between writing newly solved endgames back to the tablebase file
+
+
+def _serve(requests, results):
+    '''
+    worker process loop: one search per request until it gets None
+    '''
+    # a forked worker inherits SDL's SIGTERM handler from the pygame process, put the default back so terminate() works
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    board = None
+    tablebase = Tablebase()  # endgames solved in earlier games, and the ones solved in this one are added
+    last_flush = time.perf_counter()
+    while True:
+        request = requests.get()
+        if request is None:
+            break
+        grid, connect, human, comp, time_budget_ms, collect_stats = request
+        geometry = (grid.shape[0], grid.shape[1], connect)
+        if board is None or board.comp != comp or (board.row_count, board.column_count, board.connect) != geometry:
+            board = Board(False, *geometry)
+            board.human, board.comp = human, comp
+            board.tt = TranspositionTable()
+            board.tablebase = tablebase
+        board.stats = SearchStats() if collect_stats else None
+
+        def progress(depth, column, value):
+            results.put(('progress', depth, column, value))
+
+        column, value, depth = board.iterative_deepening(grid, time_budget_ms, on_iteration=progress)
+        results.put(('move', column, value, depth, board.stats.as_dict() if collect_stats else None))
+        if time.perf_counter() - last_flush > FLUSH_INTERVAL:
+            # a flush rewrites the whole file, so not after every move
+            tablebase.flush()
+            last_flush = time.perf_counter()
+    tablebase.flush()
+
+
+class SearchWorker:
+
+    def __init__(self, collect_stats=False):
+        self.process = None
+        self.requests = None
+        self.results = None
+        self.busy = False
+        self.started_at = None  # time.perf_counter() when the current search was requested
+        self.depth = 0  # deepest iteration finished so far by the current search
+        self.collect_stats = collect_stats  # have the worker fill in a stats.SearchStats for every move
+        self.last_stats = None  # SearchStats.as_dict() of the last finished search
+        self.pending = None  # the request of the current search, in case the process dies on it
+
+    def start(self):
+        context = multiprocessing.get_context()
+        self.requests = context.Queue()
+        self.results = context.Queue()
+        self.process = context.Process(target=_serve, args=(self.requests, self.results), daemon=True)
+        self.process.start()
+
+    def request(self, board, time_budget_ms):
+        '''
+        start searching the computer's move for board (a Board), returns straight away
+        '''
+        if self.process is None:
+            self.start()
+        self.pending = (np.asarray(board.board), board.connect, board.human, board.comp, time_budget_ms, self.collect_stats)
+        self.requests.put(self.pending)
+        self.busy = True
+        self.started_at = time.perf_counter()
+        self.depth = 0
+
+    def poll(self):
+        '''
+        the column once the search is done, None while it is still running
+        '''
+        while self.busy:
+            alive = self.process.is_alive()  # before reading, so a reply sent just before it died isn't missed
+            try:
+                message = self.results.get_nowait()
+            except queue.Empty:
+                return None if alive else self.search_here()
+            if message[0] == 'progress':
+                self.depth = message[1]
+            else:
+                self.busy = False
+                self.last_stats = message[4]
+                return message[1]
+        return None
+
+    def search_here(self):
+        '''
+        the search process died (an exception in the search, or it was killed): search the
+        pending request in this process instead, blocking for its time budget, and leave the
+        next request to start a new process
+        '''
+        self.process.join()
+        self.process = None
+        grid, connect, human, comp, time_budget_ms, collect_stats = self.pending
+        board = Board(False, grid.shape[0], grid.shape[1], connect)
+        board.human, board.comp = human, comp
+        board.stats = SearchStats() if collect_stats else None
+        column, _, _ = board.iterative_deepening(grid, time_budget_ms)
+        self.busy = False
+        self.last_stats = board.stats.as_dict() if collect_stats else None
+        return column
+
+    def elapsed_ms(self):
+        return 0 if self.started_at is None else (time.perf_counter() - self.started_at) * 1000
+
+    def close(self):
+        '''
+        stop the worker, abandoning a search that is still running
+        '''
+        if self.process is None:
+            return
+        if self.busy:
+            self.process.terminate()
+        else:
+            self.requests.put(None)  # idle, let it finish on its own
+        self.process.join(1)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.process = None
+        self.busy = False